@@ -1,9 +1,10 @@
 from core.agent import create_agent
+from tools.analytics_tools import alignment_tool, analytics_tools
 from tools.python_repl import execute_python_code
 
-def create_analysis_agent(llm, members):
+def create_analysis_agent(llm, members, parallel_tools=False):
     """Create the Analysis agent"""
-    tools = [execute_python_code]
+    tools = [execute_python_code, *analytics_tools, alignment_tool]
 
     system_prompt = """
     You are a data analysis expert tasked with analyzing data and providing insights.
@@ -32,11 +33,21 @@ def create_analysis_agent(llm, members):
         ]
     }}
 
-    - At the start of your Python code, convert data to DataFrame:
-         ```python
-         import pandas as pd
-         dataframe = pd.DataFrame(data)
-         ```
+    - The API data is preloaded in the Python REPL as `dataframe`, a pandas DataFrame with
+      parsed dates and numeric columns. Its schema, row count and a data profile (column
+      statistics, time coverage, aggregates, extremes and anomalies) are given in api_state.
+      Start from the profile and only compute what it doesn't answer. Use `dataframe`
+      directly, never paste the data into your code.
+    - When the data comes from several API results, `datasets` holds one DataFrame per
+      result. To compare them (e.g. price vs consumption), call `align_datasets` first: it
+      puts them on a common timezone-aware time index as `aligned`, which the analytics
+      tools take as `dataset`.
+    - Prefer the analytics tools over writing pandas code for these operations:
+      `resample_series` (aggregation to hourly/daily/monthly..., MoM/YoY changes),
+      `rolling_stats`, `share_of_total` (e.g. industrial share of total consumption),
+      `peak_offpeak`, `zscore_anomalies` and `correlation`.
+      They run on `dataframe` (or another DataFrame you created, passed as `dataset`) and
+      return compact JSON. Use `execute_python_code` for anything else.
     **When calling `execute_python_code`:**
     {{
       "name": "execute_python_code",
@@ -47,5 +58,6 @@ def create_analysis_agent(llm, members):
         llm,
         tools,
         system_prompt,
-        members
+        members,
+        parallel_tools=parallel_tools
     )
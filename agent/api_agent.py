@@ -2,7 +2,7 @@ from core.agent import create_agent
 from tools.epias_api import call_transparency_api
 import json
 
-def create_api_agent(llm, members):
+def create_api_agent(llm, members, parallel_tools=False):
     """Create the API agent"""
     tools = [call_transparency_api]
 
@@ -32,6 +32,7 @@ def create_api_agent(llm, members):
     2. For each API call in the array:
        - Extract method, service, endpoint, body
        - Call: call_transparency_api(method=method, service=service, endpoint=endpoint, body=body)
+       - The calls are independent, so issue all of them in the same step when you can
     3. Collect all responses
     4. Combine the "items" from all responses
     5. Return: compact_json:{{"items":[...combined_items...]}}
@@ -43,5 +44,6 @@ def create_api_agent(llm, members):
         llm,
         tools,
         system_prompt,
-        members
+        members,
+        parallel_tools=parallel_tools
     )
\ No newline at end of file
@@ -1,7 +1,7 @@
 from core.agent import create_agent
 from tools.resolve_province_id import resolve_province_id
 
-def create_query_agent(llm, members):
+def create_query_agent(llm, members, parallel_tools=False):
     """Create the Query agent"""
     tools = [resolve_province_id]
 
@@ -57,5 +57,6 @@ def create_query_agent(llm, members):
         llm,
         tools,
         system_prompt,
-        members
+        members,
+        parallel_tools=parallel_tools
     )
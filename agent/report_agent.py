@@ -1,7 +1,7 @@
 from core.agent import create_agent
 from tools.file_manager import read_file
 
-def create_report_agent(llm, members):
+def create_report_agent(llm, members, parallel_tools=False):
     """Create the report agent"""
     tools = [read_file]
 
@@ -15,6 +15,8 @@ def create_report_agent(llm, members):
     **Constraints:**
     - DO NOT use read_file tool. It is only for tool assignment.
     - DO NOT include response data in the report.
+    - The data is summarized by the data profile in api_state (column statistics, time coverage,
+      aggregates, extremes and anomalies). Take figures from it and the analysis, never invent them.
     - Respond in same langugage as the input query.
 
     **Output Format:**
@@ -26,5 +28,6 @@ def create_report_agent(llm, members):
         llm,
         tools,
         system_prompt,
-        members
+        members,
+        parallel_tools=parallel_tools
     )
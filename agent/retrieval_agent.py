@@ -1,7 +1,7 @@
 from core.agent import create_agent
 from tools.rag import retriever_tool
 
-def create_retrieval_agent(llm, members):
+def create_retrieval_agent(llm, members, parallel_tools=False):
     """Create the Retrieval agent"""
     tools = [retriever_tool]
 
@@ -57,5 +57,6 @@ def create_retrieval_agent(llm, members):
         llm,
         tools,
         system_prompt,
-        members
+        members,
+        parallel_tools=parallel_tools
     )
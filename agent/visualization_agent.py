@@ -1,9 +1,39 @@
 from core.agent import create_agent
+from tools.analytics_tools import alignment_tool, charts_tool, figure_tool
 from tools.python_repl import execute_python_code
+import os
 
-def create_visualization_agent(llm, members):
-    """Create the visualization agent"""
-    tools = [execute_python_code]
+# Added to the prompt when figures are PNGs, which `render_charts` draws from specs
+CHART_SPEC_INSTRUCTIONS = """
+    **Chart specs:** rather than writing Matplotlib code, describe the plots of the API data
+    to the `render_charts` tool, all of them in a single call: one spec per plot with its file
+    ("visualization_{{topic}}.png"), kind (line, scatter, area or bar), x, y, color (column
+    to split the series by) and title. The plots are rendered in parallel. Write Matplotlib
+    code only for plots the specs can't express, e.g. of the `aligned` DataFrame.
+    """
+
+# Added to the prompt when figures are emitted as Plotly JSON instead of PNGs
+PLOTLY_INSTRUCTIONS = """
+    **Interactive figures:** do not render PNGs with Matplotlib. Create every plot with the
+    `plot_figure` tool (file "visualization_{{topic}}.json"), which saves a Plotly figure the
+    browser renders. In the entries of the final JSON, use "figure" instead of "file":
+    {{ "figure": "visualization_{{topic}}.json", "description": "<…>" }}
+    """
+
+def create_visualization_agent(llm, members, parallel_tools=False, figure_format=None):
+    """
+    Create the visualization agent.
+
+    Args:
+        figure_format: "png" for Matplotlib PNGs, "plotly" for Plotly figure JSON rendered by
+            the browser. From VISUALIZATION_FORMAT by default, "png" if unset.
+    """
+    figure_format = figure_format or os.getenv("VISUALIZATION_FORMAT", "png")
+    tools = [execute_python_code, alignment_tool]
+    if figure_format == "plotly":
+        tools.append(figure_tool)
+    else:
+        tools.append(charts_tool)
 
     system_prompt = """
     You are a data visualization expert. Your task is to generate plots from data and insights using Python REPL, 
@@ -14,12 +44,11 @@ def create_visualization_agent(llm, members):
     1. If workflow is "get data - return visualization - report":
        - Receive a JSON input containing:
          - {{`chartType`: string with the desired plot type.}}
-         - {{`data`: a list of JSON objects representing the dataset.}}
-       - In your Python code, convert the JSON data to a Pandas DataFrame:
-         ```python
-         import pandas as pd
-         dataframe = pd.DataFrame(data)
-         ```
+         - {{`data`: the schema and row count of the dataset.}}
+       - The dataset is preloaded in the Python REPL as `dataframe`, a pandas DataFrame with
+         parsed dates and numeric columns. Use it directly, never paste the data into your code.
+         To plot series of several API results together, call `align_datasets` first and
+         plot the `aligned` DataFrame it creates.
        - Generate the requested plot using Matplotlib.
        - Save the figure to a PNG file:
          ```python
@@ -42,12 +71,11 @@ def create_visualization_agent(llm, members):
          - {{`insights`: a list of objects with fields:}}
            - {{`findings`: textual summary of the insight.}}
            - {{`viz_recommendation`: suggested plot type.}}
-         - {{`data`: a list of JSON objects representing the dataset.}}
-       - At the start of your Python code, convert data to DataFrame:
-         ```python
-         import pandas as pd
-         dataframe = pd.DataFrame(data)
-         ```
+         - {{`data`: the schema and row count of the dataset.}}
+       - The dataset is preloaded in the Python REPL as `dataframe`, a pandas DataFrame with
+         parsed dates and numeric columns. Use it directly, never paste the data into your code.
+         To plot series of several API results together, call `align_datasets` first and
+         plot the `aligned` DataFrame it creates.
        - For each insight (index i starting from 1):
          a. Create the recommended plot using Matplotlib.
          b. Save the figure:
@@ -80,10 +108,15 @@ def create_visualization_agent(llm, members):
 
     Finish after emitting the final JSON—no extra text.
     """
+    if figure_format == "plotly":
+        system_prompt += PLOTLY_INSTRUCTIONS
+    else:
+        system_prompt += CHART_SPEC_INSTRUCTIONS
 
     return create_agent(
         llm,
         tools,
         system_prompt,
-        members
+        members,
+        parallel_tools=parallel_tools
     )
\ No newline at end of file
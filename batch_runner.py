@@ -0,0 +1,337 @@
+"""
+Batch runner: run a file of canned queries through the workflow with bounded concurrency.
+
+Queries run on one event loop and share the workflow (plan cache, query parser), an LLM
+response cache, an EPİAŞ API response cache and pooled HTTP clients. Each query gets its
+own budget. Results go to the portal's query database, to one JSON file per query, or both,
+followed by a throughput and latency summary.
+
+The input is a text file with one query per line (blank lines and lines starting with #
+are skipped), a JSON Lines file of {"id": ..., "query": ...} objects, or a JSON list of them.
+
+Usage:
+    python batch_runner.py queries.txt --concurrency 4
+    python batch_runner.py monthly.jsonl --output-dir batch_results --llm-cache llm_cache.db
+
+Python API:
+    from batch_runner import BatchRunner, load_queries
+    report = BatchRunner(concurrency=8, output_dir="batch_results").run(load_queries("monthly.txt"))
+    print(report.summary)
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import dotenv
+from langchain_core.caches import BaseCache, InMemoryCache
+from langchain_core.globals import get_llm_cache, set_llm_cache
+
+from core.api_cache import ApiResponseCache
+from core.artifacts import get_artifact_store
+from core.budget import QueryBudget, use_budget
+from core.checkpoint import has_agent_error
+from core.llm import LLM, ModelRouter
+from core.query_db import QueryDatabase
+from core.state import initial_state, query_workflow, state_results
+from core.tracing import trace_config, trace_query
+from core.usage import UsageLedger, usage_config, use_ledger
+from core.workflow import Workflow
+from logger import setup_logger
+from tools.epias_api import aclose_clients, set_response_cache
+from tools.python_repl import repl_session, session_directory
+
+dotenv.load_dotenv()
+
+logger = setup_logger("logs/batch_runner.log")
+
+
+@dataclass
+class BatchQuery:
+    """A query of a batch"""
+    query: str
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+
+@dataclass
+class BatchResult:
+    """The outcome of one batch query"""
+    id: str
+    query: str
+    status: str
+    latency: float
+    error: Optional[str] = None
+    agent_errors: bool = False
+    result_data: Optional[Dict[str, Any]] = None
+    visualization_data: Optional[Dict[str, Any]] = None
+    report: Optional[str] = None
+    budget_usage: Optional[Dict[str, Any]] = None
+    workflow: Optional[str] = None
+    llm_usage: List[Dict[str, Any]] = field(default_factory=list)
+
+
+@dataclass
+class BatchReport:
+    """The results of a batch and their aggregate summary"""
+    batch_id: str
+    results: List[BatchResult]
+    summary: Dict[str, Any]
+
+
+def load_queries(path: str) -> List[BatchQuery]:
+    """
+    Read the queries of a batch.
+
+    Args:
+        path (str): A .txt file with one query per line, a .jsonl file or a .json list. JSON
+            entries are query strings or objects with a "query" and an optional "id".
+
+    Returns:
+        list: The queries, in file order.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    if path.endswith(".json"):
+        entries = json.loads(text)
+    elif path.endswith(".jsonl"):
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        entries = [line.strip() for line in text.splitlines()
+                   if line.strip() and not line.strip().startswith("#")]
+
+    queries = []
+    for entry in entries:
+        if isinstance(entry, str):
+            queries.append(BatchQuery(query=entry))
+        elif entry.get("id"):
+            queries.append(BatchQuery(query=entry["query"], id=str(entry["id"])))
+        else:
+            queries.append(BatchQuery(query=entry["query"]))
+    return queries
+
+
+def build_llm_cache(spec: Optional[str]) -> Optional[BaseCache]:
+    """
+    Build an LLM response cache from a CLI spec.
+
+    Args:
+        spec (str): "memory" for an in-process cache, "none" to disable caching, otherwise the
+            path of a SQLite cache that persists across batches.
+    """
+    if not spec or spec == "none":
+        return None
+    if spec == "memory":
+        return InMemoryCache()
+    from langchain_community.cache import SQLiteCache
+    return SQLiteCache(database_path=spec)
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of `values`, 0 if empty"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(results: Sequence[BatchResult], wall_time: float, concurrency: int,
+              caches: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Aggregate the throughput, latency and usage of a batch.
+
+    Args:
+        results: The per-query results.
+        wall_time (float): Seconds from the first query's start to the last one's end.
+        concurrency (int): The concurrency the batch ran with.
+        caches (dict, optional): Cache statistics to include.
+
+    Returns:
+        dict: The batch summary.
+    """
+    latencies = [result.latency for result in results]
+    usage = [result.budget_usage or {} for result in results]
+    return {
+        "queries": len(results),
+        "completed": sum(result.status == "completed" for result in results),
+        "failed": sum(result.status == "error" for result in results),
+        "with_agent_errors": sum(result.agent_errors for result in results),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_time, 3),
+        "throughput_per_minute": round(len(results) / wall_time * 60, 2) if wall_time else 0.0,
+        "latency_seconds": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(_percentile(latencies, 50), 3),
+            "p90": round(_percentile(latencies, 90), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "max": round(max(latencies, default=0.0), 3),
+        },
+        "tokens": sum(u.get("tokens", 0) for u in usage),
+        "llm_calls": sum(u.get("llm_calls", 0) for u in usage),
+        "api_calls": sum(u.get("api_calls", 0) for u in usage),
+        "cost_usd": round(sum(call["cost"] for result in results for call in result.llm_usage), 6),
+        "caches": caches or {},
+    }
+
+
+class BatchRunner:
+    """
+    Runs many queries through one workflow with bounded concurrency.
+
+    The workflow is built once and shared, so its plan cache and query parser warm up over
+    the batch. While a batch runs, the LLM cache and the API response cache are installed
+    process-wide; the previous caches are restored afterwards.
+    """
+
+    def __init__(self, workflow: Optional[Workflow] = None, concurrency: int = 4,
+                 db: Optional[QueryDatabase] = None, output_dir: Optional[str] = None,
+                 llm_cache: Optional[BaseCache] = None, api_cache: Optional[ApiResponseCache] = None):
+        """
+        Args:
+            workflow (Workflow, optional): The workflow to run, built from the configured
+                models with tier routing if omitted.
+            concurrency (int): Maximum number of queries in flight.
+            db (QueryDatabase, optional): Store results in the portal's query database.
+            output_dir (str, optional): Write one JSON file per query and the summary here.
+            llm_cache (BaseCache, optional): LLM response cache shared by the batch.
+            api_cache (ApiResponseCache, optional): API response cache shared by the batch.
+        """
+        if workflow is None:
+            workflow = Workflow(llms=LLM().get_models(), model_router=ModelRouter())
+        self.workflow = workflow
+        self.concurrency = max(1, concurrency)
+        self.db = db
+        self.output_dir = output_dir
+        self.llm_cache = llm_cache
+        self.api_cache = api_cache
+
+    def _store(self, batch_id: str, result: BatchResult) -> None:
+        """Write a finished query to the configured outputs"""
+        if self.db is not None:
+            self.db.save_query(result.id, result.query, result.status, result.result_data,
+                               result.visualization_data, result.report, result.error,
+                               budget_usage=result.budget_usage, session_id=batch_id, workflow=result.workflow)
+            self.db.save_usage(result.id, result.llm_usage)
+        if self.output_dir:
+            path = os.path.join(self.output_dir, f"{result.id}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(asdict(result), f, ensure_ascii=False, indent=2)
+
+    async def _run_query(self, batch_id: str, item: BatchQuery, semaphore: asyncio.Semaphore) -> BatchResult:
+        async with semaphore:
+            graph = self.workflow.get_graph()
+            config = {"configurable": {"thread_id": item.id}, "recursion_limit": 30}
+            budget, ledger = QueryBudget.from_env(), UsageLedger()
+            start = time.perf_counter()
+            try:
+                final_state = None
+                with trace_query(item.id, batch_id=batch_id), use_budget(budget), use_ledger(ledger), \
+                        repl_session(item.id):
+                    async for event in graph.astream(initial_state(item.query), usage_config(trace_config(config)),
+                                                     stream_mode="values"):
+                        final_state = event
+                result = BatchResult(
+                    id=item.id, query=item.query, status="completed", latency=time.perf_counter() - start,
+                    agent_errors=has_agent_error(final_state), budget_usage=budget.usage(),
+                    workflow=query_workflow(final_state), llm_usage=list(ledger.records),
+                    **state_results(final_state, session_directory(item.id))
+                )
+            except Exception as e:
+                logger.error(f"Batch query {item.id} failed: {e}")
+                result = BatchResult(id=item.id, query=item.query, status="error",
+                                     latency=time.perf_counter() - start, error=str(e),
+                                     budget_usage=budget.usage(), llm_usage=list(ledger.records))
+            # SQLite and file writes block, keep them off the event loop
+            await asyncio.to_thread(self._store, batch_id, result)
+            if result.status == "completed" and not result.agent_errors:
+                # The charts were copied to the artifact store, a resumable run keeps its files
+                await asyncio.to_thread(get_artifact_store().remove_session, item.id)
+            logger.info(f"Batch query {item.id} {result.status} in {result.latency:.2f}s")
+            return result
+
+    def _cache_stats(self) -> Dict[str, Any]:
+        stats = {
+            "plan_cache": self.workflow.plan_cache.stats(),
+            "query_parser": self.workflow.query_parser.stats(),
+        }
+        if self.api_cache is not None:
+            stats["api_cache"] = self.api_cache.stats()
+        return stats
+
+    async def arun(self, queries: Sequence[BatchQuery], batch_id: Optional[str] = None) -> BatchReport:
+        """
+        Run a batch on the running event loop.
+
+        Args:
+            queries: The queries to run.
+            batch_id (str, optional): Identifies the batch, stored as the queries' session in
+                the query database. Generated if omitted.
+
+        Returns:
+            BatchReport: The per-query results, in input order, and the batch summary.
+        """
+        batch_id = batch_id or str(uuid.uuid4())
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+        previous_llm_cache, previous_api_cache = get_llm_cache(), set_response_cache(self.api_cache)
+        set_llm_cache(self.llm_cache)
+        logger.info(f"Batch {batch_id}: {len(queries)} queries, concurrency {self.concurrency}")
+        start = time.perf_counter()
+        try:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            results = await asyncio.gather(*(self._run_query(batch_id, item, semaphore) for item in queries))
+        finally:
+            set_llm_cache(previous_llm_cache)
+            set_response_cache(previous_api_cache)
+            await aclose_clients()
+        wall_time = time.perf_counter() - start
+
+        summary = {"batch_id": batch_id,
+                   **summarize(results, wall_time, self.concurrency, self._cache_stats())}
+        if self.output_dir:
+            with open(os.path.join(self.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info(f"Batch {batch_id} finished: {summary['completed']}/{summary['queries']} completed "
+                    f"in {summary['wall_seconds']}s ({summary['throughput_per_minute']} queries/min)")
+        return BatchReport(batch_id=batch_id, results=list(results), summary=summary)
+
+    def run(self, queries: Sequence[BatchQuery], batch_id: Optional[str] = None) -> BatchReport:
+        """Run a batch to completion on a new event loop, see `arun`"""
+        return asyncio.run(self.arun(queries, batch_id))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a file of queries through the workflow")
+    parser.add_argument("queries", help="Query file: .txt (one per line), .jsonl or .json")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum queries in flight")
+    parser.add_argument("--db", default=None,
+                        help="Query database to store results in (default: query_history.db "
+                             "unless --output-dir is given)")
+    parser.add_argument("--output-dir", default=None, help="Write one JSON file per query and summary.json here")
+    parser.add_argument("--llm-cache", default="memory",
+                        help='LLM response cache: "memory", "none" or a SQLite file path')
+    parser.add_argument("--api-cache-ttl", type=float, default=3600,
+                        help="Seconds to reuse identical API responses, 0 disables the cache")
+    parser.add_argument("--batch-id", default=None, help="Batch identifier, generated if omitted")
+    args = parser.parse_args(argv)
+
+    db_path = args.db or (None if args.output_dir else "query_history.db")
+    runner = BatchRunner(
+        concurrency=args.concurrency,
+        db=QueryDatabase(db_path) if db_path else None,
+        output_dir=args.output_dir,
+        llm_cache=build_llm_cache(args.llm_cache),
+        api_cache=ApiResponseCache(ttl=args.api_cache_ttl) if args.api_cache_ttl > 0 else None,
+    )
+    report = runner.run(load_queries(args.queries), args.batch_id)
+    print(json.dumps(report.summary, ensure_ascii=False, indent=2))
+    return 0 if report.summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
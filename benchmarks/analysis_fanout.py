@@ -0,0 +1,61 @@
+"""
+End-to-end latency of the analysis workflow with serial vs. fanned-out visualization.
+
+Builds the real `Workflow` graph with stub agents (see benchmarks/stubs.py) whose
+visualization latency grows with the number of insights it has to chart, then times
+complete analysis-workflow runs with `parallel_visualization` off and on.
+
+Usage:
+    python -m benchmarks.analysis_fanout --latency 0.2 --insights 3 --runs 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from langchain_core.messages import HumanMessage
+
+from core.workflow import Workflow
+from benchmarks.stubs import analysis_agents
+
+
+def initial_state():
+    return {"messages": [HumanMessage(content="analysis query")], "process_state": "", "process_decision": "",
+            "query_state": "", "retrieval_state": "", "api_state": "", "analysis_state": "",
+            "visualization_state": "", "report_state": "", "sender": ""}
+
+
+def time_run(graph, use_async):
+    config = {"recursion_limit": 30}
+    start = time.perf_counter()
+    if use_async:
+        final_state = asyncio.run(graph.ainvoke(initial_state(), config))
+    else:
+        final_state = graph.invoke(initial_state(), config)
+    elapsed = time.perf_counter() - start
+    assert final_state.get("report_state"), "workflow did not reach the report"
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per agent call / chart")
+    parser.add_argument("--insights", type=int, default=3, help="Insights produced by the analysis stub")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per configuration")
+    args = parser.parse_args()
+
+    print(f"analysis workflow, {args.insights} insights, {args.latency:.2f}s per agent call / chart")
+    print(f"{'visualization':<14}{'mode':<7}{'median (s)':>12}{'min (s)':>10}")
+    for parallel in (False, True):
+        workflow = Workflow(llms={}, agents=analysis_agents(args.latency, args.insights),
+                            parallel_visualization=parallel)
+        graph = workflow.get_graph()
+        for use_async in (False, True):
+            timings = [time_run(graph, use_async) for _ in range(args.runs)]
+            label = "fan-out" if parallel else "serial"
+            mode = "async" if use_async else "sync"
+            print(f"{label:<14}{mode:<7}{statistics.median(timings):>12.2f}{min(timings):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
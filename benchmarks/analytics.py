@@ -0,0 +1,121 @@
+"""
+Vectorized analytics primitives against the row-wise code agents tend to write.
+
+Builds `--years` of hourly prices plus a sector breakdown, then times each primitive of
+`tools.analytics` and a loop-based equivalent (iterrows / per-row Python) computing the same
+result, and reports the size of the result the agent would read.
+
+Usage:
+    python -m benchmarks.analytics --years 1 --repeat 5
+"""
+import argparse
+import statistics
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from tools import analytics
+
+
+def hourly_prices(years):
+    index = pd.date_range("2024-01-01", periods=8760 * years, freq="h", tz="Europe/Istanbul")
+    rng = np.random.default_rng(0)
+    price = 2000 + 600 * np.sin(2 * np.pi * index.hour.to_numpy() / 24) + rng.gamma(4, 60, len(index))
+    price[rng.integers(0, len(index), 20)] *= 3
+    consumption = 30000 + 40 * price + rng.normal(0, 500, len(index))
+    return pd.DataFrame({"date": index, "price": price, "consumption": consumption})
+
+
+def sectors(rows):
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({
+        "province": rng.choice(["ADANA", "ANKARA", "İSTANBUL", "İZMİR"], rows),
+        "consumerSector": rng.choice(["Household", "Industry", "Lighting", "Irrigation", "Other"], rows),
+        "consumption": rng.gamma(2, 500, rows),
+    })
+
+
+def rowwise_resample(frame):
+    sums, counts = defaultdict(float), defaultdict(int)
+    for _, row in frame.iterrows():
+        day = row["date"].date()
+        sums[day] += row["price"]
+        counts[day] += 1
+    return {day: sums[day] / counts[day] for day in sums}
+
+
+def rowwise_peak(frame):
+    peak, off = [], []
+    for _, row in frame.iterrows():
+        (peak if 8 <= row["date"].hour < 20 and row["date"].dayofweek < 5 else off).append(row["price"])
+    return sum(peak) / len(peak), sum(off) / len(off)
+
+
+def rowwise_zscore(frame):
+    values = list(frame["price"])
+    mean = sum(values) / len(values)
+    std = (sum((v - mean) ** 2 for v in values) / (len(values) - 1)) ** 0.5
+    return [i for i, v in enumerate(values) if abs(v - mean) / std > 3]
+
+
+def rowwise_rolling(frame, window=168):
+    values = list(frame["price"])
+    return [sum(values[max(0, i - window + 1):i + 1]) / len(values[max(0, i - window + 1):i + 1])
+            for i in range(len(values))]
+
+
+def rowwise_share(frame):
+    totals = defaultdict(float)
+    for _, row in frame.iterrows():
+        totals[row["consumerSector"]] += row["consumption"]
+    grand = sum(totals.values())
+    return {sector: 100 * value / grand for sector, value in totals.items()}
+
+
+def rowwise_correlation(frame):
+    x, y = list(frame["price"]), list(frame["consumption"])
+    mx, my = sum(x) / len(x), sum(y) / len(y)
+    cov = sum((a - mx) * (b - my) for a, b in zip(x, y))
+    return cov / (sum((a - mx) ** 2 for a in x) * sum((b - my) ** 2 for b in y)) ** 0.5
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--years", type=int, default=1, help="Years of hourly data")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per operation")
+    args = parser.parse_args()
+
+    prices = hourly_prices(args.years)
+    breakdown = sectors(len(prices))
+    cases = [
+        ("daily resample", lambda: analytics.resample(prices, "price", "D"), lambda: rowwise_resample(prices)),
+        ("rolling 168h", lambda: analytics.rolling(prices, "price", 168), lambda: rowwise_rolling(prices)),
+        ("share of total", lambda: analytics.share_of_total(breakdown, "consumerSector", "consumption"),
+         lambda: rowwise_share(breakdown)),
+        ("peak/off-peak", lambda: analytics.peak_offpeak(prices, "price"), lambda: rowwise_peak(prices)),
+        ("z-score anomalies", lambda: analytics.zscore_anomalies(prices, "price"), lambda: rowwise_zscore(prices)),
+        ("correlation", lambda: analytics.correlation(prices, ["price", "consumption"]),
+         lambda: rowwise_correlation(prices)),
+    ]
+
+    print(f"{len(prices)} hourly rows, median of {args.repeat} runs")
+    print(f"{'operation':<20}{'vectorized ms':>15}{'row-wise ms':>13}{'speedup':>9}{'result chars':>14}")
+    for name, vectorized, rowwise in cases:
+        fast, result = timed(vectorized, args.repeat)
+        slow, _ = timed(rowwise, max(1, args.repeat // 2))
+        print(f"{name:<20}{fast * 1e3:>15.1f}{slow * 1e3:>13.1f}{slow / fast:>8.0f}x{len(result):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Concurrency benchmark: one OS thread per query vs. one shared event loop.
+
+Runs N concurrent queries through the Query → Retrieval → API → Process pipeline built
+from the real graph nodes (`core.node.graph_node`), with agents replaced by stubs that
+simulate LLM/API latency. Reports wall time, throughput and peak thread count per mode.
+
+Usage:
+    python -m benchmarks.async_concurrency --queries 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import threading
+import time
+from threading import Thread
+
+from langchain_core.messages import HumanMessage
+from langgraph.graph import StateGraph, START, END
+
+from core.node import agent_node, agent_node_async, graph_node
+from core.router import process_router
+from core.state import State
+from benchmarks.stubs import SleepAgent
+
+
+def build_graph(latency):
+    agents = {
+        "query_agent": SleepAgent({"output": '{"parameters": {}}'}, latency),
+        "retrieval_agent": SleepAgent({"output": '{"api_calls": []}'}, latency),
+        "api_agent": SleepAgent({"output": 'compact_json:{"items":[]}'}, latency),
+        "process_agent": SleepAgent({"next": "FINISH", "task": ""}, latency),
+    }
+    workflow = StateGraph(State)
+    for node, name in [("Query", "query_agent"), ("Retrieval", "retrieval_agent"),
+                       ("API", "api_agent"), ("Process", "process_agent")]:
+        workflow.add_node(node, graph_node(agent_node, agent_node_async, agents[name], name))
+    workflow.add_edge(START, "Query")
+    workflow.add_edge("Query", "Retrieval")
+    workflow.add_edge("Retrieval", "API")
+    workflow.add_edge("API", "Process")
+    workflow.add_conditional_edges("Process", process_router, {"Process": "Process", END: END})
+    return workflow.compile()
+
+
+def initial_state(i):
+    return {"messages": [HumanMessage(content=f"query {i}")], "process_state": "", "process_decision": "",
+            "query_state": "", "retrieval_state": "", "api_state": "", "analysis_state": "",
+            "visualization_state": "", "report_state": "", "sender": ""}
+
+
+class ThreadSampler:
+    """Samples the live thread count in the background"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.005)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_threaded(graph, queries):
+    def run(i):
+        for _ in graph.stream(initial_state(i), {"recursion_limit": 30}, stream_mode="values"):
+            pass
+
+    threads = [Thread(target=run, args=(i,), daemon=True) for i in range(queries)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+async def run_async(graph, queries):
+    async def run(i):
+        async for _ in graph.astream(initial_state(i), {"recursion_limit": 30}, stream_mode="values"):
+            pass
+
+    await asyncio.gather(*(run(i) for i in range(queries)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50, help="Number of concurrent queries")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per agent call")
+    args = parser.parse_args()
+
+    graph = build_graph(args.latency)
+    results = {}
+
+    with ThreadSampler() as sampler:
+        start = time.perf_counter()
+        run_threaded(graph, args.queries)
+        results["thread"] = (time.perf_counter() - start, sampler.peak)
+
+    with ThreadSampler() as sampler:
+        start = time.perf_counter()
+        asyncio.run(run_async(graph, args.queries))
+        results["async"] = (time.perf_counter() - start, sampler.peak)
+
+    ideal = 4 * args.latency
+    print(f"{args.queries} concurrent queries, 4 agent steps x {args.latency:.2f}s (ideal {ideal:.2f}s)")
+    print(f"{'mode':<8}{'wall (s)':>10}{'queries/s':>12}{'peak threads':>14}")
+    for mode, (elapsed, peak) in results.items():
+        print(f"{mode:<8}{elapsed:>10.2f}{args.queries / elapsed:>12.1f}{peak:>14}")
+
+
+if __name__ == "__main__":
+    main()
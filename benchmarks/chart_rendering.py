@@ -0,0 +1,99 @@
+"""
+Wall time of rendering a query's charts from specs with `render_charts`.
+
+Binds `--days` of hourly day-ahead prices into a REPL session, then renders `--charts`
+PNG charts (line, bar by hour of day, area, scatter, ...) in one `render_charts` call: on
+the in-process REPL (one after another) and on worker pools of each `--workers` size, where
+they render in parallel. The execution cache is off, so every run renders. Each worker
+renders once before timing, as a warm portal's workers would have.
+
+Reports the wall time of the call, the summed render time of the charts (which exceeds the
+wall time when they overlap), and the speedup over the in-process REPL.
+
+Usage:
+    python -m benchmarks.chart_rendering --charts 3 --days 31 --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.prompt_encoding import mcp
+from core.artifacts import ArtifactStore, set_artifact_store
+from tools.analytics_tools import render_charts
+from tools.python_repl import load_dataset, repl_session
+from tools.repl_cache import set_repl_cache
+from tools.repl_pool import ReplWorkerPool, set_repl_pool
+
+SPECS = [
+    {"kind": "line", "y": "price", "title": "Day-ahead price"},
+    {"kind": "bar", "x": "hour", "y": ["priceUsd", "priceEur"], "title": "Mean price by hour of day"},
+    {"kind": "area", "y": "priceEur", "title": "Day-ahead price (EUR)"},
+    {"kind": "scatter", "x": "priceUsd", "y": "price", "title": "TRY against USD price"},
+    {"kind": "line", "y": ["priceUsd", "priceEur"], "title": "Day-ahead price (USD, EUR)"},
+]
+
+
+def specs(charts):
+    return [dict(SPECS[i % len(SPECS)], file=f"chart_{i}.png") for i in range(charts)]
+
+
+def run(items, charts, runs):
+    """Render the charts `runs` times in a fresh session, returning the wall and render times"""
+    walls, renders = [], []
+    with repl_session(f"charts-{time.perf_counter_ns()}"):
+        load_dataset(items, ["mcp"])
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = json.loads(render_charts(specs(charts)))
+            walls.append(time.perf_counter() - start)
+            errors = [chart["error"] for chart in result["charts"] if "error" in chart]
+            if errors:
+                raise RuntimeError(errors[0])
+            renders.append(sum(chart["seconds"] for chart in result["charts"]))
+    return statistics.median(walls), statistics.median(renders)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--charts", type=int, default=3, help="Charts per call")
+    parser.add_argument("--days", type=int, default=31, help="Days of hourly prices")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Pool sizes to compare")
+    parser.add_argument("--runs", type=int, default=3, help="Timed calls per mode, the median is reported")
+    args = parser.parse_args()
+
+    items = mcp(args.days, random.Random(0))
+    print(f"{args.charts} charts of {len(items)} rows, {os.cpu_count()} CPUs")
+    print(f"{'mode':<16}{'wall s':>9}{'render s':>10}{'speedup':>9}")
+    previous_cache = set_repl_cache(None)
+    previous_pool = set_repl_pool(None)
+    with tempfile.TemporaryDirectory() as root:
+        previous_store = set_artifact_store(ArtifactStore(root))
+        cwd = os.getcwd()
+        # In-process code writes to the working directory
+        os.chdir(root)
+        try:
+            run(items, 1, 1)  # import matplotlib before timing
+            baseline, render = run(items, args.charts, args.runs)
+            print(f"{'in-process':<16}{baseline:>9.2f}{render:>10.2f}{1:>8.1f}x")
+            for size in args.workers:
+                pool = ReplWorkerPool(size).wait_ready()
+                set_repl_pool(pool)
+                try:
+                    run(items, size, 1)
+                    wall, render = run(items, args.charts, args.runs)
+                    print(f"{f'pool of {size}':<16}{wall:>9.2f}{render:>10.2f}{baseline / wall:>8.1f}x")
+                finally:
+                    pool.close()
+        finally:
+            os.chdir(cwd)
+            set_artifact_store(previous_store)
+            set_repl_pool(previous_pool)
+            set_repl_cache(previous_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Multi-call benchmark: one function call per model turn vs. parallel tool calls.
+
+Runs an agent built by `core.agent.create_agent` against a scripted model that needs
+N tool calls (like the API agent fetching N monthly periods), with a tool that waits
+like an EPİAŞ request. Compares `parallel_tools=False` (functions agent, N+1 model turns,
+sequential tools) with `parallel_tools=True` (tools agent, 2 turns, concurrent tools).
+
+Usage:
+    python -m benchmarks.parallel_tools --calls 6 --llm-latency 0.5 --tool-latency 0.3
+"""
+import argparse
+import asyncio
+import time
+
+from langchain.tools import StructuredTool
+from langchain_core.messages import HumanMessage
+
+from core.agent import create_agent
+from benchmarks.stubs import ScriptedToolCallModel
+
+
+def make_tool(latency):
+    """Tool with sync and async implementations, like call_transparency_api"""
+    def fetch_period(period: str) -> str:
+        """Fetch one period of data."""
+        time.sleep(latency)
+        return f'{{"period":"{period}","items":[]}}'
+
+    async def afetch_period(period: str) -> str:
+        await asyncio.sleep(latency)
+        return f'{{"period":"{period}","items":[]}}'
+
+    return StructuredTool.from_function(func=fetch_period, coroutine=afetch_period, name="fetch_period")
+
+
+def agent_inputs():
+    inputs = {key: "" for key in ["process_state", "process_decision", "query_state", "retrieval_state",
+                                  "api_state", "analysis_state", "visualization_state", "report_state"]}
+    inputs["messages"] = [HumanMessage(content="fetch all periods")]
+    return inputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=6, help="Tool calls needed by the query")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated seconds per model turn")
+    parser.add_argument("--tool-latency", type=float, default=0.3, help="Simulated seconds per tool call")
+    args = parser.parse_args()
+
+    fetch_period = make_tool(args.tool_latency)
+    calls = [{"period": f"2025-{month:02d}-01T00:00:00+03:00"} for month in range(1, args.calls + 1)]
+
+    print(f"{args.calls} tool calls, {args.llm_latency:.2f}s per model turn, {args.tool_latency:.2f}s per tool call")
+    print(f"{'agent':<12}{'mode':<7}{'wall (s)':>10}")
+    for parallel in (False, True):
+        llm = ScriptedToolCallModel(tool_name=fetch_period.name, calls=calls, latency=args.llm_latency)
+        agent = create_agent(llm, [fetch_period], "Fetch every period.", ["API"], parallel_tools=parallel)
+        label = "tools" if parallel else "functions"
+        for use_async in (False, True):
+            start = time.perf_counter()
+            if use_async:
+                asyncio.run(agent.ainvoke(agent_inputs()))
+            else:
+                agent.invoke(agent_inputs())
+            mode = "async" if use_async else "sync"
+            print(f"{label:<12}{mode:<7}{time.perf_counter() - start:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Prompt size of API payloads: compact JSON against the encodings of `core.table_encoding`.
+
+Builds payloads shaped like EPİAŞ Transparency responses (day-ahead prices, real-time
+consumption and generation, consumption by province and consumer type) over `--days`,
+and reports the tokens of each encoding, the one `encode_table` picks, and what fits a
+`--budget` token budget after downsampling.
+
+Tokens are counted with the tokenizer of `core.table_encoding.TOKEN_MODEL` when tiktoken
+has its encoding files, else estimated at ~4 characters per token.
+
+Usage:
+    python -m benchmarks.prompt_encoding --days 31 --budget 4000
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from core.table_encoding import ENCODINGS, TOKEN_MODEL, encode_items, encode_table
+from core.usage import _encoding, count_tokens
+
+GENERATION_SOURCES = ["naturalGas", "dammedHydro", "lignite", "river", "importCoal", "wind", "sun", "fueloil",
+                      "geothermal", "asphaltiteCoal", "blackCoal", "biomass", "naphta", "lng", "importExport",
+                      "wasteheat"]
+PROVINCES = ["ADANA", "ANKARA", "ANTALYA", "BURSA", "İSTANBUL", "İZMİR", "KOCAELİ", "KONYA"]
+CONSUMER_TYPES = ["Mesken", "Sanayi", "Ticarethane", "Tarımsal Sulama", "Aydınlatma"]
+
+
+def _hours(days):
+    start = datetime(2024, 1, 1)
+    return [start + timedelta(hours=h) for h in range(24 * days)]
+
+
+def _stamp(moment):
+    return moment.isoformat() + "+03:00"
+
+
+def mcp(days, rng):
+    return [{"date": _stamp(t), "hour": f"{t.hour:02d}:00", "price": round(rng.uniform(1500, 3400), 2),
+             "priceUsd": round(rng.uniform(50, 110), 2), "priceEur": round(rng.uniform(45, 100), 2)}
+            for t in _hours(days)]
+
+
+def realtime_consumption(days, rng):
+    return [{"date": _stamp(t), "time": f"{t.hour:02d}:00", "consumption": round(rng.uniform(28000, 45000), 2)}
+            for t in _hours(days)]
+
+
+def realtime_generation(days, rng):
+    items = []
+    for t in _hours(days):
+        sources = {source: round(rng.uniform(0, 9000), 2) for source in GENERATION_SOURCES}
+        items.append({"date": _stamp(t), "hour": f"{t.hour:02d}:00", "total": round(sum(sources.values()), 2),
+                      **sources})
+    return items
+
+
+def consumption_by_province(days, rng):
+    start = datetime(2024, 1, 1)
+    return [{"period": _stamp(start + timedelta(days=d)), "province": province, "consumerType": kind,
+             "consumption": round(rng.uniform(100, 90000), 3)}
+            for d in range(days) for province in PROVINCES for kind in CONSUMER_TYPES]
+
+
+PAYLOADS = {
+    "day-ahead prices": mcp,
+    "real-time consumption": realtime_consumption,
+    "real-time generation": realtime_generation,
+    "consumption by province": consumption_by_province,
+}
+
+
+def tokens(text):
+    return count_tokens([text], TOKEN_MODEL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=31, help="Days of data per payload")
+    parser.add_argument("--budget", type=int, default=4000, help="Token budget of the downsampled table")
+    args = parser.parse_args()
+
+    counting = "tiktoken" if _encoding(TOKEN_MODEL) is not None else "estimated (~4 chars/token)"
+    print(f"{args.days} days per payload, tokens {counting}")
+    print(f"{'payload':<25}{'rows':>6}{'json':>9}" + "".join(f"{name:>9}" for name in ENCODINGS)
+          + f"{'saved':>8}{'encode ms':>11}{'fits budget':>24}")
+    for name, build in PAYLOADS.items():
+        items = build(args.days, random.Random(0))
+        baseline = tokens("compact_json:" + json.dumps({"items": items}, separators=(",", ":"), ensure_ascii=False))
+        encoded = {encoding: tokens(encode_items(items, encoding)) for encoding in ENCODINGS}
+        best = min(encoded.values())
+        start = time.perf_counter()
+        budgeted = encode_table(items, args.budget)
+        elapsed = time.perf_counter() - start
+        header = budgeted.split("\n", 1)[0]
+        rows = header.split(":", 1)[1].split(" rows", 1)[0].strip()
+        print(f"{name:<25}{len(items):>6}{baseline:>9}" + "".join(f"{encoded[e]:>9}" for e in ENCODINGS)
+              + f"{1 - best / baseline:>8.0%}{elapsed * 1e3:>11.1f}{f'{rows} rows, {tokens(budgeted)} tokens':>24}")
+
+
+if __name__ == "__main__":
+    main()
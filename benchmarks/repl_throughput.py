@@ -0,0 +1,109 @@
+"""
+Throughput of concurrent analysis queries on the REPL tool.
+
+Simulates `--queries` analysis queries running at once, each in its own REPL session (as
+the portal runs them), each executing `--steps` snippets like the analysis and
+visualization agents write: build an hourly price frame, aggregate it, and save a chart.
+Runs them through `execute_python_code` on the in-process REPL (one shared interpreter,
+executions serialized) and on worker pools of each `--workers` size.
+
+Reports wall time, executions per second and per-execution latency percentiles, and checks
+that no session saw another session's variables.
+
+Usage:
+    python -m benchmarks.repl_throughput --queries 8 --steps 4 --workers 1 2 4
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tools.python_repl import execute_python_code, repl_session
+from tools.repl_pool import ReplWorkerPool, set_repl_pool
+
+SNIPPETS = [
+    # Load: one year of hourly prices
+    "import pandas as pd, numpy as np\n"
+    "idx = pd.date_range('2024-01-01', periods=8760, freq='h', tz='Europe/Istanbul')\n"
+    "dataframe = pd.DataFrame({'date': idx, 'price': np.random.default_rng({seed}).gamma(9, 300, len(idx))})\n"
+    "owner = '{query}'\n"
+    "print(len(dataframe))",
+    # Aggregate
+    "daily = dataframe.set_index('date')['price'].resample('D').agg(['mean', 'min', 'max', 'std'])\n"
+    "hourly = dataframe.groupby(dataframe['date'].dt.hour)['price'].describe()\n"
+    "print(daily.describe().round(1).to_string())",
+    # Rolling statistics and outliers
+    "s = dataframe.set_index('date')['price']\n"
+    "z = (s - s.rolling(168, min_periods=24).mean()) / s.rolling(168, min_periods=24).std()\n"
+    "print(int((z.abs() > 3).sum()), owner == '{query}')",
+    # Chart
+    "import matplotlib.pyplot as plt\n"
+    "fig, ax = plt.subplots(figsize=(10, 4))\n"
+    "daily['mean'].plot(ax=ax)\n"
+    "fig.savefig(r'{output}', dpi=80)\n"
+    "plt.close(fig)\n"
+    "print('saved')",
+]
+
+
+def run_query(query, steps, output_dir):
+    """Run one query's snippets in its own session, returning per-execution latencies"""
+    latencies, outputs = [], []
+    with repl_session(query):
+        for step in range(steps):
+            code = (SNIPPETS[step % len(SNIPPETS)]
+                    .replace("{seed}", str(sum(map(ord, query))))
+                    .replace("{query}", query)
+                    .replace("{output}", os.path.join(output_dir, f"{query}-{step}.png")))
+            start = time.perf_counter()
+            outputs.append(execute_python_code.invoke({"code": code}))
+            latencies.append(time.perf_counter() - start)
+    # Every session saw only its own `owner`
+    isolated = all("False" not in output for output in outputs[2::len(SNIPPETS)])
+    return latencies, isolated
+
+
+def run_batch(queries, steps, output_dir):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=queries) as executor:
+        results = list(executor.map(lambda i: run_query(f"q{i}", steps, output_dir), range(queries)))
+    wall = time.perf_counter() - start
+    latencies = sorted(latency for query_latencies, _ in results for latency in query_latencies)
+    return wall, latencies, all(isolated for _, isolated in results)
+
+
+def report(label, wall, latencies, isolated):
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{label:<16}{wall:>9.2f}{len(latencies) / wall:>11.1f}{statistics.median(latencies) * 1e3:>10.0f}"
+          f"{p95 * 1e3:>10.0f}  {'yes' if isolated else 'NO'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=8, help="Concurrent analysis queries")
+    parser.add_argument("--steps", type=int, default=4, help="REPL executions per query")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Pool sizes to compare")
+    args = parser.parse_args()
+
+    print(f"{args.queries} concurrent queries x {args.steps} executions, {os.cpu_count()} CPUs")
+    print(f"{'mode':<16}{'wall s':>9}{'exec/s':>11}{'p50 ms':>10}{'p95 ms':>10}  isolated")
+    with tempfile.TemporaryDirectory() as output_dir:
+        previous = set_repl_pool(None)
+        try:
+            run_batch(1, 1, output_dir)  # import pandas and matplotlib before timing
+            report("in-process", *run_batch(args.queries, args.steps, output_dir))
+            for size in args.workers:
+                pool = ReplWorkerPool(size).wait_ready()
+                set_repl_pool(pool)
+                try:
+                    report(f"pool of {size}", *run_batch(args.queries, args.steps, output_dir))
+                finally:
+                    pool.close()
+        finally:
+            set_repl_pool(previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Cold start of the web portal.
+
+Each run starts a fresh interpreter on scripted models (no OpenAI calls, no network) and
+times, in order:
+
+- import: `import web_app`, what the server pays before it can listen,
+- listening: import plus starting the Dash server until it answers its first request,
+- portal: building the portal on first use (models, checkpointer, workflow graph),
+- index: building the API metadata index, cold (RAG_INDEX_CACHE empty) and from the
+  on-disk cache,
+- repl: the first REPL execution, which imports pandas and matplotlib.
+
+Usage:
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+STAGES = """
+import json, sys, time
+start = time.perf_counter()
+import web_app
+timings = {"import": time.perf_counter() - start}
+start = time.perf_counter()
+web_app.get_portal()
+timings["portal"] = time.perf_counter() - start
+from tools import rag
+start = time.perf_counter()
+rag.get_vector_store()
+timings["index"] = time.perf_counter() - start
+from tools.python_repl import execute_python_code
+start = time.perf_counter()
+execute_python_code.invoke({"code": "print(1)"})
+timings["repl"] = time.perf_counter() - start
+print("TIMINGS " + json.dumps(timings))
+"""
+
+SERVER = """
+import sys
+import web_app
+web_app.warm_up_in_background()
+web_app.app.run(host="127.0.0.1", port=int(sys.argv[1]))
+"""
+
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child_workdir(tmp):
+    """A scratch working directory, so the portal's databases and logs stay out of the repo"""
+    workdir = os.path.join(tmp, "work")
+    os.makedirs(workdir, exist_ok=True)
+    if not os.path.exists(os.path.join(workdir, "data")):
+        os.symlink(os.path.join(REPO, "data"), os.path.join(workdir, "data"))
+    return workdir
+
+
+def child_env(index_cache):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO, env.get("PYTHONPATH")])),
+        "PORTAL_LLM": "fake",
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "unused-by-scripted-runs"),
+        "RAG_INDEX_CACHE": index_cache,
+        "PORTAL_TRACING": "0",
+    })
+    return env
+
+
+def run_stages(workdir, index_cache):
+    """Time the startup stages in a fresh interpreter"""
+    output = subprocess.run([sys.executable, "-c", STAGES], capture_output=True, text=True, cwd=workdir,
+                            env=child_env(index_cache), check=True).stdout
+    line = next(line for line in output.splitlines() if line.startswith("TIMINGS "))
+    return json.loads(line[len("TIMINGS "):])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_listening(workdir, index_cache, timeout=120.0):
+    """Seconds from starting the server process until it serves the portal page"""
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", SERVER, str(port)], cwd=workdir,
+                               env=child_env(index_cache), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError("The portal did not start listening")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir, cache = child_workdir(tmp), os.path.join(tmp, "rag_index.json")
+        cold = [run_stages(workdir, "") for _ in range(args.runs)]
+        run_stages(workdir, cache)
+        warm = [run_stages(workdir, cache) for _ in range(args.runs)]
+        listening = [time_to_listening(workdir, cache) for _ in range(args.runs)]
+
+    def median_ms(values):
+        return statistics.median(values) * 1e3
+
+    print(f"median of {args.runs} fresh interpreters, scripted models")
+    print(f"{'stage':<28}{'ms':>10}")
+    rows = [
+        ("import web_app", median_ms([t["import"] for t in cold])),
+        ("server listening", median_ms(listening)),
+        ("portal on first use", median_ms([t["portal"] for t in cold])),
+        ("index, cold", median_ms([t["index"] for t in cold])),
+        ("index, from disk cache", median_ms([t["index"] for t in warm])),
+        ("first REPL execution", median_ms([t["repl"] for t in cold])),
+    ]
+    for stage, ms in rows:
+        print(f"{stage:<28}{ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
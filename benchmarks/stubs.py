@@ -0,0 +1,163 @@
+"""Agent stubs shared by the benchmarks, simulating LLM/tool latency without network calls."""
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, FunctionMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class SleepAgent:
+    """Agent stub that waits like a network-bound LLM call"""
+
+    def __init__(self, output, latency):
+        self.output = output
+        self.latency = latency
+
+    def respond(self, state):
+        return self.output
+
+    def delay(self, state):
+        return self.latency
+
+    def invoke(self, state, config=None, **kwargs):
+        time.sleep(self.delay(state))
+        return self.respond(state)
+
+    async def ainvoke(self, state, config=None, **kwargs):
+        await asyncio.sleep(self.delay(state))
+        return self.respond(state)
+
+
+class SupervisorStub(SleepAgent):
+    """Process agent stub walking the analysis workflow: Analysis → Visualization → Report → FINISH"""
+
+    def __init__(self, latency):
+        super().__init__(None, latency)
+
+    def respond(self, state):
+        for key, step in [("analysis_state", "Analysis"), ("visualization_state", "Visualization"),
+                          ("report_state", "Report")]:
+            if not state.get(key):
+                return {"next": step, "task": ""}
+        return {"next": "FINISH", "task": ""}
+
+
+class VisualizationStub(SleepAgent):
+    """Visualization agent stub that spends `latency` per insight it has to chart"""
+
+    def _insights(self, state):
+        analysis = state.get("analysis")
+        return analysis.insights if analysis is not None else []
+
+    def delay(self, state):
+        return self.latency * max(len(self._insights(state)), 1)
+
+    def respond(self, state):
+        entries = [{"file": f"visualization_{insight.finding}.png", "description": insight.finding}
+                   for insight in self._insights(state)]
+        return {"output": json.dumps({"visualizations": entries})}
+
+
+def analysis_agents(latency, insights=3):
+    """Stub agents for every node of the analysis workflow"""
+    analysis = {"insights": [{"finding": f"insight{i}", "viz_recommendation": "line"} for i in range(insights)]}
+    return {
+        "query_agent": SleepAgent({"output": '{"parameters": {}}'}, latency),
+        "retrieval_agent": SleepAgent({"output": '{"api_calls": []}'}, latency),
+        "api_agent": SleepAgent({"output": 'compact_json:{"items":[]}'}, latency),
+        "process_agent": SupervisorStub(latency),
+        "analysis_agent": SleepAgent({"output": json.dumps(analysis)}, latency),
+        "visualization_agent": VisualizationStub(None, latency),
+        "report_agent": SleepAgent({"output": '{"report": "done"}'}, latency),
+    }
+
+
+class ScriptedToolCallModel(BaseChatModel):
+    """
+    Chat model stub that calls a tool once per entry in `calls`, then answers.
+
+    Bound with `tools` (tools-style agent) it issues every call in a single turn; bound
+    with `functions` (functions-style agent) it can only issue one call per turn. Every
+    turn waits `latency` seconds like a model round trip.
+    """
+
+    tool_name: str
+    calls: list
+    latency: float = 0.2
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-tool-call"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        done = sum(isinstance(m, (ToolMessage, FunctionMessage)) for m in messages)
+        if done >= len(self.calls):
+            message = AIMessage(content=json.dumps({"results": done}))
+        elif "tools" in kwargs:
+            message = AIMessage(content="", tool_calls=[
+                {"name": self.tool_name, "args": args, "id": f"call_{i}"} for i, args in enumerate(self.calls)
+            ])
+        else:
+            message = AIMessage(content="", additional_kwargs={
+                "function_call": {"name": self.tool_name, "arguments": json.dumps(self.calls[done])}
+            })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class _TransparencyHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/cas"):
+            body = b"TGT-stub"
+        else:
+            body = json.dumps({"items": self.server.items(json.loads(request or b"{}"))}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain" if self.path.startswith("/cas") else "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TransparencyServerStub:
+    """
+    Local stand-in for the EPİAŞ Transparency API and its ticket service.
+
+    Answers every data request with one hourly price item per hour of the requested range
+    (January 2024 by default). Used as a context manager, it points `tools.epias_api` at
+    itself for the duration of the block.
+    """
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _TransparencyHandler)
+        self.server.items = self.items
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    @staticmethod
+    def items(body):
+        start = datetime.fromisoformat((body.get("startDate") or "2024-01-01T00:00:00+03:00")[:19])
+        end = datetime.fromisoformat((body.get("endDate") or "2024-01-31T00:00:00+03:00")[:19]) + timedelta(days=1)
+        hours = int((end - start).total_seconds() // 3600)
+        return [{"date": (start + timedelta(hours=h)).isoformat() + "+03:00", "hour": f"{h % 24:02d}:00",
+                 "price": round(2000 + 500 * ((h % 24) / 23), 2)} for h in range(max(hours, 0))]
+
+    def __enter__(self):
+        import tools.epias_api as epias_api
+        self._patched = epias_api, epias_api.HOST, epias_api.TOKEN_URL
+        epias_api.HOST, epias_api.TOKEN_URL = self.url, self.url + "/cas/v1/tickets"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        epias_api, host, token_url = self._patched
+        epias_api.HOST, epias_api.TOKEN_URL = host, token_url
+        self.server.shutdown()
+        self.server.server_close()
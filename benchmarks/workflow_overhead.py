@@ -0,0 +1,206 @@
+"""
+Orchestration overhead of the real workflow on scripted models.
+
+Runs the data, visualization and analysis workflows through the real `Workflow` graph,
+agents and tools, with every model replaced by `core.fake_llm.ScriptedChatModel` and the
+EPİAŞ API by a local stub server, so timings are deterministic and cost nothing. Reports,
+per workflow:
+
+- per-node time, split into model time (the scripted latency), tool time and the node's
+  own time (prompt building, parsing, state handling),
+- graph overhead: wall time not spent inside any node (scheduling, reducers, routing),
+- peak traced memory (tracemalloc) of one run and the process peak RSS.
+
+Each workflow gets one untimed warm-up run first, so the plan cache and imports are warm.
+
+Usage:
+    python -m benchmarks.workflow_overhead --runs 5 --latency 0.0
+    python -m benchmarks.workflow_overhead --runs 3 --latency 0.2 --mode async
+"""
+import os
+
+# Scripted models everywhere, including the retriever's embeddings. The OpenAI key is only
+# needed to construct clients that the scripted runs never call.
+os.environ["PORTAL_LLM"] = "fake"
+os.environ.setdefault("OPENAI_API_KEY", "unused-by-scripted-runs")
+
+import argparse
+import asyncio
+import resource
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from benchmarks.stubs import TransparencyServerStub
+from core.fake_llm import default_script, scripted_models
+from core.llm import LLM
+from core.state import initial_state
+from core.workflow import Workflow
+
+WORKFLOW_QUERIES = {
+    "data": "Ocak 2024 PTF verilerini getir",
+    "visualization": "Ocak 2024 PTF çizgi grafik",
+    "analysis": "Ocak 2024 PTF analiz et",
+}
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Records when each graph node ran and how long its model and tool calls took"""
+
+    run_inline = True
+
+    def __init__(self):
+        self.nodes = []
+        self.model_time = defaultdict(float)
+        self.tool_time = defaultdict(float)
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def _start(self, kind, run_id, metadata, name=None):
+        node = (metadata or {}).get("langgraph_node")
+        # Node runs are the chains named after their node, the rest are nested runnables
+        if node is None or (kind == "node" and name != node):
+            return
+        with self._lock:
+            self._open[run_id] = (kind, node, time.perf_counter())
+
+    def _end(self, run_id):
+        with self._lock:
+            entry = self._open.pop(run_id, None)
+            if entry is None:
+                return
+            kind, node, start = entry
+            now = time.perf_counter()
+            if kind == "node":
+                self.nodes.append((node, start, now))
+            elif kind == "model":
+                self.model_time[node] += now - start
+            else:
+                self.tool_time[node] += now - start
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        self._start("node", run_id, metadata, kwargs.get("name"))
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start("model", run_id, metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, metadata=None, **kwargs):
+        self._start("tool", run_id, metadata)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def busy_time(self):
+        """Total time at least one node was running, parallel branches counted once"""
+        busy, current_start, current_end = 0.0, None, None
+        for start, end in sorted((start, end) for _, start, end in self.nodes):
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    busy += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            busy += current_end - current_start
+        return busy
+
+
+def run_once(graph, query, mode):
+    """Run one query, returning its wall time and node timings"""
+    timer = NodeTimer()
+    config = {"recursion_limit": 40, "callbacks": [timer]}
+    start = time.perf_counter()
+    if mode == "async":
+        async def run():
+            async for _ in graph.astream(initial_state(query), config, stream_mode="values"):
+                pass
+        asyncio.run(run())
+    else:
+        for _ in graph.stream(initial_state(query), config, stream_mode="values"):
+            pass
+    return time.perf_counter() - start, timer
+
+
+def peak_memory(graph, query, mode):
+    """Peak traced allocations of one run, in MiB"""
+    tracemalloc.start()
+    try:
+        run_once(graph, query, mode)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def summarize(runs):
+    """Average node, model, tool and overhead times over the timed runs, in ms"""
+    per_node = defaultdict(lambda: {"calls": 0, "total": 0.0})
+    for _, timer in runs:
+        for node, start, end in timer.nodes:
+            per_node[node]["calls"] += 1
+            per_node[node]["total"] += end - start
+    n = len(runs)
+    rows = []
+    for node, stats in per_node.items():
+        model = sum(timer.model_time[node] for _, timer in runs)
+        tool = sum(timer.tool_time[node] for _, timer in runs)
+        own = stats["total"] - model - tool
+        rows.append((node, stats["calls"] / n, stats["total"] / n * 1e3, model / n * 1e3, tool / n * 1e3,
+                     own / n * 1e3))
+    walls = [wall for wall, _ in runs]
+    overhead = [wall - timer.busy_time() for wall, timer in runs]
+    return rows, statistics.mean(walls) * 1e3, statistics.mean(overhead) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Timed runs per workflow")
+    parser.add_argument("--latency", type=float, default=0.0, help="Scripted seconds per model call")
+    parser.add_argument("--insights", type=int, default=2, help="Insights reported by the analysis agent")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync",
+                        help="Run with graph.stream or graph.astream")
+    args = parser.parse_args()
+
+    models = scripted_models(default_script(insights=args.insights), latency=args.latency)
+    workflow = Workflow(llms=LLM(models=models).get_models(), display_graph=False)
+    graph = workflow.get_graph()
+
+    print(f"{args.runs} runs per workflow, {args.mode} mode, scripted latency {args.latency:.3f}s per model call")
+    with TransparencyServerStub():
+        for name, query in WORKFLOW_QUERIES.items():
+            run_once(graph, query, args.mode)
+            runs = [run_once(graph, query, args.mode) for _ in range(args.runs)]
+            rows, wall, overhead = summarize(runs)
+            memory = peak_memory(graph, query, args.mode)
+
+            print(f"\n{name} workflow: wall {wall:.1f} ms, graph overhead {overhead:.1f} ms, "
+                  f"peak traced memory {memory:.1f} MiB")
+            print(f"{'node':<20}{'calls':>7}{'total ms':>11}{'model ms':>11}{'tool ms':>10}{'own ms':>10}")
+            for node, calls, total, model, tool, own in sorted(rows, key=lambda row: -row[2]):
+                print(f"{node:<20}{calls:>7.1f}{total:>11.1f}{model:>11.1f}{tool:>10.1f}{own:>10.1f}")
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nprocess peak RSS {peak_rss:.0f} MiB; model calls per agent: {models['llm_low'].calls()}")
+
+
+if __name__ == "__main__":
+    main()
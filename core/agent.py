@@ -1,7 +1,11 @@
-from langchain.agents import create_openai_functions_agent, AgentExecutor
+from langchain.agents import create_openai_functions_agent, create_openai_tools_agent, AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import threading
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.output_parsers.openai_functions import JsonOutputFunctionsParser
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 from typing import List
 from langchain.tools import tool
 import os
@@ -9,20 +13,70 @@ from logger import setup_logger
 
 logger = setup_logger("logs/agent.log")
 
+# Shared pool for tool calls issued in the same model turn
+_tool_pool = ThreadPoolExecutor(max_workers=int(os.getenv("AGENT_TOOL_WORKERS", "8")),
+                                thread_name_prefix="agent-tool")
+# Per-thread batch of actions planned in the current step
+_step_batch = threading.local()
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs all tool calls of a model turn concurrently.
+
+    The async path of AgentExecutor already gathers tool calls; this brings the same
+    behaviour to the sync path by running the planned actions in a shared thread pool.
+    """
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        # The base generator yields every planned action before performing any of them
+        _step_batch.actions = []
+        _step_batch.futures = {}
+        try:
+            for step in super()._iter_next_step(name_to_tool_map, color_mapping, inputs,
+                                                intermediate_steps, run_manager):
+                if isinstance(step, AgentAction):
+                    _step_batch.actions.append(step)
+                yield step
+        finally:
+            _step_batch.actions = []
+            _step_batch.futures = {}
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None) -> AgentStep:
+        actions = getattr(_step_batch, "actions", [])
+        futures = getattr(_step_batch, "futures", {})
+        if len(actions) < 2:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+
+        if not futures:
+            # First action of the turn, submit the whole batch
+            logger.info(f"Running {len(actions)} tool calls concurrently")
+            for action in actions:
+                context = contextvars.copy_context()
+                futures[id(action)] = _tool_pool.submit(
+                    context.run, AgentExecutor._perform_agent_action, self,
+                    name_to_tool_map, color_mapping, action, run_manager
+                )
+        return futures[id(agent_action)].result()
+
+
 def create_agent(
-        llm: ChatOpenAI,
+        llm: BaseChatModel,
         tools: list[tool],
         system_message: str,
         members: list[str],
+        parallel_tools: bool = False,
 ) -> AgentExecutor:
     """
     Create an agent with the given language model, tools, system message, and team members.
 
     Parameters:
-        llm (ChatOpenAI): The language model to use for the agent.
+        llm (BaseChatModel): The language model to use for the agent.
         tools (list[tool]): A list of tools the agent can use.
         system_message (str): A message defining the agent's role and tasks.
         members (list[str]): A list of team member roles for collaboration.
+        parallel_tools (bool): Use a tools-style agent that may issue several tool calls per
+            model turn and run them concurrently, instead of one function call per turn.
 
     Returns:
         AgentExecutor: An executor that manages the agent's task execution.
@@ -65,15 +119,20 @@ def create_agent(
     ])
 
     # Create the agent using the defined prompt and tools
-    agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
+    if parallel_tools:
+        agent = create_openai_tools_agent(llm=llm, tools=tools, prompt=prompt)
+        executor_class = ParallelAgentExecutor
+    else:
+        agent = create_openai_functions_agent(llm=llm, tools=tools, prompt=prompt)
+        executor_class = AgentExecutor
 
     logger.info("Agent created successfully")
 
     # Return an executor to manage the agent's task execution
-    return AgentExecutor.from_agent_and_tools(agent=agent, tools=tools, verbose=False, handle_parsing_errors=True)
+    return executor_class.from_agent_and_tools(agent=agent, tools=tools, verbose=False, handle_parsing_errors=True)
 
 
-def create_supervisor(llm: ChatOpenAI, system_prompt: str, members: list[str]) -> AgentExecutor:
+def create_supervisor(llm: BaseChatModel, system_prompt: str, members: list[str]) -> AgentExecutor:
     # Log the start of supervisor creation
     logger.info("Creating supervisor")
 
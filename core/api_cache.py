@@ -0,0 +1,70 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+from logger import setup_logger
+
+logger = setup_logger("logs/api_cache.log")
+
+
+class ApiResponseCache:
+    """
+    LRU cache of EPİAŞ Transparency API responses with a time to live.
+
+    Responses are keyed by the method, endpoint and canonical JSON body of the call, so
+    queries asking for the same data (e.g. the same month in several reports of a batch)
+    share a single request. Only successful responses are stored.
+    """
+
+    def __init__(self, ttl: Optional[float] = 3600, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(method: str, service: str, endpoint: str, body: Dict[str, Any]) -> str:
+        """Build the cache key of an API call"""
+        canonical = json.dumps([method.upper(), service, endpoint, body], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for `key`, None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, response: str) -> None:
+        """Store a response, evicting the least recently used one when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for monitoring"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,194 @@
+"""
+Content-addressed store of the files queries produce (chart PNGs, Plotly figure JSON).
+
+Agent code writes its files under a working directory of its own per query, so two queries
+saving "price_chart.png" can't overwrite each other. When a query's results are stored,
+`ArtifactStore.collect` copies every file its visualizations name into the store, under the
+SHA-256 of its content: a stored name never changes meaning, so the web server can serve it
+with a long-lived, immutable cache policy and the digest as its ETag. PNGs also get a small
+thumbnail for the query history.
+
+Layout under the root (ARTIFACT_DIR, default "artifacts"):
+
+    sessions/<query id>/      working directory of the query's code (REPL workers),
+                              removed once the results of a query that can't be
+                              resumed are stored
+    objects/<sha256>.<ext>    stored artifacts
+    objects/<sha256>.thumb.png
+"""
+from typing import Any, Dict, Optional
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+from logger import setup_logger
+
+logger = setup_logger("logs/artifacts.log")
+
+# Files an artifact may be, by extension, with the content type they are served as. No SVG:
+# agent-written markup served from the portal's origin could run scripts
+CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".json": "application/json"}
+THUMBNAIL_SIZE = (320, 200)
+THUMBNAIL_SUFFIX = ".thumb.png"
+# URL path the web server serves stored artifacts under
+URL_PREFIX = "/artifacts/"
+_NAME = re.compile(r"^[0-9a-f]{64}(\.thumb\.png|\.[a-z]+)$")
+_SESSION = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class ArtifactStore:
+    """
+    Files of finished queries stored by content, and the working directories of running ones.
+
+    Storing the same content twice is free, whichever query wrote it and under which name.
+    """
+
+    def __init__(self, root: str = "artifacts"):
+        self.root = os.path.abspath(root)
+        self.objects = os.path.join(self.root, "objects")
+        self.sessions = os.path.join(self.root, "sessions")
+
+    def _session_path(self, session: str) -> str:
+        return os.path.join(self.sessions, _SESSION.sub("_", session) or "_")
+
+    def session_dir(self, session: str) -> str:
+        """Working directory of a session's code, created on first use"""
+        path = self._session_path(session)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def remove_session(self, session: str) -> None:
+        """Delete a finished session's working directory, once its files were collected"""
+        shutil.rmtree(self._session_path(session), ignore_errors=True)
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of a stored artifact or thumbnail, None if the name isn't one the store gives out"""
+        if not _NAME.match(name):
+            return None
+        return os.path.join(self.objects, name)
+
+    def put(self, source: str) -> Optional[str]:
+        """
+        Store a file under the digest of its content.
+
+        Returns:
+            str | None: The stored name, None if the file isn't of a servable type.
+        """
+        extension = os.path.splitext(source)[1].lower()
+        if extension not in CONTENT_TYPES:
+            return None
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b""):
+                digest.update(chunk)
+        name = digest.hexdigest() + extension
+        target = os.path.join(self.objects, name)
+        if not os.path.exists(target):
+            os.makedirs(self.objects, exist_ok=True)
+            # Copy next to the target and rename, so a stored name is never seen half written
+            fd, temporary = tempfile.mkstemp(dir=self.objects, suffix=".tmp")
+            os.close(fd)
+            try:
+                shutil.copyfile(source, temporary)
+                os.replace(temporary, target)
+            except OSError:
+                os.unlink(temporary)
+                raise
+        return name
+
+    def thumbnail(self, name: str) -> Optional[str]:
+        """
+        Return the name of a stored image's thumbnail, made on first use.
+
+        None for artifacts that aren't raster images, or when Pillow is not installed.
+        """
+        if os.path.splitext(name)[1] not in (".png", ".jpg", ".jpeg") or name.endswith(THUMBNAIL_SUFFIX):
+            return None
+        thumbnail = name.split(".", 1)[0] + THUMBNAIL_SUFFIX
+        target = os.path.join(self.objects, thumbnail)
+        if os.path.exists(target):
+            return thumbnail
+        try:
+            from PIL import Image
+        except ImportError:
+            return None
+        fd, temporary = tempfile.mkstemp(dir=self.objects, suffix=".tmp")
+        os.close(fd)
+        try:
+            with Image.open(os.path.join(self.objects, name)) as image:
+                image.thumbnail(THUMBNAIL_SIZE)
+                image.save(temporary, format="PNG", optimize=True)
+            os.replace(temporary, target)
+        except OSError as e:
+            os.unlink(temporary)
+            logger.warning(f"Could not make a thumbnail of {name}: {e}")
+            return None
+        return thumbnail
+
+    def collect(self, visualization_data: Dict[str, Any], directory: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store the files visualization entries name, and point the entries at the stored copies.
+
+        Each entry's `file` / `figure` becomes the stored path, and a stored PNG gets a `url`
+        to serve it from and a `thumbnail` URL. Names that can't be found are left as they are,
+        and so are names outside `directory`: they are chosen by the model, and the store is
+        public.
+
+        Args:
+            directory: Directory the names were written in, the session's working directory
+                (the current directory by default).
+        """
+        base = os.path.realpath(directory or os.getcwd())
+        for entry in visualization_data.get("visualizations") or []:
+            for key in ("file", "figure"):
+                source = entry.get(key)
+                if not source or source.startswith(self.objects):
+                    continue
+                source = os.path.realpath(os.path.join(base, source))
+                if os.path.commonpath([base, source]) != base:
+                    logger.warning(f"Not storing artifact {entry[key]}, it is outside {base}")
+                    continue
+                try:
+                    name = self.put(source)
+                except OSError as e:
+                    logger.warning(f"Could not store artifact {source}: {e}")
+                    continue
+                if name is None:
+                    continue
+                entry[key] = os.path.join(self.objects, name)
+                if key == "file":
+                    entry["url"] = URL_PREFIX + name
+                    thumbnail = self.thumbnail(name)
+                    if thumbnail is not None:
+                        entry["thumbnail"] = URL_PREFIX + thumbnail
+        return visualization_data
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the process-wide artifact store, rooted at ARTIFACT_DIR (default "artifacts")"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore(os.getenv("ARTIFACT_DIR", "artifacts"))
+    return _store
+
+
+def set_artifact_store(store: ArtifactStore) -> Optional[ArtifactStore]:
+    """
+    Install the artifact store used by queries and the web server.
+
+    Returns:
+        ArtifactStore | None: The previously installed store, to restore later.
+    """
+    global _store
+    with _store_lock:
+        previous, _store = _store, store
+    return previous
@@ -0,0 +1,223 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.runnables.config import var_child_runnable_config
+from logger import setup_logger
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import os
+import threading
+import time
+
+logger = setup_logger("logs/budget.log")
+
+
+class BudgetExceeded(Exception):
+    """Raised when a query has used up one of its budgets"""
+
+
+def response_usage(response) -> Tuple[Optional[str], int, int, int]:
+    """
+    Extract the token usage of an LLM response.
+
+    Args:
+        response (LLMResult): The result passed to `on_llm_end` callbacks.
+
+    Returns:
+        tuple: (model name, prompt tokens, completion tokens, cached prompt tokens)
+    """
+    prompt = completion = cached = 0
+    model = (response.llm_output or {}).get("model_name")
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            if usage:
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+                cached += (usage.get("input_token_details") or {}).get("cache_read", 0)
+            model = model or (getattr(message, "response_metadata", None) or {}).get("model_name")
+    if not prompt and not completion:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt = token_usage.get("prompt_tokens", 0)
+        completion = token_usage.get("completion_tokens", 0)
+        cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    return model, prompt, completion, cached
+
+
+class QueryBudget:
+    """
+    Per-query limits on wall time, tokens, LLM calls and API calls.
+
+    A budget is shared by every node, agent and tool working on the same query through
+    `use_budget`. Limits set to None are not enforced. Once any usage reaches
+    `1 - reserve` of its limit the budget is "low" and the workflow degrades to returning
+    the data with a short report instead of running further analysis.
+    """
+
+    def __init__(self, max_seconds: Optional[float] = None, max_tokens: Optional[int] = None,
+                 max_llm_calls: Optional[int] = None, max_api_calls: Optional[int] = None,
+                 reserve: float = 0.2):
+        self.limits = {
+            "seconds": max_seconds,
+            "tokens": max_tokens,
+            "llm_calls": max_llm_calls,
+            "api_calls": max_api_calls,
+        }
+        self.reserve = reserve
+        self.started = time.monotonic()
+        self.tokens = 0
+        self.llm_calls = 0
+        self.api_calls = 0
+        self.degradations: List[str] = []
+        self._lock = threading.Lock()
+        self.callback = BudgetCallback(self)
+
+    @classmethod
+    def from_env(cls) -> "QueryBudget":
+        """
+        Build a budget from the QUERY_MAX_SECONDS, QUERY_MAX_TOKENS, QUERY_MAX_LLM_CALLS and
+        QUERY_MAX_API_CALLS environment variables. An empty value disables that limit.
+        """
+        def limit(name, default, cast):
+            value = os.getenv(name, default)
+            return cast(value) if value not in (None, "") else None
+
+        return cls(
+            max_seconds=limit("QUERY_MAX_SECONDS", "300", float),
+            max_tokens=limit("QUERY_MAX_TOKENS", "250000", int),
+            max_llm_calls=limit("QUERY_MAX_LLM_CALLS", "40", int),
+            max_api_calls=limit("QUERY_MAX_API_CALLS", "40", int),
+        )
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def _used(self) -> Dict[str, float]:
+        return {
+            "seconds": self.elapsed(),
+            "tokens": self.tokens,
+            "llm_calls": self.llm_calls,
+            "api_calls": self.api_calls,
+        }
+
+    def fractions(self) -> Dict[str, float]:
+        """Return the used fraction of every enforced limit"""
+        used = self._used()
+        return {name: used[name] / limit for name, limit in self.limits.items() if limit}
+
+    def exceeded(self) -> Optional[str]:
+        """Return the name of the first exhausted limit, None if all have room left"""
+        return next((name for name, fraction in self.fractions().items() if fraction >= 1), None)
+
+    def low(self) -> bool:
+        """True once any limit has less than `reserve` of its budget left"""
+        return any(fraction >= 1 - self.reserve for fraction in self.fractions().values())
+
+    def check(self) -> None:
+        """Raise BudgetExceeded if any limit is exhausted"""
+        reason = self.exceeded()
+        if reason is not None:
+            raise BudgetExceeded(f"Query {reason} budget exhausted")
+
+    def charge_llm_call(self) -> None:
+        """Count an LLM call, refusing it if the budget is exhausted"""
+        with self._lock:
+            self.check()
+            self.llm_calls += 1
+
+    def charge_api_call(self) -> None:
+        """Count an API call, refusing it if the budget is exhausted"""
+        with self._lock:
+            self.check()
+            self.api_calls += 1
+
+    def add_tokens(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens += tokens
+
+    def degrade(self, action: str) -> None:
+        """Record a step that was skipped or shortened to stay within budget"""
+        logger.warning(f"Budget degradation: {action}")
+        with self._lock:
+            self.degradations.append(action)
+
+    def usage(self) -> Dict[str, Any]:
+        """Return the usage so far, with the limits, for storing alongside the query"""
+        with self._lock:
+            return {
+                **{name: round(value, 3) for name, value in self._used().items()},
+                "limits": dict(self.limits),
+                "exceeded": self.exceeded(),
+                "degradations": list(self.degradations),
+            }
+
+
+class BudgetCallback(BaseCallbackHandler):
+    """Callback that charges every LLM call and its tokens to a query budget"""
+
+    # Let BudgetExceeded abort the run instead of being logged and ignored
+    raise_error = True
+
+    def __init__(self, budget: QueryBudget):
+        self.budget = budget
+
+    def on_llm_start(self, serialized, prompts, **kwargs: Any) -> None:
+        self.budget.charge_llm_call()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs: Any) -> None:
+        self.budget.charge_llm_call()
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        _, prompt, completion, _ = response_usage(response)
+        self.budget.add_tokens(prompt + completion)
+
+
+def add_callback(callbacks: Any, handler: BaseCallbackHandler) -> Any:
+    """
+    Return `callbacks` (a list, a callback manager or None) with `handler` added.
+
+    Managers are copied rather than flattened into a list, so runs started with the result
+    stay children of the manager's parent run.
+    """
+    if isinstance(callbacks, BaseCallbackManager):
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+        return callbacks
+    return list(callbacks or []) + [handler]
+
+
+_current_budget: ContextVar[Optional[QueryBudget]] = ContextVar("query_budget", default=None)
+
+
+def current_budget() -> Optional[QueryBudget]:
+    """Return the budget of the query running in this context, if any"""
+    return _current_budget.get()
+
+
+@contextmanager
+def use_budget(budget: Optional[QueryBudget]) -> Iterator[Optional[QueryBudget]]:
+    """
+    Make `budget` the current query budget for the enclosed graph run.
+
+    The budget travels in a context variable, so it reaches the graph's worker threads,
+    async tasks and the tools without being stored in the (serializable) graph state.
+    """
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def budget_config() -> Optional[Dict[str, Any]]:
+    """
+    Return a run config charging agent LLM calls to the current budget.
+
+    The callbacks inherited from the enclosing run (e.g. the graph node's) are kept, so
+    handlers attached to the whole graph run still see the agent's LLM and tool calls.
+    """
+    budget = current_budget()
+    if budget is None:
+        return None
+    inherited = (var_child_runnable_config.get() or {}).get("callbacks")
+    return {"callbacks": add_callback(inherited, budget.callback)}
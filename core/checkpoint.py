@@ -0,0 +1,153 @@
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite import SqliteSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.types import StateSnapshot
+from core.schemas import STATE_MODELS
+from core.tracing import span
+from logger import setup_logger
+from typing import Any, Iterable, Optional, Tuple
+import aiosqlite
+import sqlite3
+import zlib
+
+logger = setup_logger("logs/checkpoint.log")
+
+# Suffix marking a compressed blob in the checkpoint type column
+COMPRESSED_SUFFIX = "+zlib"
+
+
+class CompressedSerializer(SerializerProtocol):
+    """
+    Checkpoint serializer that zlib-compresses large state blobs.
+
+    States carry the full API result and every agent message, so blobs compress well.
+    Blobs smaller than `min_size` are stored as is; compressed ones are tagged with a
+    type suffix, so checkpoints written without compression still load.
+    """
+
+    def __init__(self, level: int = 6, min_size: int = 1024):
+        self.level = level
+        self.min_size = min_size
+        self.serde = JsonPlusSerializer(
+            allowed_msgpack_modules=[(model.__module__, model.__name__) for model in STATE_MODELS]
+        )
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        if len(data) < self.min_size:
+            return type_, data
+        return type_ + COMPRESSED_SUFFIX, zlib.compress(data, self.level)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, blob = data
+        if type_.endswith(COMPRESSED_SUFFIX):
+            type_, blob = type_[:-len(COMPRESSED_SUFFIX)], zlib.decompress(blob)
+        return self.serde.loads_typed((type_, blob))
+
+
+class TracedSqliteSaver(SqliteSaver):
+    """SqliteSaver recording every checkpoint write as a "db" span of the running query"""
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with span("checkpoint", "db", step=metadata.get("step")):
+            return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        with span("checkpoint_writes", "db", writes=len(writes)):
+            return super().put_writes(config, writes, task_id, task_path)
+
+
+class TracedAsyncSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver recording every checkpoint write as a "db" span of the running query"""
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with span("checkpoint", "db", step=metadata.get("step")):
+            return await super().aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        with span("checkpoint_writes", "db", writes=len(writes)):
+            return await super().aput_writes(config, writes, task_id, task_path)
+
+
+def sqlite_checkpointer(path: str = "checkpoints.db") -> SqliteSaver:
+    """
+    Create a SQLite checkpointer for graphs run with `graph.stream`.
+
+    Args:
+        path (str): The SQLite database file.
+
+    Returns:
+        SqliteSaver: The checkpointer, shared by every query thread.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False)
+    saver = TracedSqliteSaver(conn, serde=CompressedSerializer())
+    saver.setup()
+    logger.info(f"SQLite checkpointer ready at {path}")
+    return saver
+
+
+async def async_sqlite_checkpointer(path: str = "checkpoints.db") -> AsyncSqliteSaver:
+    """
+    Create a SQLite checkpointer for graphs run with `graph.astream`.
+
+    Must be awaited on the event loop the graph will run on.
+
+    Args:
+        path (str): The SQLite database file.
+
+    Returns:
+        AsyncSqliteSaver: The checkpointer, bound to the running event loop.
+    """
+    conn = await aiosqlite.connect(path)
+    saver = TracedAsyncSqliteSaver(conn, serde=CompressedSerializer())
+    await saver.setup()
+    logger.info(f"Async SQLite checkpointer ready at {path}")
+    return saver
+
+
+def has_agent_error(state: Optional[dict]) -> bool:
+    """True if any agent recorded an error in the given graph state"""
+    messages = (state or {}).get("messages") or []
+    return any(
+        isinstance(message, AIMessage) and str(message.content).startswith("Error:")
+        for message in messages
+    )
+
+
+def last_good_checkpoint(history: Iterable[StateSnapshot]) -> Optional[StateSnapshot]:
+    """
+    Find the checkpoint to resume a failed query from.
+
+    This is the latest checkpoint written before any agent recorded an error, so its
+    pending node is the one that failed (or, if the run raised, the one it stopped at)
+    and everything upstream of it is reused.
+
+    Args:
+        history: The thread's snapshots, newest first as returned by `get_state_history`.
+
+    Returns:
+        StateSnapshot | None: The snapshot to resume from, None if there is nothing to resume.
+    """
+    snapshots = list(history)
+    if not snapshots:
+        return None
+    # Follow the latest run's lineage only, earlier retries fork the thread into branches
+    by_id = {snapshot.config["configurable"]["checkpoint_id"]: snapshot for snapshot in snapshots}
+    lineage = []
+    snapshot = snapshots[0]
+    while snapshot is not None:
+        lineage.append(snapshot)
+        parent = (snapshot.parent_config or {}).get("configurable", {}).get("checkpoint_id")
+        snapshot = by_id.get(parent)
+
+    good = None
+    for snapshot in reversed(lineage):
+        if has_agent_error(snapshot.values):
+            break
+        good = snapshot
+    if good is None or not good.next:
+        return None
+    logger.info(f"Last good checkpoint {good.config['configurable'].get('checkpoint_id')}, resuming at {good.next}")
+    return good
@@ -0,0 +1,304 @@
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage, FunctionMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from core.query_parser import WORKFLOW_ANALYSIS, WORKFLOW_DATA, WORKFLOW_VISUALIZATION
+from core.schemas import load_json_content
+from logger import setup_logger
+from pydantic import Field, PrivateAttr
+from typing import Any, Callable, Dict, List, Optional, Union
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+logger = setup_logger("logs/fake_llm.log")
+
+# Distinctive part of each agent's system prompt, used to tell which agent is calling
+AGENT_MARKERS = {
+    "query_agent": "NLP query parser",
+    "retrieval_agent": "API Documentation Retriever",
+    "api_agent": "You are an API expert agent",
+    "process_agent": "expert supervisor",
+    "analysis_agent": "data analysis expert",
+    "visualization_agent": "data visualization expert",
+    "report_agent": "expert report generator",
+}
+
+# A turn is a dict, or a callable building one from the prompt messages:
+#   {"tool_calls": [{"name": ..., "args": {...}}, ...]}  request tool calls
+#   {"content": "..."}                                    answer
+#   {"arguments": {...}}                                  answer a forced function call
+Turn = Union[Dict[str, Any], Callable[[List[BaseMessage]], Dict[str, Any]]]
+
+
+def fake_llm_enabled() -> bool:
+    """True if the portal should run on scripted models instead of OpenAI (PORTAL_LLM=fake)"""
+    return os.getenv("PORTAL_LLM", "openai").lower() == "fake"
+
+
+def _tokens(text: str) -> int:
+    # Rough OpenAI-like estimate, enough to exercise budgets and usage accounting
+    return max(1, len(text) // 4)
+
+
+def _system_prompt(messages: List[BaseMessage]) -> str:
+    return next((str(m.content) for m in messages if isinstance(m, SystemMessage)), "")
+
+
+def _tool_turns_taken(messages: List[BaseMessage]) -> int:
+    """Number of model turns of the current agent run that requested tools"""
+    return sum(
+        isinstance(m, AIMessage) and bool(m.tool_calls or m.additional_kwargs.get("function_call"))
+        for m in messages
+    )
+
+
+def _agent_message(messages: List[BaseMessage], name: str) -> Optional[str]:
+    """Return the latest message content recorded by agent `name`, or its *_state slot"""
+    for message in reversed(messages):
+        if getattr(message, "name", None) == name:
+            return str(message.content)
+    prefix = f"{name.replace('_agent', '')}_state: "
+    for message in reversed(messages):
+        content = str(message.content)
+        if content.startswith(prefix) and len(content) > len(prefix):
+            return content[len(prefix):]
+    return None
+
+
+def _user_query(messages: List[BaseMessage]) -> str:
+    return next((str(m.content) for m in messages if isinstance(m, HumanMessage)), "")
+
+
+def _last_tool_result(messages: List[BaseMessage]) -> str:
+    return next((str(m.content) for m in reversed(messages) if isinstance(m, (ToolMessage, FunctionMessage))), "")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Deterministic chat model replaying scripted turns per agent, for offline runs and benchmarks.
+
+    The calling agent is recognized from its system prompt (`markers`), and the turn from the
+    number of tool-requesting turns already in the prompt. Bound with `tools` (tools-style
+    agents) a turn issues all its tool calls at once; bound with `functions` each call takes
+    its own turn, like the real models. Every call waits `latency` seconds (per agent if a
+    dict) and reports token usage estimated from the text.
+    """
+
+    script: Dict[str, List[Turn]] = Field(default_factory=dict)
+    latency: Union[float, Dict[str, float]] = 0.0
+    markers: Dict[str, str] = Field(default_factory=lambda: dict(AGENT_MARKERS))
+    model_name: str = "scripted"
+
+    _calls: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    def bind_functions(self, functions: List[Dict[str, Any]], function_call: Optional[str] = None, **kwargs):
+        """Mirror `ChatOpenAI.bind_functions`, used by the supervisor"""
+        if function_call is not None:
+            kwargs["function_call"] = {"name": function_call}
+        return self.bind(functions=functions, **kwargs)
+
+    def calls(self) -> Dict[str, int]:
+        """Return the number of model calls made per agent"""
+        with self._lock:
+            return dict(self._calls)
+
+    def _agent(self, messages: List[BaseMessage]) -> str:
+        system = _system_prompt(messages)
+        agent = next((name for name, marker in self.markers.items() if marker in system), None)
+        if agent is None or agent not in self.script:
+            raise ValueError(f"No script for prompt starting {system[:80]!r}")
+        return agent
+
+    def _delay(self, agent: str) -> float:
+        if isinstance(self.latency, dict):
+            return self.latency.get(agent, 0.0)
+        return self.latency
+
+    def _turn(self, agent: str, messages: List[BaseMessage], parallel: bool) -> Dict[str, Any]:
+        # Function-calling agents issue one call per turn, so tool turns are split up
+        turns = []
+        for turn in self.script[agent]:
+            turn = turn(messages) if callable(turn) else turn
+            if "tool_calls" in turn and not parallel:
+                turns.extend({"tool_calls": [call]} for call in turn["tool_calls"])
+            else:
+                turns.append(turn)
+            if len(turns) > _tool_turns_taken(messages):
+                break
+        return turns[min(_tool_turns_taken(messages), len(turns) - 1)]
+
+    def _respond(self, messages: List[BaseMessage], **kwargs: Any) -> ChatResult:
+        agent = self._agent(messages)
+        with self._lock:
+            self._calls[agent] = self._calls.get(agent, 0) + 1
+        turn = self._turn(agent, messages, parallel="tools" in kwargs)
+
+        if "tool_calls" in turn and "tools" in kwargs:
+            message = AIMessage(content="", tool_calls=[
+                {"name": call["name"], "args": call.get("args", {}), "id": f"call_{uuid.uuid4().hex[:12]}"}
+                for call in turn["tool_calls"]
+            ])
+            text = json.dumps(turn["tool_calls"])
+        elif "tool_calls" in turn:
+            call = turn["tool_calls"][0]
+            text = json.dumps(call.get("args", {}), ensure_ascii=False)
+            message = AIMessage(content="", additional_kwargs={
+                "function_call": {"name": call["name"], "arguments": text}
+            })
+        elif "arguments" in turn:
+            name = (kwargs.get("function_call") or {}).get("name", "route")
+            text = json.dumps(turn["arguments"], ensure_ascii=False)
+            message = AIMessage(content="", additional_kwargs={"function_call": {"name": name, "arguments": text}})
+        else:
+            text = turn["content"]
+            message = AIMessage(content=text)
+
+        prompt_tokens = sum(_tokens(str(m.content)) for m in messages)
+        completion_tokens = _tokens(text)
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        message.response_metadata = {"model_name": self.model_name}
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"model_name": self.model_name})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay = self._delay(self._agent(messages))
+        if delay:
+            time.sleep(delay)
+        return self._respond(messages, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        delay = self._delay(self._agent(messages))
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(messages, **kwargs)
+
+
+def _scripted_query(messages: List[BaseMessage]) -> Dict[str, Any]:
+    text = _user_query(messages).lower()
+    if "analy" in text or "analiz" in text:
+        workflow = WORKFLOW_ANALYSIS
+    elif any(word in text for word in ("chart", "plot", "grafik", "visual")):
+        workflow = WORKFLOW_VISUALIZATION
+    else:
+        workflow = WORKFLOW_DATA
+    parameters = {
+        "startDate": "2024-01-01T00:00:00+03:00",
+        "endDate": "2024-01-31T00:00:00+03:00",
+        "dataTypes": ["MCP"],
+        "workflow": workflow,
+        "chartType": "line" if workflow != WORKFLOW_DATA else None,
+        "description": _user_query(messages),
+    }
+    return {"content": json.dumps({"intent": workflow, "parameters": parameters})}
+
+
+def _scripted_plan(messages: List[BaseMessage]) -> Dict[str, Any]:
+    query = load_json_content(_agent_message(messages, "query_agent") or "") or {}
+    parameters = query.get("parameters") or {}
+    body = {"startDate": parameters.get("startDate"), "endDate": parameters.get("endDate")}
+    plan = {"api_calls": [{"method": "POST", "service": "/electricity-service",
+                           "endpoint": "/v1/markets/dam/data/mcp", "body": body}]}
+    return {"content": json.dumps(plan)}
+
+
+def _scripted_api_calls(messages: List[BaseMessage]) -> Dict[str, Any]:
+    plan = load_json_content(_agent_message(messages, "retrieval_agent") or "") or {}
+    return {"tool_calls": [{"name": "call_transparency_api", "args": call}
+                           for call in plan.get("api_calls", [])]}
+
+
+def _scripted_api_result(messages: List[BaseMessage]) -> Dict[str, Any]:
+    return {"content": "compact_json:" + (_last_tool_result(messages) or '{"items":[]}')}
+
+
+def _scripted_analysis_code(messages: List[BaseMessage]) -> Dict[str, Any]:
+    # The API data is preloaded in the REPL as `dataframe`
+    code = "print(dataframe.describe().to_json())"
+    return {"tool_calls": [{"name": "execute_python_code", "args": {"code": code}}]}
+
+
+def _scripted_supervisor(messages: List[BaseMessage]) -> Dict[str, Any]:
+    query = load_json_content(_agent_message(messages, "query_agent") or "") or {}
+    workflow = (query.get("parameters") or {}).get("workflow", WORKFLOW_DATA)
+    steps = {
+        WORKFLOW_DATA: [],
+        WORKFLOW_VISUALIZATION: ["Visualization", "Report"],
+        WORKFLOW_ANALYSIS: ["Analysis", "Visualization", "Report"],
+    }.get(workflow, [])
+    done = {getattr(m, "name", None) for m in messages}
+    for step in steps:
+        if f"{step.lower()}_agent" not in done:
+            return {"arguments": {"next": step, "task": f"Run the {step.lower()} step"}}
+    return {"arguments": {"next": "FINISH", "task": ""}}
+
+
+def default_script(insights: int = 2, output_dir: Optional[str] = None) -> Dict[str, List[Turn]]:
+    """
+    Script every agent through the data, visualization and analysis workflows.
+
+    Tools run for real: the retriever, the EPİAŞ API tool and the Python REPL (which
+    computes statistics and saves charts to `output_dir`, a temporary directory by default).
+
+    Args:
+        insights (int): Number of insights the analysis agent reports.
+        output_dir (str, optional): Where the visualization agent saves its charts.
+    """
+    output_dir = output_dir or tempfile.mkdtemp(prefix="scripted_charts_")
+
+    def chart_code(messages):
+        path = os.path.join(output_dir, f"chart_{uuid.uuid4().hex[:8]}.png")
+        code = (
+            "import matplotlib\nmatplotlib.use('Agg')\nimport matplotlib.pyplot as plt\n"
+            "fig, ax = plt.subplots()\n"
+            "dataframe.select_dtypes('number').plot(ax=ax)\n"
+            f"fig.savefig({path!r})\nplt.close(fig)\nprint({path!r})"
+        )
+        return {"tool_calls": [{"name": "execute_python_code", "args": {"code": code}}]}
+
+    def chart_answer(messages):
+        path = _last_tool_result(messages).strip()
+        return {"content": json.dumps({"visualizations": [{"file": path, "description": f"Chart {os.path.basename(path)}"}]})}
+
+    analysis = {"insights": [{"finding": f"Finding {i + 1}", "viz_recommendation": "line chart"}
+                             for i in range(insights)]}
+    return {
+        "query_agent": [_scripted_query],
+        "retrieval_agent": [
+            {"tool_calls": [{"name": "retrieve_api_metadata", "args": {"query": "day ahead market clearing price"}}]},
+            _scripted_plan,
+        ],
+        "api_agent": [_scripted_api_calls, _scripted_api_result],
+        "process_agent": [_scripted_supervisor],
+        "analysis_agent": [_scripted_analysis_code, {"content": json.dumps(analysis)}],
+        "visualization_agent": [chart_code, chart_answer],
+        "report_agent": [{"content": json.dumps({"report": "Scripted report of the requested data."})}],
+    }
+
+
+def scripted_models(script: Optional[Dict[str, List[Turn]]] = None,
+                    latency: Union[float, Dict[str, float], None] = None) -> Dict[str, ScriptedChatModel]:
+    """
+    Build scripted stand-ins for every model tier, in the shape of `LLM.get_models()`.
+
+    Args:
+        script (dict, optional): Turns per agent, `default_script()` if omitted.
+        latency (float | dict, optional): Seconds per call, FAKE_LLM_LATENCY (default 0) if omitted.
+    """
+    if latency is None:
+        latency = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+    model = ScriptedChatModel(script=script or default_script(), latency=latency)
+    logger.info(f"Scripted models ready (latency {latency})")
+    return {"llm_low": model, "llm_mid": model, "llm_high": model}
@@ -0,0 +1,196 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from langchain_core.messages import HumanMessage
+from core.query_parser import TIMEZONE_SUFFIX, as_periods, parse_day
+from core.schemas import ApiResult, QueryParameters, QueryResult
+from logger import setup_logger
+from typing import Any, Dict, List, Optional, Set
+
+logger = setup_logger("logs/followup.log")
+
+# State fields of each stage that a follow-up either reuses or recomputes
+STAGE_FIELDS = {
+    "retrieval": ("plan", "retrieval_state"),
+    "api": ("api_data", "api_state"),
+    "analysis": ("analysis", "analysis_state"),
+    "visualization": ("visualization", "visualization_state"),
+    "report": ("report", "report_state"),
+}
+
+# Stages downstream of the data, in pipeline order
+DOWNSTREAM_STAGES = ["analysis", "visualization", "report"]
+
+
+def _iso(day: date) -> str:
+    return f"{day.isoformat()}T00:00:00{TIMEZONE_SUFFIX}"
+
+
+def followup_state(previous: Dict[str, Any], user_input: str) -> Dict[str, Any]:
+    """
+    Build the initial state of a follow-up query from the final state of the query it follows.
+
+    The previous stage results are carried over; the Query node decides which of them are
+    still valid once it has parsed the follow-up.
+
+    Args:
+        previous (dict): The final graph state of the previous query.
+        user_input (str): The follow-up query.
+
+    Returns:
+        dict: The initial graph state of the follow-up.
+    """
+    state = {
+        "messages": [HumanMessage(content=user_input)],
+        "previous_query": previous.get("query"),
+        "process_state": "",
+        "process_decision": "",
+        "query_state": "",
+        "sender": "",
+    }
+    for typed_field, message_field in STAGE_FIELDS.values():
+        state[typed_field] = previous.get(typed_field)
+        state[message_field] = previous.get(message_field) or ""
+    return state
+
+
+def _missing_ranges(previous: Dict[str, Any], current: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+    """Return the date ranges of `current` not covered by `previous`, None if they can't be compared"""
+    start, end = parse_day(current.get("startDate")), parse_day(current.get("endDate"))
+    previous_start, previous_end = parse_day(previous.get("startDate")), parse_day(previous.get("endDate"))
+    if not all((start, end, previous_start, previous_end)):
+        return None
+    if start > previous_end or end < previous_start:
+        # Disjoint, nothing to reuse
+        return None
+    ranges = []
+    if start < previous_start:
+        ranges.append({"startDate": _iso(start), "endDate": _iso(previous_start - timedelta(days=1))})
+    if end > previous_end:
+        ranges.append({"startDate": _iso(previous_end + timedelta(days=1)), "endDate": _iso(end)})
+    return ranges
+
+
+def parameter_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Work out which data a follow-up needs beyond what the previous query fetched.
+
+    Args:
+        previous (dict): The previous query parameters.
+        current (dict): The follow-up query parameters.
+
+    Returns:
+        list | None: Parameter sets to fetch (empty if everything is already there), or
+            None if the previous data can't be reused and everything must be fetched again.
+    """
+    if previous.get("province_id") != current.get("province_id"):
+        return None
+    previous_types = set(previous.get("dataTypes") or [])
+    current_types = set(current.get("dataTypes") or [])
+    # Items aren't labelled by data type, so dropping a type needs a fresh fetch
+    if not previous_types or not previous_types <= current_types:
+        return None
+
+    base = {k: v for k, v in current.items() if k not in ("dataTypes", "datePeriod", "startDate", "endDate")}
+    previous_periods, current_periods = as_periods(previous.get("datePeriod")), as_periods(current.get("datePeriod"))
+    if bool(previous_periods) != bool(current_periods):
+        return None
+    if current_periods:
+        dates = {"datePeriod": current_periods}
+        missing = [p for p in current_periods if p not in previous_periods]
+        missing_dates = [{"datePeriod": missing}] if missing else []
+    else:
+        dates = {"startDate": current.get("startDate"), "endDate": current.get("endDate")}
+        missing_dates = _missing_ranges(previous, current)
+        if missing_dates is None:
+            return None
+
+    delta = []
+    added_types = sorted(current_types - previous_types)
+    if added_types:
+        delta.append({**base, **dates, "dataTypes": added_types})
+    for missing in missing_dates:
+        delta.append({**base, **missing, "dataTypes": sorted(previous_types)})
+    return delta
+
+
+def _covers(current: Dict[str, Any], previous: Dict[str, Any]) -> bool:
+    """True if the dates of `current` include all the dates of `previous`"""
+    current_periods = as_periods(current.get("datePeriod"))
+    if current_periods:
+        return set(as_periods(previous.get("datePeriod"))) <= set(current_periods)
+    start, end = parse_day(current.get("startDate")), parse_day(current.get("endDate"))
+    previous_start, previous_end = parse_day(previous.get("startDate")), parse_day(previous.get("endDate"))
+    return all((start, end, previous_start, previous_end)) and start <= previous_start and end >= previous_end
+
+
+def _narrow_items(items: List[Dict[str, Any]], current: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Drop items outside the follow-up's date range, None if the items can't be dated"""
+    start, end = parse_day(current.get("startDate")), parse_day(current.get("endDate"))
+    periods = {period[:7] for period in as_periods(current.get("datePeriod"))}
+    kept = []
+    for item in items:
+        day = parse_day(item.get("date") or item.get("period") or "")
+        if day is None:
+            return None
+        if periods:
+            if day.isoformat()[:7] in periods:
+                kept.append(item)
+        elif start and end and start <= day <= end:
+            kept.append(item)
+    return kept
+
+
+@dataclass
+class FollowUpPlan:
+    """What a follow-up reuses from the previous query and what it recomputes"""
+    delta: Optional[List[QueryParameters]]
+    items: Optional[List[Dict[str, Any]]]
+    rerun: Set[str] = field(default_factory=set)
+
+
+def plan_followup(previous: QueryResult, current: QueryResult, api_data: Optional[ApiResult]) -> FollowUpPlan:
+    """
+    Decide which stages of a follow-up can reuse the previous query's results.
+
+    Args:
+        previous (QueryResult): The parsed previous query.
+        current (QueryResult): The parsed follow-up, with the complete updated parameters.
+        api_data (ApiResult, optional): The data fetched by the previous query.
+
+    Returns:
+        FollowUpPlan: The parameter sets still to fetch (None to refetch everything), the
+            previous items to keep and the stages to recompute.
+    """
+    previous_params = previous.parameters.model_dump(exclude_none=True)
+    current_params = current.parameters.model_dump(exclude_none=True)
+    delta = parameter_delta(previous_params, current_params) if api_data is not None else None
+
+    items = None
+    if delta is not None:
+        items = list(api_data.items)
+        dates = ("datePeriod", "startDate", "endDate")
+        if any(previous_params.get(k) != current_params.get(k) for k in dates):
+            # Drop previous data outside the new dates locally
+            narrowed = _narrow_items(items, current_params)
+            if narrowed is not None:
+                items = narrowed
+            elif not _covers(current_params, previous_params):
+                delta, items = None, None
+
+    rerun = {"report"}
+    data_changed = delta is None or bool(delta) or (items is not None and len(items) != len(api_data.items))
+    presentation = ("chartType", "operationType")
+    if data_changed or previous_params.get("workflow") != current_params.get("workflow"):
+        rerun.update(DOWNSTREAM_STAGES)
+    elif any(previous_params.get(k) != current_params.get(k) for k in presentation):
+        rerun.add("visualization")
+
+    logger.info(
+        f"Follow-up plan: {'full fetch' if delta is None else f'{len(delta)} delta fetch(es)'}, "
+        f"rerun {sorted(rerun)}"
+    )
+    return FollowUpPlan(
+        delta=[QueryParameters.model_validate(params) for params in delta] if delta is not None else None,
+        items=items,
+        rerun=rerun,
+    )
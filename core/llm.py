@@ -1,17 +1,330 @@
-from langchain_openai import ChatOpenAI
+from langchain_core.callbacks import BaseCallbackHandler
+from core.budget import BudgetExceeded, add_callback, response_usage
+from core.fake_llm import fake_llm_enabled, scripted_models
+from core.schemas import parse_agent_output
 from logger import setup_logger
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import atexit
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+# Tiers ordered from cheapest to most capable
+TIERS = ["llm_low", "llm_mid", "llm_high"]
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.13, 0.0),
+}
+
+# Cheapest tier each agent may start on, the rest start on llm_low
+DEFAULT_TIER_FLOORS = {
+    "process_agent": "llm_mid",
+    "analysis_agent": "llm_mid",
+    "visualization_agent": "llm_mid",
+}
+
+# Agents whose tools have effects a second attempt would repeat (API calls charged to the
+# query budget): they run once, on their start tier, and are never escalated
+SIDE_EFFECT_AGENTS = {"api_agent"}
+
+
+def model_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    """Return the USD cost of a call, 0 for unknown models"""
+    if not model:
+        return 0.0
+    # Versioned names like gpt-4.1-2025-04-14 are priced as their base model
+    base = max((name for name in MODEL_PRICES if model.startswith(name)), key=len, default=None)
+    if base is None:
+        return 0.0
+    input_price, cached_price, output_price = MODEL_PRICES[base]
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+class UsageCallback(BaseCallbackHandler):
+    """Callback that sums token usage over every LLM call of a run"""
 
-class LLM:
     def __init__(self):
-        """Initialize the language model class"""
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.calls = 0
+        self.cost = 0.0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        model, prompt, completion, cached = response_usage(response)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.cached_tokens += cached
+            self.cost += model_cost(model, prompt, completion, cached)
+
+
+def validate_agent_output(name: str, result: Any) -> bool:
+    """
+    Check that an agent result matches the schema the next stage expects.
+
+    Args:
+        name (str): The agent name, e.g. "query_agent".
+        result: The raw result of the agent invocation.
+
+    Returns:
+        bool: True if the output is usable.
+    """
+    structured = isinstance(result, dict) and "output" not in result
+    output = result if structured else (result.get("output") if isinstance(result, dict) else result)
+    return parse_agent_output(name, output) is not None
+
+
+class ModelRouter:
+    """
+    Chooses the model tier each agent starts on, from its success history.
+
+    Each agent starts on the cheapest tier at or above its floor that either hasn't been
+    sampled enough yet or meets the target success rate. A tier below the target is still
+    tried with probability `explore`, so it can recover after transient failures. Per-agent, per-tier success,
+    latency and cost statistics are kept in memory and optionally persisted as JSON, every
+    `save_every` recorded attempts and at interpreter exit.
+    """
+
+    def __init__(self, stats_path: Optional[str] = "model_stats.json", target_success: float = 0.9,
+                 min_samples: int = 5, floors: Optional[Dict[str, str]] = None, save_every: int = 20,
+                 explore: float = 0.05):
+        self.logger = setup_logger()
+        self.stats_path = stats_path
+        self.target_success = target_success
+        self.min_samples = min_samples
+        self.floors = dict(DEFAULT_TIER_FLOORS if floors is None else floors)
+        self.save_every = save_every
+        self.explore = explore
+        self._random = random.Random()
+        self.stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+        # Attempts recorded since the last save
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self.load()
+        if self.stats_path:
+            atexit.register(self.flush)
+
+    def load(self) -> None:
+        """Load persisted statistics if available"""
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                self.stats = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            self.logger.warning(f"Could not load model router stats: {e}")
+
+    def save(self) -> None:
+        """
+        Persist statistics to disk.
+
+        Written to a temporary file renamed over the stats file, under the lock, so concurrent
+        saves can't interleave and a crash never leaves a truncated file.
+        """
+        if not self.stats_path:
+            return
+        with self._lock:
+            snapshot = json.dumps(self.stats, indent=2)
+            self._unsaved = 0
+            temporary = None
+            try:
+                fd, temporary = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.stats_path)),
+                                                 suffix=".tmp")
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(snapshot)
+                os.replace(temporary, self.stats_path)
+            except OSError as e:
+                self.logger.warning(f"Could not save model router stats: {e}")
+                if temporary is not None and os.path.exists(temporary):
+                    os.unlink(temporary)
+
+    @property
+    def save_due(self) -> bool:
+        """Whether enough attempts were recorded since the last save to save again"""
+        return self._unsaved >= self.save_every
+
+    def flush(self) -> None:
+        """Save the statistics if attempts were recorded since the last save"""
+        if self._unsaved:
+            self.save()
+
+    def _tier_stats(self, agent: str, tier: str) -> Dict[str, float]:
+        return self.stats.setdefault(agent, {}).setdefault(
+            tier, {"attempts": 0, "successes": 0, "latency": 0.0, "cost": 0.0}
+        )
+
+    def tiers_for(self, agent: str) -> list:
+        """Return the tiers to try for an agent, cheapest first"""
+        floor = self.floors.get(agent, TIERS[0])
+        return TIERS[TIERS.index(floor):]
+
+    def start_tier(self, agent: str) -> str:
+        """Return the cheapest adequate tier for an agent"""
+        tiers = self.tiers_for(agent)
+        with self._lock:
+            for tier in tiers:
+                stats = self._tier_stats(agent, tier)
+                if stats["attempts"] < self.min_samples:
+                    return tier
+                if stats["successes"] / stats["attempts"] >= self.target_success:
+                    return tier
+                if self._random.random() < self.explore:
+                    return tier
+        return tiers[-1]
+
+    def record(self, agent: str, tier: str, success: bool, latency: float, cost: float) -> None:
+        """Record the outcome of one attempt"""
+        with self._lock:
+            stats = self._tier_stats(agent, tier)
+            stats["attempts"] += 1
+            stats["successes"] += int(success)
+            stats["latency"] += latency
+            stats["cost"] += cost
+            self._unsaved += 1
+
+    def report(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Return per-agent, per-tier success rate, mean latency and mean cost"""
+        with self._lock:
+            return {
+                agent: {
+                    tier: {
+                        "attempts": s["attempts"],
+                        "success_rate": s["successes"] / s["attempts"] if s["attempts"] else 0.0,
+                        "mean_latency": s["latency"] / s["attempts"] if s["attempts"] else 0.0,
+                        "mean_cost": s["cost"] / s["attempts"] if s["attempts"] else 0.0,
+                    }
+                    for tier, s in tiers.items()
+                }
+                for agent, tiers in self.stats.items()
+            }
+
+
+class TieredAgent:
+    """
+    Agent wrapper that starts on the router's tier and escalates on invalid output.
+
+    Agents in SIDE_EFFECT_AGENTS aren't escalated: a failed attempt is recorded and returned.
+
+    Exposes `invoke`/`ainvoke` like the wrapped agents, so it can be used by `agent_node`.
+    """
+
+    def __init__(self, name: str, factory: Callable[[Any], Any], llms: Dict[str, Any], router: ModelRouter):
+        self.name = name
+        self.factory = factory
+        self.llms = llms
+        self.router = router
+        self._agents: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.logger = setup_logger()
+
+    def _agent(self, tier: str):
+        with self._lock:
+            if tier not in self._agents:
+                self._agents[tier] = self.factory(self.llms[tier])
+            return self._agents[tier]
+
+    def _tiers(self) -> list:
+        tiers = self.router.tiers_for(self.name)
+        tiers = tiers[tiers.index(self.router.start_tier(self.name)):]
+        return tiers[:1] if self.name in SIDE_EFFECT_AGENTS else tiers
+
+    def _finish(self, tier: str, result: Any, error: Optional[Exception], start: float,
+                usage: UsageCallback, last: bool) -> bool:
+        success = error is None and validate_agent_output(self.name, result)
+        self.router.record(self.name, tier, success, time.perf_counter() - start, usage.cost)
+        if not success and not last:
+            reason = f"error: {error}" if error else "invalid output"
+            self.logger.info(f"{self.name} escalating from {tier} ({reason})")
+        return success
+
+    def invoke(self, state, config=None, **kwargs):
+        tiers = self._tiers()
+        for i, tier in enumerate(tiers):
+            last = i == len(tiers) - 1
+            usage = UsageCallback()
+            run_config = dict(config or {})
+            run_config["callbacks"] = add_callback(run_config.get("callbacks"), usage)
+            run_config["metadata"] = {**(run_config.get("metadata") or {}), "agent": self.name, "tier": tier}
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = self._agent(tier).invoke(state, run_config, **kwargs)
+            except BudgetExceeded:
+                # Out of budget, a bigger model won't help
+                raise
+            except Exception as e:
+                error = e
+            if self._finish(tier, result, error, start, usage, last) or last:
+                if self.router.save_due:
+                    self.router.save()
+                if error is not None:
+                    raise error
+                return result
+
+    async def ainvoke(self, state, config=None, **kwargs):
+        tiers = self._tiers()
+        for i, tier in enumerate(tiers):
+            last = i == len(tiers) - 1
+            usage = UsageCallback()
+            run_config = dict(config or {})
+            run_config["callbacks"] = add_callback(run_config.get("callbacks"), usage)
+            run_config["metadata"] = {**(run_config.get("metadata") or {}), "agent": self.name, "tier": tier}
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = await self._agent(tier).ainvoke(state, run_config, **kwargs)
+            except BudgetExceeded:
+                # Out of budget, a bigger model won't help
+                raise
+            except Exception as e:
+                error = e
+            if self._finish(tier, result, error, start, usage, last) or last:
+                if self.router.save_due:
+                    # Write from a thread, not to block the event loop
+                    await asyncio.to_thread(self.router.save)
+                if error is not None:
+                    raise error
+                return result
+
+
+class LLM:
+    def __init__(self, models: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the language model class
+
+        Args:
+            models (dict, optional): Prebuilt models per tier (llm_low, llm_mid, llm_high),
+                e.g. from `core.fake_llm.scripted_models`, used instead of the OpenAI models
+        """
         self.logger = setup_logger()
         self.llm_low = None
         self.llm_mid = None
         self.llm_high = None
-        self.initialize_llms()
+        if models is None and fake_llm_enabled():
+            models = scripted_models()
+        if models is not None:
+            self.llm_low, self.llm_mid, self.llm_high = models["llm_low"], models["llm_mid"], models["llm_high"]
+            self.logger.info("Language models provided, skipping OpenAI initialization.")
+        else:
+            self.initialize_llms()
 
     def initialize_llms(self):
         """Initialize language models"""
+        # Imported here, the OpenAI client takes most of a second to import
+        from langchain_openai import ChatOpenAI
         try:
             self.llm_low = ChatOpenAI(model="gpt-4o-mini", temperature=0, max_completion_tokens=4096)
             self.llm_mid = ChatOpenAI(model="gpt-4.1-mini", temperature=0, max_completion_tokens=4096)
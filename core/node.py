@@ -1,25 +1,24 @@
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, HumanMessage
 from core.state import State
 from logger import setup_logger, log_performance
+from core.plan_cache import PlanCache
+from core.query_parser import QueryParser, WORKFLOW_DATA
+from core.budget import budget_config, current_budget
+from core.followup import DOWNSTREAM_STAGES, STAGE_FIELDS, FollowUpPlan, plan_followup
+from core.schemas import (
+    AGENT_STATE_FIELDS, AnalysisResult, ApiResult, Insight, VisualizationResult, parse_agent_output
+)
+from core.table_encoding import encode_table
 from langchain.agents import AgentExecutor
-from typing import Dict, Any
-import re
+from langchain_core.runnables import RunnableLambda
+from tools.dataset import DATASETS_VARIABLE
+from tools.python_repl import load_dataset, run_python_code
+from typing import Dict, Any, Callable, List, Optional
+import asyncio
 import json
 
 logger = setup_logger("logs/node.log")
 
-def clean_agent_string(s: str) -> str:
-    # 1) Kod bloğu işaretlerini kaldırın (```), eğer varsa
-    s = s.replace('```', '')
-    # 2) Literal "\n" ve "\'" dizilerini silin
-    s = s.replace(r'\n', '')
-    s = s.replace(r"\'", "'")
-    # 3) Geri kalan ters eğik çizgileri isteğe bağlı kaldırın
-    s = s.replace('\\', '')
-    # 4) Tüm normal boşluk karakterlerini kaldırın
-    s = re.sub(r'\s+', '', s)
-    return s
-
 def manage_state_size(
     state: Dict[str, Any],
     max_messages: int = 10,
@@ -34,6 +33,157 @@ def manage_state_size(
 
     return state
 
+# Agents writing code on the query's data, which they find preloaded in their REPL session
+DATASET_AGENTS = {"analysis_agent", "visualization_agent"}
+
+# Lead of the API message once the data is preloaded, in place of the items
+PRELOADED_DATA = "The API data is preloaded in the Python REPL, use it directly:\n"
+
+# Profiles the bound data inside the REPL session, see `tools.profiling`
+PROFILE_CODE = (f"from tools import profiling as _profiling\n"
+                f"print(_profiling.profile({DATASETS_VARIABLE}))")
+
+def _load_query_dataset(state: Dict[str, Any]) -> str:
+    """Bind the query's API items into its REPL session, returning their description"""
+    plan = state.get("plan")
+    endpoints = [call.endpoint for call in plan.api_calls] if plan is not None else []
+    return load_dataset(state["api_data"].items, endpoints)
+
+def _with_api_message(state: Dict[str, Any], content: str, name: str = "api_agent") -> Dict[str, Any]:
+    """A copy of the state with `content` in place of the API agent's message"""
+    message = AIMessage(content=content, name=name)
+    new_state = dict(state)
+    new_state["api_state"] = message
+    new_state["messages"] = [message if getattr(m, "name", None) == name else m
+                             for m in state.get("messages") or []]
+    return new_state
+
+def _agent_input(state: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """
+    Build the input of an agent.
+
+    Dataset agents get the API items bound into their REPL session as `dataframe` (and per
+    API result in `datasets`), and see only the data profile, or the schemas and row counts
+    if the data wasn't profiled, instead of the items. If the dataset can't be bound they
+    get the items as before.
+    """
+    api_data = state.get("api_data")
+    if name not in DATASET_AGENTS or api_data is None or not api_data.items:
+        return state
+    try:
+        description = _load_query_dataset(state)
+    except Exception as e:
+        logger.warning(f"Could not preload the dataset for {name}, passing the items instead: {e}")
+        return state
+    api_state = state.get("api_state")
+    if isinstance(api_state, AIMessage) and str(api_state.content).startswith(PRELOADED_DATA):
+        return state
+    return _with_api_message(state, PRELOADED_DATA + description)
+
+async def _agent_input_async(state: Dict[str, Any], name: str) -> Dict[str, Any]:
+    if name not in DATASET_AGENTS:
+        return state
+    # Binding waits on the REPL, keep it off the event loop
+    return await asyncio.to_thread(_agent_input, state, name)
+
+def record_agent_output(state: State, name: str, output: Any, result: Any = None) -> State:
+    """
+    Append an agent's output to the messages and store it in the agent's state field.
+
+    The output is validated against the agent's schema once, here, and the typed result is
+    stored in the agent's typed state field (None if the output doesn't match).
+    """
+    # Structured results (e.g. the supervisor's function call) are validated as is
+    structured = isinstance(result, dict) and "output" not in result
+    state[AGENT_STATE_FIELDS[name]] = parse_agent_output(name, result if structured else output)
+
+    ai_message = AIMessage(content=output, name=name)
+    # Build a new list, the old one may still be referenced by a pending checkpoint
+    state["messages"] = list(state.get("messages") or []) + [ai_message]
+    state["sender"] = name
+
+    if name == "process_agent":
+        state["process_state"] = ai_message
+        state["process_decision"] = ai_message
+        # A fan-out may follow, start it without the entries of an earlier one
+        state["visualizations"] = None
+        logger.info("Process decision and state updated")
+    elif name == "query_agent":
+        state["query_state"] = ai_message
+        logger.info("Query state updated")
+    elif name == "retrieval_agent":
+        state["retrieval_state"] = ai_message
+        logger.info("Retrieval state updated")
+    elif name == "api_agent":
+        state["api_state"] = ai_message
+        logger.info("API state updated")
+    elif name == "analysis_agent":
+        state["analysis_state"] = ai_message
+        logger.info("Analysis state updated")
+    elif name == "visualization_agent":
+        state["visualization_state"] = ai_message
+        logger.info("Visualization state updated")
+    elif name == "report_agent":
+        state["report_state"] = ai_message
+        logger.info("Report state updated")
+
+    return state
+
+def record_agent_error(state: State, name: str, error: Exception) -> State:
+    """
+    Append an error message for a failed agent, preserving the rest of the state.
+    """
+    logger.error(f"Error occurred while processing agent {name}: {str(error)}", exc_info=True)
+    error_message = AIMessage(content=f"Error: {str(error)}", name=name)
+    # Never route on a stale result of the failed agent
+    if name in AGENT_STATE_FIELDS:
+        state[AGENT_STATE_FIELDS[name]] = None
+    # Build a new list, the old one may still be referenced by a pending checkpoint
+    state["messages"] = list(state.get("messages") or []) + [error_message]
+    return state
+
+def _agent_output(result: Any) -> str:
+    return result["output"] if isinstance(result, dict) and "output" in result else str(result)
+
+def _short_report(state: State, reason: str) -> str:
+    """Summarize what was retrieved without an LLM call, for queries out of budget"""
+    api_data = state.get("api_data")
+    records = len(api_data.items) if api_data is not None else 0
+    return (f"The query {reason} budget was exhausted, so the remaining analysis was skipped. "
+            f"{records} record(s) were retrieved and are returned as data.")
+
+def _budget_guard(state: State, name: str) -> Optional[State]:
+    """
+    Degrade gracefully when the query budget runs low, returning the new state if the
+    agent was skipped or replaced.
+
+    Once the budget is low the process agent stops planning further analysis and routes
+    straight to the report. Once it is exhausted no more LLM calls are made: the report is
+    written locally and any other agent is skipped.
+    """
+    budget = current_budget()
+    if budget is None:
+        return None
+
+    if name == "process_agent":
+        if not budget.low():
+            return None
+        query = state.get("query")
+        data_only = query is not None and query.parameters.workflow == WORKFLOW_DATA
+        next_step = "FINISH" if data_only or state.get("report_state") else "Report"
+        budget.degrade(f"process_agent routed to {next_step}")
+        decision = {"next": next_step, "task": "Budget running low, return the data with a short report"}
+        return record_agent_output(state, name, json.dumps(decision), decision)
+
+    reason = budget.exceeded()
+    if reason is None:
+        return None
+    if name == "report_agent":
+        budget.degrade("report_agent replaced by a short report")
+        return record_agent_output(state, name, json.dumps({"report": _short_report(state, reason)}))
+    budget.degrade(f"{name} skipped")
+    return record_agent_error(state, name, RuntimeError(f"Skipped, query {reason} budget exhausted"))
+
 @log_performance
 def agent_node(state: State, agent: AgentExecutor, name: str) -> State:
     """
@@ -44,49 +194,378 @@ def agent_node(state: State, agent: AgentExecutor, name: str) -> State:
     # Manage state size before invoking the agent
     state = manage_state_size(state)
 
+    degraded_state = _budget_guard(state, name)
+    if degraded_state is not None:
+        return degraded_state
+
     try:
-        result = agent.invoke(state)
+        result = agent.invoke(_agent_input(state, name), budget_config())
         logger.debug(f"Agent {name} result: {result}")
+        state = record_agent_output(state, name, _agent_output(result), result)
+        logger.info(f"Agent {name} processing completed")
+        return state
+    except Exception as e:
+        return record_agent_error(state, name, e)
+
+@log_performance
+async def agent_node_async(state: State, agent: AgentExecutor, name: str) -> State:
+    """
+    Async counterpart of `agent_node`, awaiting the agent instead of blocking a thread.
+    """
+    logger.info(f"Processing agent: {name}")
 
-        output = result["output"] if isinstance(result, dict) and "output" in result else str(result)
-
-        ai_message = AIMessage(content=output, name=name)
-        if "messages" not in state:
-            state["messages"] = []
-        state["messages"].append(ai_message)
-        state["sender"] = name
-
-        if name == "process_agent":
-            state["process_state"] = ai_message
-            state["process_decision"] = ai_message
-            logger.info("Process decision and state updated")
-        elif name == "query_agent":
-            state["query_state"] = ai_message
-            logger.info("Query state updated")
-        elif name == "retrieval_agent":
-            state["retrieval_state"] = ai_message
-            logger.info("Retrieval state updated")
-        elif name == "api_agent":
-            ai_message.content = clean_agent_string(ai_message.content)
-            state["api_state"] = ai_message
-            logger.info("API state updated")
-        elif name == "analysis_agent":
-            state["analysis_state"] = ai_message
-            logger.info("Analysis state updated")
-        elif name == "visualization_agent":
-            state["visualization_state"] = ai_message
-            logger.info("Visualization state updated")
-        elif name == "report_agent":
-            state["report_state"] = ai_message
-            logger.info("Report state updated")
+    state = manage_state_size(state)
 
+    degraded_state = _budget_guard(state, name)
+    if degraded_state is not None:
+        return degraded_state
+
+    try:
+        result = await agent.ainvoke(await _agent_input_async(state, name), budget_config())
+        logger.debug(f"Agent {name} result: {result}")
+        state = record_agent_output(state, name, _agent_output(result), result)
         logger.info(f"Agent {name} processing completed")
         return state
     except Exception as e:
-        logger.error(f"Error occurred while processing agent {name}: {str(e)}", exc_info=True)
-        error_message = AIMessage(content=f"Error: {str(e)}", name=name)
-        # Preserve existing state and add error message
-        if "messages" not in state:
-            state["messages"] = []
-        state["messages"].append(error_message)
-        return state  # Return the original state with error message added
\ No newline at end of file
+        return record_agent_error(state, name, e)
+
+def _user_input(state: State) -> Optional[str]:
+    return next(
+        (m.content for m in reversed(state.get("messages", [])) if isinstance(m, HumanMessage)),
+        None
+    )
+
+def _fast_path_query(state: State, name: str, parser: QueryParser) -> Optional[State]:
+    user_input = _user_input(state)
+    if not isinstance(user_input, str):
+        return None
+    if state.get("previous_query") is not None:
+        previous = state["previous_query"].parameters.model_dump(exclude_none=True)
+        parsed = parser.try_parse_followup(user_input, previous)
+    else:
+        parsed = parser.try_parse(user_input)
+    if parsed is None:
+        return None
+
+    state = record_agent_output(state, name, json.dumps(parsed, ensure_ascii=False))
+    logger.info("Query state updated from fast-path parser")
+    return state
+
+def _query_agent_state(state: State) -> State:
+    """Give the query agent the previous query to resolve a follow-up against"""
+    if state.get("previous_query") is None:
+        return state
+    agent_state = dict(state)
+    agent_state["messages"] = [HumanMessage(content=(
+        f"Previous query: {state['previous_query'].model_dump_json(exclude_none=True)}\n"
+        f"Follow-up: {_user_input(state)}\n"
+        "Return the complete parameters of the follow-up query."
+    ))]
+    return agent_state
+
+def _api_table(api_data: ApiResult) -> str:
+    """The API items in the most compact encoding fitting the prompt table budget"""
+    return "API data " + encode_table(api_data.items)
+
+def _api_table_message(api_data: ApiResult, name: str) -> AIMessage:
+    return AIMessage(content=_api_table(api_data), name=name)
+
+def _merge_query_agent_state(state: State, agent_state: State) -> State:
+    """Keep the user's messages, not the follow-up prompt built for the agent, plus its answer"""
+    if state.get("previous_query") is None:
+        return agent_state
+    merged = dict(agent_state)
+    merged["messages"] = list(state.get("messages") or []) + list(agent_state["messages"][-1:])
+    return merged
+
+def _apply_followup(state: State, name: str) -> State:
+    """
+    Decide what a follow-up reuses from the previous query and what it recomputes.
+
+    Stale stage results are cleared, so the process agent schedules those stages again,
+    while valid ones are replayed into the messages for the downstream agents.
+    """
+    previous, current = state.get("previous_query"), state.get("query")
+    if previous is None:
+        return state
+
+    if current is None:
+        # The follow-up couldn't be interpreted, run it like a new query
+        plan = FollowUpPlan(delta=None, items=None, rerun=set(DOWNSTREAM_STAGES))
+    else:
+        plan = plan_followup(previous, current, state.get("api_data"))
+    state["delta"] = plan.delta
+    stale = set(plan.rerun)
+    if plan.delta is None:
+        stale.update(STAGE_FIELDS)
+    # Fetching a delta reruns retrieval and API, but the previous data is kept for the merge
+    refetched = {"retrieval", "api"} if plan.delta else set()
+    for stage in stale:
+        typed_field, message_field = STAGE_FIELDS[stage]
+        state[typed_field] = None
+        state[message_field] = ""
+
+    api_data = state.get("api_data")
+    if plan.items is not None and api_data is not None and len(plan.items) != len(api_data.items):
+        state["api_data"] = ApiResult(items=plan.items)
+        state["api_state"] = _api_table_message(state["api_data"], "api_agent")
+
+    replayed = [
+        state[message_field] for stage, (_, message_field) in STAGE_FIELDS.items()
+        if stage not in stale | refetched and isinstance(state.get(message_field), AIMessage)
+    ]
+    if plan.delta:
+        delta = [params.model_dump(exclude_none=True) for params in plan.delta]
+        replayed.append(AIMessage(
+            content=f"Follow-up: only fetch the data missing from the previous query: {json.dumps(delta, ensure_ascii=False)}",
+            name=name
+        ))
+    state["messages"] = list(state["messages"]) + replayed
+    recomputed = stale | refetched
+    logger.info(f"Follow-up reuses {sorted(set(STAGE_FIELDS) - recomputed)}, recomputes {sorted(recomputed)}")
+    return state
+
+@log_performance
+def query_node(state: State, agent: AgentExecutor, name: str, parser: QueryParser) -> State:
+    """
+    Parse the user query with the rule-based parser, falling back to the query agent.
+
+    Formulaic queries are turned into the query agent's JSON structure locally, saving
+    the LLM call and the province resolution round trip. Follow-up queries are parsed
+    against the previous query's parameters and only the stale stages are recomputed.
+    """
+    parsed_state = _fast_path_query(state, name, parser)
+    if parsed_state is None:
+        agent_state = agent_node(_query_agent_state(state), agent, name)
+        parsed_state = _merge_query_agent_state(state, agent_state)
+    return _apply_followup(parsed_state, name)
+
+@log_performance
+async def query_node_async(state: State, agent: AgentExecutor, name: str, parser: QueryParser) -> State:
+    """Async counterpart of `query_node`"""
+    parsed_state = _fast_path_query(state, name, parser)
+    if parsed_state is None:
+        agent_state = await agent_node_async(_query_agent_state(state), agent, name)
+        parsed_state = _merge_query_agent_state(state, agent_state)
+    return _apply_followup(parsed_state, name)
+
+def _query_parameters(state: State) -> Optional[Dict[str, Any]]:
+    query = state.get("query")
+    return query.parameters.model_dump(exclude_none=True) if query is not None else None
+
+def _fetch_parameters(state: State) -> List[Optional[Dict[str, Any]]]:
+    """The parameter sets to fetch: the follow-up delta if there is one, else the whole query"""
+    delta = state.get("delta")
+    if delta is None:
+        return [_query_parameters(state)]
+    return [params.model_dump(exclude_none=True) for params in delta]
+
+def _cached_plan(state: State, name: str, params_list: List[Optional[Dict[str, Any]]],
+                 plan_cache: PlanCache) -> Optional[State]:
+    if not params_list or any(params is None for params in params_list):
+        return None
+    api_calls = []
+    for params in params_list:
+        plan = plan_cache.lookup(params)
+        if plan is None:
+            return None
+        api_calls.extend(plan["api_calls"])
+    state = record_agent_output(state, name, json.dumps({"api_calls": api_calls}, ensure_ascii=False))
+    logger.info("Retrieval state served from plan cache")
+    return state
+
+def _store_plan(state: State, params_list: List[Optional[Dict[str, Any]]], plan_cache: PlanCache) -> None:
+    # A plan covering several delta parameter sets can't be templated for one of them
+    if len(params_list) != 1 or params_list[0] is None:
+        return
+    plan = state.get("plan")
+    if plan is not None and plan.api_calls:
+        plan_cache.store(params_list[0], plan.model_dump())
+
+def _nothing_to_fetch(state: State) -> bool:
+    delta = state.get("delta")
+    if delta is not None and not delta:
+        logger.info("Follow-up needs no new data, reusing the previous plan and data")
+        return True
+    return False
+
+@log_performance
+def retrieval_node(state: State, agent: AgentExecutor, name: str, plan_cache: PlanCache) -> State:
+    """
+    Run the retrieval stage through the plan cache.
+
+    If a plan for the same parameter shape is cached, it is instantiated with the current
+    query's dates and province and the retrieval agent is skipped. Otherwise the agent runs
+    and its plan is stored for the next query with that shape. Follow-ups only plan the
+    data missing from the previous query.
+    """
+    if _nothing_to_fetch(state):
+        return state
+    params_list = _fetch_parameters(state)
+    cached_state = _cached_plan(state, name, params_list, plan_cache)
+    if cached_state is not None:
+        return cached_state
+
+    state = agent_node(state, agent, name)
+    _store_plan(state, params_list, plan_cache)
+    return state
+
+@log_performance
+async def retrieval_node_async(state: State, agent: AgentExecutor, name: str, plan_cache: PlanCache) -> State:
+    """Async counterpart of `retrieval_node`"""
+    if _nothing_to_fetch(state):
+        return state
+    params_list = _fetch_parameters(state)
+    cached_state = _cached_plan(state, name, params_list, plan_cache)
+    if cached_state is not None:
+        return cached_state
+
+    state = await agent_node_async(state, agent, name)
+    _store_plan(state, params_list, plan_cache)
+    return state
+
+def _merge_api_data(state: State, name: str, kept: Optional[ApiResult]) -> State:
+    """Merge the items fetched for a follow-up delta into the reused previous items"""
+    if kept is None:
+        return state
+    fetched = state.get("api_data")
+    if fetched is None:
+        # The delta fetch failed, keep serving the previous data
+        state["api_data"] = kept
+        return state
+    seen = {json.dumps(item, sort_keys=True) for item in kept.items}
+    items = list(kept.items) + [item for item in fetched.items if json.dumps(item, sort_keys=True) not in seen]
+    state["api_data"] = ApiResult(items=items)
+    state["api_state"] = _api_table_message(state["api_data"], name)
+    state["messages"] = list(state["messages"][:-1]) + [state["api_state"]]
+    logger.info(f"Merged {len(fetched.items)} fetched item(s) into {len(kept.items)} reused item(s)")
+    return state
+
+@log_performance
+def api_node(state: State, agent: AgentExecutor, name: str) -> State:
+    """
+    Run the API stage. Follow-ups fetch only their delta and merge it into the reused data.
+    """
+    if _nothing_to_fetch(state):
+        return state
+    kept = state.get("api_data") if state.get("delta") is not None else None
+    return _merge_api_data(agent_node(state, agent, name), name, kept)
+
+@log_performance
+async def api_node_async(state: State, agent: AgentExecutor, name: str) -> State:
+    """Async counterpart of `api_node`"""
+    if _nothing_to_fetch(state):
+        return state
+    kept = state.get("api_data") if state.get("delta") is not None else None
+    return _merge_api_data(await agent_node_async(state, agent, name), name, kept)
+
+@log_performance
+def profile_node(state: State, name: str) -> State:
+    """
+    Profile the API data for the agents downstream.
+
+    The items are bound into the query's REPL session and profiled there (see
+    `tools.profiling`). The compact profile replaces the items in the API message, so the
+    process, analysis and report agents read column summaries, time coverage, aggregates
+    and extremes instead of thousands of rows, while agent code still has the full data.
+    If profiling fails, the items are passed on as a compact table (`core.table_encoding`).
+    """
+    api_data = state.get("api_data")
+    if api_data is None or not api_data.items:
+        return state
+    try:
+        description = _load_query_dataset(state)
+        profile = run_python_code(PROFILE_CODE)
+        # Failures come back as text
+        json.loads(profile)
+    except Exception as e:
+        logger.warning(f"Could not profile the API data, passing the items as a table instead: {e}")
+        return _with_api_message(state, _api_table(api_data), name)
+    logger.info(f"Profiled {len(api_data.items)} item(s) into {len(profile)} characters")
+    return _with_api_message(state, f"{PRELOADED_DATA}{description}\nData profile: {profile.strip()}", name)
+
+@log_performance
+async def profile_node_async(state: State, name: str) -> State:
+    """Async counterpart of `profile_node`, profiling in a worker thread"""
+    return await asyncio.to_thread(profile_node, state, name)
+
+def _insight_branch_state(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Narrow the analysis state of a fan-out branch to its own insight"""
+    branch_state = dict(payload)
+    branch_state["analysis"] = AnalysisResult(insights=[Insight.model_validate(payload["insight"])])
+    branch_state["analysis_state"] = AIMessage(
+        content=json.dumps({"insights": [payload["insight"]]}, ensure_ascii=False),
+        name="analysis_agent"
+    )
+    return manage_state_size(branch_state)
+
+def _insight_visualizations(payload: Dict[str, Any], result: Any) -> Dict[str, Any]:
+    parsed = parse_agent_output("visualization_agent", _agent_output(result))
+    entries = parsed.visualizations if parsed is not None else []
+    entries = [entry.model_copy(update={"insight": payload["insight_index"]}) for entry in entries]
+    logger.info(f"Insight {payload['insight_index']} produced {len(entries)} visualization(s)")
+    # Only the reducer field is written, parallel branches must not touch the other keys
+    return {"visualizations": entries}
+
+@log_performance
+def visualize_insight_node(payload: Dict[str, Any], agent: AgentExecutor, name: str) -> Dict[str, Any]:
+    """
+    Render the visualization for a single insight in a parallel fan-out branch.
+
+    The payload is the state sent by the fan-out router plus `insight` and `insight_index`.
+    """
+    logger.info(f"Processing agent: {name} for insight {payload['insight_index']}")
+    budget = current_budget()
+    if budget is not None and budget.exceeded():
+        budget.degrade(f"visualization of insight {payload['insight_index']} skipped")
+        return {"visualizations": []}
+    try:
+        result = agent.invoke(_agent_input(_insight_branch_state(payload), name), budget_config())
+        return _insight_visualizations(payload, result)
+    except Exception as e:
+        logger.error(f"Error visualizing insight {payload['insight_index']}: {str(e)}", exc_info=True)
+        return {"visualizations": []}
+
+@log_performance
+async def visualize_insight_node_async(payload: Dict[str, Any], agent: AgentExecutor, name: str) -> Dict[str, Any]:
+    """Async counterpart of `visualize_insight_node`"""
+    logger.info(f"Processing agent: {name} for insight {payload['insight_index']}")
+    budget = current_budget()
+    if budget is not None and budget.exceeded():
+        budget.degrade(f"visualization of insight {payload['insight_index']} skipped")
+        return {"visualizations": []}
+    try:
+        result = await agent.ainvoke(await _agent_input_async(_insight_branch_state(payload), name),
+                                     budget_config())
+        return _insight_visualizations(payload, result)
+    except Exception as e:
+        logger.error(f"Error visualizing insight {payload['insight_index']}: {str(e)}", exc_info=True)
+        return {"visualizations": []}
+
+def visualization_join_node(state: State, name: str) -> State:
+    """
+    Join the per-insight branches into a single visualization state.
+    """
+    visualizations = sorted(state.get("visualizations") or [], key=lambda entry: entry.insight or 0)
+    logger.info(f"Joined {len(visualizations)} visualization(s) from parallel branches")
+    joined = VisualizationResult(visualizations=visualizations)
+    return record_agent_output(state, name, joined.model_dump_json(), joined.model_dump())
+
+async def visualization_join_node_async(state: State, name: str) -> State:
+    """Async counterpart of `visualization_join_node`"""
+    return visualization_join_node(state, name)
+
+def graph_node(node: Callable, async_node: Callable, *args) -> RunnableLambda:
+    """
+    Wrap a node function and its async counterpart into a single graph node.
+
+    LangGraph calls the sync function under `graph.stream` and the coroutine under
+    `graph.astream`, so one compiled graph serves both execution modes.
+    """
+    def run(state: State) -> State:
+        return node(state, *args)
+
+    async def arun(state: State) -> State:
+        return await async_node(state, *args)
+
+    return RunnableLambda(run, afunc=arun)
@@ -0,0 +1,256 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from logger import setup_logger
+
+logger = setup_logger("logs/plan_cache.log")
+
+# Slot markers used inside cached plan templates
+DATE_PERIOD_SLOT = "{{datePeriod}}"
+START_DATE_SLOT = "{{startDate}}"
+END_DATE_SLOT = "{{endDate}}"
+PROVINCE_SLOT = "{{province_id}}"
+
+# Any ISO 8601 date left in a template means the plan depends on something we can't slot
+ISO_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}")
+
+
+def _as_list(value: Any) -> List[Any]:
+    """Normalize a scalar-or-list query parameter to a list"""
+    if value is None or value == "":
+        return []
+    if isinstance(value, (list, tuple)):
+        return [v for v in value if v not in (None, "")]
+    return [value]
+
+
+def plan_shape(params: Dict[str, Any]) -> Optional[Tuple]:
+    """
+    Build the cache key for a set of structured query parameters.
+
+    The key only describes the shape of the request: which data types are asked for,
+    at which date granularity and whether a province filter is present. Concrete dates
+    and province ids are filled into the template on instantiation.
+
+    Args:
+        params (dict): The "parameters" object produced by the query agent.
+
+    Returns:
+        tuple | None: Hashable shape key, or None if the parameters can't be keyed.
+    """
+    data_types = sorted({str(t).strip().lower() for t in _as_list(params.get("dataTypes"))})
+    if not data_types:
+        return None
+
+    if _as_list(params.get("datePeriod")):
+        granularity = "period"
+    elif params.get("startDate") or params.get("endDate"):
+        granularity = "range"
+    else:
+        granularity = "none"
+
+    provinces = _as_list(params.get("province_id"))
+    if len(provinces) > 1:
+        # Multi-province plans are rare and not worth templating
+        return None
+
+    return tuple(data_types), granularity, bool(provinces)
+
+
+class PlanCache:
+    """
+    Cache of Retrieval agent plans stored as templates.
+
+    A plan is the {"api_calls": [...]} object produced by the retrieval agent. On store,
+    values equal to the query's dates and province id are replaced by slots and per-period
+    calls are collapsed into a single template call. On lookup, a plan with the same shape
+    is instantiated locally with the new query's values, skipping the agent entirely.
+    """
+
+    def __init__(self, metadata_path: str = "data/api_metadata.json", max_entries: int = 256):
+        self.metadata_path = metadata_path
+        self.max_entries = max_entries
+        self._templates: Dict[Tuple, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._metadata_mtime = None
+        self._metadata_hash = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self._check_metadata()
+
+    def _fingerprint_metadata(self) -> Optional[str]:
+        try:
+            with open(self.metadata_path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError as e:
+            logger.warning(f"Could not fingerprint {self.metadata_path}: {e}")
+            return None
+
+    def _check_metadata(self) -> None:
+        """Drop all templates if the API metadata file changed since they were stored"""
+        try:
+            mtime = os.path.getmtime(self.metadata_path)
+        except OSError:
+            mtime = None
+        if mtime == self._metadata_mtime:
+            return
+
+        # mtime changed, only invalidate if the content actually changed
+        digest = self._fingerprint_metadata()
+        self._metadata_mtime = mtime
+        if digest != self._metadata_hash:
+            if self._metadata_hash is not None and self._templates:
+                logger.info("API metadata changed, invalidating plan cache")
+                self._templates.clear()
+                self.invalidations += 1
+            self._metadata_hash = digest
+
+    def invalidate(self) -> None:
+        """Remove all cached templates"""
+        with self._lock:
+            self._templates.clear()
+            self.invalidations += 1
+        logger.info("Plan cache invalidated")
+
+    def _to_template(self, params: Dict[str, Any], plan: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        periods = [str(p) for p in _as_list(params.get("datePeriod"))]
+        if params.get("startDate") and params.get("startDate") == params.get("endDate"):
+            # Can't tell which slot a shared value belongs to
+            return None
+        date_slots = {period: DATE_PERIOD_SLOT for period in periods}
+        if params.get("startDate"):
+            date_slots[str(params["startDate"])] = START_DATE_SLOT
+        if params.get("endDate"):
+            date_slots[str(params["endDate"])] = END_DATE_SLOT
+        provinces = _as_list(params.get("province_id"))
+        province = str(provinces[0]) if provinces else None
+
+        def slot(value, key=""):
+            if isinstance(value, dict):
+                return {k: slot(v, k) for k, v in value.items()}
+            if isinstance(value, list):
+                return [slot(v, key) for v in value]
+            if isinstance(value, str) and value in date_slots:
+                return date_slots[value]
+            # Only slot province ids under province keys, small ints are common elsewhere
+            if (province is not None and "province" in str(key).lower()
+                    and not isinstance(value, bool) and str(value) == province):
+                return PROVINCE_SLOT
+            return value
+
+        template = []
+        seen = set()
+        for call in plan.get("api_calls", []):
+            if not isinstance(call, dict) or "endpoint" not in call:
+                return None
+            templated = slot(call)
+            encoded = json.dumps(templated, sort_keys=True, ensure_ascii=False)
+            if ISO_DATE_PATTERN.search(encoded):
+                # A date we couldn't map to a slot, the plan isn't reusable
+                return None
+            # Per-period calls collapse to a single template call
+            if encoded not in seen:
+                seen.add(encoded)
+                template.append(templated)
+
+        return template or None
+
+    def store(self, params: Dict[str, Any], plan: Dict[str, Any]) -> bool:
+        """
+        Store a retrieval plan as a template for the shape of the given parameters.
+
+        Args:
+            params (dict): The query parameters the plan was produced for.
+            plan (dict): The retrieval agent output containing "api_calls".
+
+        Returns:
+            bool: True if the plan was cached.
+        """
+        key = plan_shape(params)
+        if key is None:
+            return False
+        template = self._to_template(params, plan)
+        if template is None:
+            logger.info(f"Plan for shape {key} is not templatable, not caching")
+            return False
+
+        with self._lock:
+            self._check_metadata()
+            if key not in self._templates and len(self._templates) >= self.max_entries:
+                # Evict the oldest template
+                self._templates.pop(next(iter(self._templates)))
+            self._templates[key] = template
+            self.stores += 1
+        logger.info(f"Stored plan template for shape {key} ({len(template)} template calls)")
+        return True
+
+    def lookup(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Instantiate a cached plan for the given query parameters.
+
+        Args:
+            params (dict): The "parameters" object produced by the query agent.
+
+        Returns:
+            dict | None: {"api_calls": [...]} on a hit, None on a miss.
+        """
+        start = time.perf_counter()
+        key = plan_shape(params)
+        with self._lock:
+            self._check_metadata()
+            template = self._templates.get(key) if key is not None else None
+            if template is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        periods = _as_list(params.get("datePeriod"))
+        provinces = _as_list(params.get("province_id"))
+        values = {
+            START_DATE_SLOT: params.get("startDate"),
+            END_DATE_SLOT: params.get("endDate"),
+            PROVINCE_SLOT: provinces[0] if provinces else None,
+        }
+
+        def fill(value, period):
+            if isinstance(value, dict):
+                return {k: fill(v, period) for k, v in value.items()}
+            if isinstance(value, list):
+                return [fill(v, period) for v in value]
+            if value == DATE_PERIOD_SLOT:
+                return period
+            if value in values:
+                return values[value]
+            return value
+
+        api_calls = []
+        for call in template:
+            if DATE_PERIOD_SLOT in json.dumps(call):
+                for period in periods:
+                    api_calls.append(fill(copy.deepcopy(call), period))
+            else:
+                api_calls.append(fill(copy.deepcopy(call), None))
+
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        logger.info(f"Plan cache hit for shape {key}: {len(api_calls)} calls in {elapsed_us:.0f}µs")
+        return {"api_calls": api_calls}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss metrics for the cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._templates),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,226 @@
+from core.tracing import span
+from datetime import datetime
+import json
+import sqlite3
+
+
+class QueryDatabase:
+    """Simple SQLite database to store query history"""
+    
+    def __init__(self, db_path="query_history.db"):
+        self.db_path = db_path
+        self.init_db()
+    
+    def init_db(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS queries (
+                id TEXT PRIMARY KEY,
+                timestamp TEXT,
+                query TEXT,
+                status TEXT,
+                result_data TEXT,
+                visualization_data TEXT,
+                report TEXT,
+                error_message TEXT,
+                budget_usage TEXT,
+                session_id TEXT,
+                parent_id TEXT,
+                workflow TEXT
+            )
+        ''')
+        # Databases created by earlier versions lack the newer columns
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(queries)")}
+        for column in ("budget_usage", "session_id", "parent_id", "workflow"):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE queries ADD COLUMN {column} TEXT")
+        # One row per LLM or embedding call of a query
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                query_id TEXT,
+                timestamp TEXT,
+                kind TEXT,
+                agent TEXT,
+                tier TEXT,
+                node TEXT,
+                model TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                cached_tokens INTEGER,
+                cost REAL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_query ON llm_usage (query_id)")
+        conn.commit()
+        conn.close()
+    
+    def save_query(self, query_id, query, status, result_data=None, 
+                   visualization_data=None, report=None, error_message=None, budget_usage=None,
+                   session_id=None, parent_id=None, workflow=None):
+        with span("save_query", "db", status=status):
+            self._save_query(query_id, query, status, result_data, visualization_data, report, error_message,
+                             budget_usage, session_id, parent_id, workflow)
+    
+    def _save_query(self, query_id, query, status, result_data, visualization_data, report, error_message,
+                    budget_usage, session_id, parent_id, workflow):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        # Upsert so the session a query belongs to survives its status updates
+        cursor.execute('''
+            INSERT INTO queries 
+            (id, timestamp, query, status, result_data, visualization_data, report, error_message, budget_usage,
+             session_id, parent_id, workflow)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                timestamp = excluded.timestamp, query = excluded.query, status = excluded.status,
+                result_data = excluded.result_data, visualization_data = excluded.visualization_data,
+                report = excluded.report, error_message = excluded.error_message,
+                budget_usage = excluded.budget_usage,
+                session_id = COALESCE(excluded.session_id, queries.session_id),
+                parent_id = COALESCE(excluded.parent_id, queries.parent_id),
+                workflow = COALESCE(excluded.workflow, queries.workflow)
+        ''', (query_id, datetime.now().isoformat(), query, status, 
+              json.dumps(result_data) if result_data else None,
+              json.dumps(visualization_data) if visualization_data else None,
+              report, error_message,
+              json.dumps(budget_usage) if budget_usage else None,
+              session_id, parent_id, workflow))
+        conn.commit()
+        conn.close()
+    
+    def get_all_queries(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, timestamp, query, status, result_data, visualization_data, report, error_message
+            FROM queries ORDER BY timestamp DESC
+        ''')
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    
+    def get_query(self, query_id):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, timestamp, query, status, result_data, visualization_data, report, error_message
+            FROM queries WHERE id = ?
+        ''', (query_id,))
+        result = cursor.fetchone()
+        conn.close()
+        return result
+    
+    def get_session(self, query_id):
+        """Return the (session_id, parent_id) of a query, (None, None) if unknown"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT session_id, parent_id FROM queries WHERE id = ?", (query_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return row if row else (None, None)
+    
+    def get_session_queries(self, session_id):
+        """Return the ids and texts of a session's queries, oldest first"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, query, parent_id FROM queries WHERE session_id = ? ORDER BY timestamp
+        ''', (session_id,))
+        results = cursor.fetchall()
+        conn.close()
+        return results
+    
+    def get_budget_usage(self, query_id):
+        """Return the recorded budget usage of a query, None if it wasn't recorded"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT budget_usage FROM queries WHERE id = ?", (query_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return json.loads(row[0]) if row and row[0] else None
+    
+    def save_usage(self, query_id, records):
+        """
+        Store the LLM and embedding calls of a query.
+
+        Args:
+            query_id (str): The query the calls belong to.
+            records (list): `UsageLedger.records`, one dict per call.
+        """
+        if not records:
+            return
+        with span("save_usage", "db", calls=len(records)):
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany('''
+                INSERT INTO llm_usage
+                (query_id, timestamp, kind, agent, tier, node, model, prompt_tokens, completion_tokens,
+                 cached_tokens, cost)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(query_id, r["timestamp"], r["kind"], r["agent"], r["tier"], r["node"], r["model"],
+                   r["prompt_tokens"], r["completion_tokens"], r["cached_tokens"], r["cost"]) for r in records])
+            conn.commit()
+            conn.close()
+    
+    def get_query_usage(self, query_id):
+        """Return the calls, tokens and cost of a query per agent, tier and model"""
+        return self.usage_report(("agent", "tier", "model"), query_id=query_id)
+    
+    # Columns usage reports can be grouped by
+    USAGE_GROUPS = {
+        "agent": "COALESCE(u.agent, 'unknown')",
+        "tier": "COALESCE(u.tier, 'unknown')",
+        "model": "COALESCE(u.model, 'unknown')",
+        "kind": "u.kind",
+        "node": "COALESCE(u.node, 'unknown')",
+        "workflow": "COALESCE(q.workflow, 'unknown')",
+        "day": "substr(u.timestamp, 1, 10)",
+    }
+    
+    def usage_report(self, group_by=("agent",), since=None, until=None, query_id=None):
+        """
+        Aggregate recorded LLM and embedding usage.
+
+        Args:
+            group_by (str | tuple): One or more of agent, tier, model, kind, node, workflow
+                and day.
+            since (str, optional): Only calls at or after this ISO date/time.
+            until (str, optional): Only calls before this ISO date/time.
+            query_id (str, optional): Only the calls of this query.
+
+        Returns:
+            list: One dict per group with the group values, the number of queries and calls,
+                prompt/completion/cached tokens and the USD cost, costliest first.
+        """
+        if isinstance(group_by, str):
+            group_by = (group_by,)
+        unknown = [group for group in group_by if group not in self.USAGE_GROUPS]
+        if unknown:
+            raise ValueError(f"Unknown usage report group(s): {', '.join(unknown)}")
+        columns = [f"{self.USAGE_GROUPS[group]} AS {group}" for group in group_by]
+        conditions, params = [], []
+        for condition, value in (("u.timestamp >= ?", since), ("u.timestamp < ?", until),
+                                 ("u.query_id = ?", query_id)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT {", ".join(columns)}, COUNT(DISTINCT u.query_id), COUNT(*), SUM(u.prompt_tokens),
+                   SUM(u.completion_tokens), SUM(u.cached_tokens), SUM(u.cost)
+            FROM llm_usage u LEFT JOIN queries q ON q.id = u.query_id
+            {where}
+            GROUP BY {", ".join(group_by)}
+            ORDER BY SUM(u.cost) DESC, SUM(u.prompt_tokens) DESC
+        ''', params)
+        rows = cursor.fetchall()
+        conn.close()
+        n = len(group_by)
+        return [
+            {**dict(zip(group_by, row[:n])), "queries": row[n], "calls": row[n + 1], "prompt_tokens": row[n + 2],
+             "completion_tokens": row[n + 3], "cached_tokens": row[n + 4], "cost": round(row[n + 5] or 0.0, 6)}
+            for row in rows
+        ]
@@ -0,0 +1,534 @@
+import calendar
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from tools.resolve_province_id import load_province_list
+from logger import setup_logger
+
+logger = setup_logger("logs/query_parser.log")
+
+WORKFLOW_DATA = "get data - return data"
+WORKFLOW_VISUALIZATION = "get data - return visualization - return report"
+WORKFLOW_ANALYSIS = "get data - make analysis - return visualization - return report"
+
+TIMEZONE_SUFFIX = "+03:00"
+
+# Turkish characters folded to ASCII before matching
+_FOLD = str.maketrans({
+    "ı": "i", "İ": "i", "I": "i", "ş": "s", "Ş": "s", "ğ": "g", "Ğ": "g",
+    "ü": "u", "Ü": "u", "ö": "o", "Ö": "o", "ç": "c", "Ç": "c", "â": "a", "î": "i", "û": "u",
+})
+
+MONTHS = {
+    "ocak": 1, "january": 1,
+    "subat": 2, "february": 2,
+    "mart": 3, "march": 3,
+    "nisan": 4, "april": 4,
+    "mayis": 5, "may": 5,
+    "haziran": 6, "june": 6,
+    "temmuz": 7, "july": 7,
+    "agustos": 8, "august": 8,
+    "eylul": 9, "september": 9,
+    "ekim": 10, "october": 10,
+    "kasim": 11, "november": 11,
+    "aralik": 12, "december": 12,
+}
+
+# Data type keyword -> (data type, default granularity)
+DATA_TYPES = [
+    (r"piyasa takas fiyat|\bptf\b|\bmcp\b|market clearing price", "MCP", "hourly"),
+    (r"sistem marjinal fiyat|\bsmf\b|\bsmp\b|system marginal price", "SMP", "hourly"),
+    (r"dengesizlik|imbalance", "imbalance", "hourly"),
+    (r"doluluk|fill rate|fullness", "fill rate", "daily"),
+    (r"tuketim|consumption", "consumption", "monthly"),
+    (r"uretim|generation", "generation", "hourly"),
+]
+
+OPERATION_TYPES = [
+    (r"\boran|\bratio\b|\bshare\b|\bpayi", "ratio"),
+    (r"karsilastir|compar|\bvs\.?\b|\bversus\b", "comparison"),
+    (r"\btrend", "trend"),
+    (r"dagilim|distribution", "distribution"),
+    (r"\bfark|difference", "difference"),
+]
+
+CHART_TYPES = [
+    (r"cizgi|\bline\b", "line"),
+    (r"\bbar\b|sutun|cubuk", "bar"),
+    (r"pasta|\bpie\b", "pie"),
+    (r"scatter|sacilim", "scatter"),
+    (r"\balan\b|\barea\b", "area"),
+]
+
+ANALYSIS_PATTERN = re.compile(r"analiz|analys|analyz|incele")
+# grafi[gk] covers the inflected "grafiği", "grafiğini" (folded to grafigi, grafigini)
+CHART_PATTERN = re.compile(r"grafi[gk]|chart|plot|\bciz|gorsel|visuali")
+GRANULARITY_PATTERN = [
+    (re.compile(r"saatlik|hourly"), "hourly"),
+    (re.compile(r"gunluk|daily"), "daily"),
+    (re.compile(r"aylik|monthly"), "monthly"),
+]
+
+TODAY_PATTERN = re.compile(
+    r"(?:today'?s date is|bugun(?:un tarihi)?)\s*:?\s*(\d{1,2})[./-](\d{1,2})[./-](\d{4})"
+)
+DATE_PATTERN = re.compile(r"\b(\d{1,2})[./](\d{1,2})[./](\d{4})\b|\b(\d{4})-(\d{2})-(\d{2})\b")
+# English "may" is a month only next to a year, a day number, another month or a range/period word,
+# otherwise it is the modal verb ("May I see ...", "prices may rise")
+MAY_MONTH_PATTERN = re.compile(
+    r"(?:\b(?:in|of|from|since|until|to|through|\d{1,4}(?:st|nd|rd|th)?)\s+|[-\u2013]\s*)may\b"
+    r"|\bmay\s*(?:\d{1,4}\b|[-\u2013]|(?:to|through|until)\b)"
+)
+LAST_N_PATTERN = re.compile(r"(?:son|last|past)\s+(\d{1,2})\s+(ay|month|gun|day)")
+# Follow-ups that extend the previous request rather than replace part of it
+ADD_PATTERN = re.compile(r"\bekle|\badd\b|\balso\b|\bayrica|\binclud|\bdahil|\bde\b|\bda\b|\bplus\b")
+
+
+def fold(text: str) -> str:
+    """Lowercase and fold Turkish characters to ASCII"""
+    return text.translate(_FOLD).lower()
+
+
+def _iso(day: date) -> str:
+    return f"{day.isoformat()}T00:00:00{TIMEZONE_SUFFIX}"
+
+
+def _month_start(year: int, month: int) -> date:
+    return date(year, month, 1)
+
+
+def _month_end(year: int, month: int) -> date:
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _shift_month(year: int, month: int, delta: int) -> Tuple[int, int]:
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+def parse_day(value: Any) -> Optional[date]:
+    """Parse the day of an ISO 8601 parameter value, None if it isn't one"""
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def as_periods(value: Any) -> List[str]:
+    """Normalize a datePeriod parameter to a list"""
+    if not value:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+@dataclass
+class ParseResult:
+    """Result of a fast-path parse attempt"""
+    parsed: Optional[Dict[str, Any]]
+    confidence: float
+    reasons: List[str] = field(default_factory=list)
+
+
+class QueryParser:
+    """
+    Deterministic parser for formulaic portal queries.
+
+    Extracts dates and periods, provinces, data types, operation and chart types from
+    Turkish or English queries and emits the same JSON structure as the query agent.
+    Queries that can't be parsed confidently are left to the LLM.
+    """
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.total = 0
+        self.fast_path = 0
+        self._provinces = self._build_province_index()
+
+    @staticmethod
+    def _build_province_index() -> List[Tuple[str, int]]:
+        index = []
+        for province in load_province_list():
+            name = fold(province["name"])
+            index.append((name, province["id"]))
+            if "-" in name:
+                index.append((name.replace("-", " "), province["id"]))
+        # Longest names first so "istanbul avrupa" wins over "istanbul"
+        return sorted(index, key=lambda item: len(item[0]), reverse=True)
+
+    def _find_province(self, text: str, reasons: List[str]) -> Tuple[Optional[int], float]:
+        for name, province_id in self._provinces:
+            # Proper nouns take their case suffix after an apostrophe, e.g. Adana'da, İzmir'in
+            if re.search(rf"\b{re.escape(name)}(?:'[a-z]{{1,6}})?(?![a-z])", text):
+                return province_id, 1.0
+        if re.search(r"\bistanbul", text):
+            reasons.append("ambiguous province: istanbul")
+            return None, 0.0
+        for name, _ in self._provinces:
+            # "Adanada" without the apostrophe, or a word that merely starts like a province
+            if re.search(rf"\b{re.escape(name)}[a-z]{{1,5}}\b", text):
+                reasons.append(f"possible unmarked province: {name}")
+                return None, 0.5
+        return None, 1.0
+
+    @staticmethod
+    def _find_today(text: str) -> Optional[date]:
+        match = TODAY_PATTERN.search(text)
+        if not match:
+            return None
+        day, month, year = (int(g) for g in match.groups())
+        try:
+            return date(year, month, day)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _find_months(text: str, today: Optional[date], reasons: List[str]) -> Tuple[List[Tuple[int, int]], float]:
+        """Find explicit month mentions, expanding ranges like 'ocak-mart' or 'ocaktan marta'"""
+        tokens = re.findall(r"[a-z]+|\d{4}", text)
+        mentions = []  # (position, month)
+        years = []  # (position, year)
+        may_is_month = bool(MAY_MONTH_PATTERN.search(text))
+        for position, token in enumerate(tokens):
+            if token.isdigit():
+                years.append((position, int(token)))
+                continue
+            if token == "may" and not may_is_month:
+                continue
+            for stem, month in MONTHS.items():
+                if token == stem or (len(stem) > 3 and token.startswith(stem) and len(token) - len(stem) <= 5):
+                    mentions.append((position, month))
+                    break
+        if not mentions:
+            return [], 1.0
+
+        confidence = 1.0
+
+        def year_for(position, month):
+            if years:
+                # Closest year mention to the month
+                return min(years, key=lambda y: abs(y[0] - position))[1]
+            # Most recent occurrence of the month relative to the anchor date
+            return today.year if month <= today.month else today.year - 1
+
+        is_range = bool(re.search(r"(ocak|subat|mart|nisan|mayis|haziran|temmuz|agustos|eylul|ekim|kasim|aralik)"
+                                  r"[a-z]*?(?:\s*-\s*|\s+(?:ile|ila|to|through|until)\s+|(?:dan|den|tan|ten)\s+)", text)) \
+            and len(mentions) == 2
+        if not years:
+            if today is None:
+                reasons.append("month without year and no anchor date")
+                return [], 0.0
+            confidence -= 0.1
+
+        months = []
+        if is_range:
+            (p1, m1), (p2, m2) = mentions
+            y1 = year_for(p1, m1)
+            y2 = year_for(p2, m2) if years else y1
+            if (y2, m2) < (y1, m1):
+                y2 = y1 + 1 if y1 == y2 else y2
+            year, month = y1, m1
+            while (year, month) <= (y2, m2):
+                months.append((year, month))
+                year, month = _shift_month(year, month, 1)
+        else:
+            for position, month in mentions:
+                year = year_for(position, month)
+                if (year, month) not in months:
+                    months.append((year, month))
+        return months, confidence
+
+    @staticmethod
+    def _find_relative(text: str, today: Optional[date]) -> Optional[Dict[str, Any]]:
+        """Resolve relative expressions anchored to the injected date"""
+        if today is None:
+            return None
+        match = LAST_N_PATTERN.search(text)
+        if match:
+            count, unit = int(match.group(1)), match.group(2)
+            if unit in ("ay", "month"):
+                months = [_shift_month(today.year, today.month, -i) for i in range(count, 0, -1)]
+                return {"months": months}
+            return {"start": today - timedelta(days=count), "end": today - timedelta(days=1)}
+        if re.search(r"gecen ay|last month|previous month|onceki ay", text):
+            return {"months": [_shift_month(today.year, today.month, -1)]}
+        if re.search(r"bu ay\b|this month", text):
+            return {"start": _month_start(today.year, today.month), "end": today}
+        if re.search(r"gecen hafta|last week", text):
+            monday = today - timedelta(days=today.weekday() + 7)
+            return {"start": monday, "end": monday + timedelta(days=6)}
+        if re.search(r"\bdun\b|yesterday", text):
+            yesterday = today - timedelta(days=1)
+            return {"start": yesterday, "end": yesterday}
+        if re.search(r"gecen yil|last year|previous year", text):
+            return {"months": [(today.year - 1, m) for m in range(1, 13)]}
+        return None
+
+    def parse(self, query: str) -> ParseResult:
+        """
+        Parse a user query into the query agent's JSON structure.
+
+        Args:
+            query (str): The raw user input, optionally including "Today's date is dd.mm.yyyy".
+
+        Returns:
+            ParseResult: The parsed JSON (or None) with a confidence score and the reasons
+                for any confidence penalties.
+        """
+        text = fold(query)
+        reasons: List[str] = []
+        confidence = 1.0
+        today = self._find_today(text)
+        # Don't let the injected system date be read as the requested period
+        body = TODAY_PATTERN.sub(" ", text)
+
+        # Data types
+        data_types, granularities = [], set()
+        for pattern, data_type, default_granularity in DATA_TYPES:
+            if re.search(pattern, body):
+                data_types.append(data_type)
+                granularities.add(default_granularity)
+        if not data_types:
+            return ParseResult(None, 0.0, ["no data type keyword"])
+        if len(granularities) > 1:
+            reasons.append("mixed granularities")
+            confidence -= 0.3
+
+        granularity = next(iter(granularities))
+        for pattern, explicit in GRANULARITY_PATTERN:
+            if pattern.search(body):
+                granularity = explicit
+                break
+
+        # Dates
+        parameters: Dict[str, Any] = {}
+        explicit_dates = []
+        for match in DATE_PATTERN.finditer(body):
+            try:
+                if match.group(1):
+                    explicit_dates.append(date(int(match.group(3)), int(match.group(2)), int(match.group(1))))
+                else:
+                    explicit_dates.append(date(int(match.group(4)), int(match.group(5)), int(match.group(6))))
+            except ValueError:
+                reasons.append("invalid date")
+                confidence = 0.0
+        months, month_confidence = self._find_months(body, today, reasons)
+        confidence -= 1.0 - month_confidence
+        relative = None if (explicit_dates or months) else self._find_relative(body, today)
+
+        start = end = None
+        if explicit_dates:
+            start, end = min(explicit_dates), max(explicit_dates)
+        elif months:
+            months = sorted(months)
+            if granularity == "monthly":
+                parameters["datePeriod"] = [_iso(_month_start(y, m)) for y, m in months]
+            else:
+                start, end = _month_start(*months[0]), _month_end(*months[-1])
+        elif relative:
+            if "months" in relative and granularity == "monthly":
+                parameters["datePeriod"] = [_iso(_month_start(y, m)) for y, m in relative["months"]]
+            elif "months" in relative:
+                start, end = _month_start(*relative["months"][0]), _month_end(*relative["months"][-1])
+            else:
+                start, end = relative["start"], relative["end"]
+        else:
+            return ParseResult(None, 0.0, reasons + ["no date expression"])
+
+        if start is not None:
+            if granularity == "monthly":
+                # Monthly data asked with a day range, use the covered months
+                year, month = start.year, start.month
+                periods = []
+                while (year, month) <= (end.year, end.month):
+                    periods.append(_iso(_month_start(year, month)))
+                    year, month = _shift_month(year, month, 1)
+                parameters["datePeriod"] = periods
+            else:
+                parameters["startDate"] = _iso(start)
+                parameters["endDate"] = _iso(end)
+
+        if "datePeriod" in parameters and len(parameters["datePeriod"]) == 1:
+            parameters["datePeriod"] = parameters["datePeriod"][0]
+
+        # Location
+        province_id, province_confidence = self._find_province(body, reasons)
+        confidence = min(confidence, province_confidence)
+        if province_id is not None:
+            parameters["province_id"] = province_id
+
+        parameters["dataTypes"] = data_types
+
+        # Intent
+        operation = next((name for pattern, name in OPERATION_TYPES if re.search(pattern, body)), None)
+        chart = next((name for pattern, name in CHART_TYPES if re.search(pattern, body)), None)
+        if ANALYSIS_PATTERN.search(body):
+            workflow = WORKFLOW_ANALYSIS
+        elif chart or operation or CHART_PATTERN.search(body):
+            workflow = WORKFLOW_VISUALIZATION
+        else:
+            workflow = WORKFLOW_DATA
+
+        parameters["workflow"] = workflow
+        parameters["operationType"] = operation
+        parameters["chartType"] = chart
+        # Keep the user's wording so downstream agents see details the rules don't model
+        description = re.sub(r"(?is).*?query\s*:", "", query).strip() if re.search(r"(?i)query\s*:", query) else query.strip()
+        parameters["description"] = description or None
+
+        return ParseResult({"intent": workflow, "parameters": parameters}, max(confidence, 0.0), reasons)
+
+    def _followup_dates(self, body: str, today: Optional[date], previous: Dict[str, Any], extend: bool,
+                        reasons: List[str]) -> Tuple[Dict[str, Any], float]:
+        """Resolve the dates of a follow-up in the representation of the previous parameters"""
+        explicit_dates = []
+        for match in DATE_PATTERN.finditer(body):
+            try:
+                if match.group(1):
+                    explicit_dates.append(date(int(match.group(3)), int(match.group(2)), int(match.group(1))))
+                else:
+                    explicit_dates.append(date(int(match.group(4)), int(match.group(5)), int(match.group(6))))
+            except ValueError:
+                reasons.append("invalid date")
+                return {}, 0.0
+        months, confidence = self._find_months(body, today, reasons)
+        relative = None if (explicit_dates or months) else self._find_relative(body, today)
+        if relative and "months" in relative:
+            months = relative["months"]
+        if explicit_dates:
+            start, end = min(explicit_dates), max(explicit_dates)
+        elif months:
+            months = sorted(months)
+            start, end = _month_start(*months[0]), _month_end(*months[-1])
+        elif relative:
+            start, end = relative["start"], relative["end"]
+        else:
+            return {}, confidence
+
+        periods = as_periods(previous.get("datePeriod"))
+        if periods:
+            requested = [_iso(_month_start(y, m)) for y, m in (months or [])] or [_iso(_month_start(start.year, start.month))]
+            periods = sorted(set(periods) | set(requested)) if extend else requested
+            return {"datePeriod": periods if len(periods) > 1 else periods[0]}, confidence
+
+        previous_start, previous_end = parse_day(previous.get("startDate")), parse_day(previous.get("endDate"))
+        if extend and previous_start and previous_end:
+            start, end = min(start, previous_start), max(end, previous_end)
+        return {"startDate": _iso(start), "endDate": _iso(end)}, confidence
+
+    def parse_followup(self, query: str, previous: Dict[str, Any]) -> ParseResult:
+        """
+        Apply a follow-up query to the parameters of the query it follows.
+
+        Handles chart and operation changes ("now show it as a bar chart"), asking for an
+        analysis, adding or replacing dates ("add March"), data types and the province.
+
+        Args:
+            query (str): The follow-up text.
+            previous (dict): The "parameters" object of the previous query.
+
+        Returns:
+            ParseResult: The full updated query agent JSON (or None if no change was
+                recognized), with a confidence score.
+        """
+        text = fold(query)
+        reasons: List[str] = []
+        confidence = 1.0
+        # Months without a year refer to the year of the previous request
+        anchor = parse_day(previous.get("endDate")) or parse_day((as_periods(previous.get("datePeriod")) or [""])[-1])
+        today = self._find_today(text) or (date(anchor.year, 12, 31) if anchor else None)
+        body = TODAY_PATTERN.sub(" ", text)
+        extend = bool(ADD_PATTERN.search(body))
+        parameters = {k: v for k, v in previous.items() if v is not None}
+        changes = []
+
+        data_types = [data_type for pattern, data_type, _ in DATA_TYPES if re.search(pattern, body)]
+        previous_types = list(previous.get("dataTypes") or [])
+        if data_types:
+            parameters["dataTypes"] = previous_types + [t for t in data_types if t not in previous_types] \
+                if extend else data_types
+        if parameters.get("dataTypes", []) != previous_types:
+            changes.append("dataTypes")
+
+        dates, date_confidence = self._followup_dates(body, today, previous, extend, reasons)
+        confidence -= 1.0 - date_confidence
+        date_keys = ("datePeriod", "startDate", "endDate")
+        if dates and any(dates.get(key) != previous.get(key) for key in date_keys):
+            for key in date_keys:
+                parameters.pop(key, None)
+            parameters.update(dates)
+            changes.append("dates")
+
+        province_id, province_confidence = self._find_province(body, reasons)
+        confidence = min(confidence, province_confidence)
+        if province_id is not None and province_id != previous.get("province_id"):
+            parameters["province_id"] = province_id
+            changes.append("province")
+
+        workflow = parameters.get("workflow", WORKFLOW_DATA)
+        chart = next((name for pattern, name in CHART_TYPES if re.search(pattern, body)), None)
+        operation = next((name for pattern, name in OPERATION_TYPES if re.search(pattern, body)), None)
+        if chart and chart != previous.get("chartType"):
+            parameters["chartType"] = chart
+            changes.append("chartType")
+        if operation and operation != previous.get("operationType"):
+            parameters["operationType"] = operation
+            changes.append("operationType")
+        if ANALYSIS_PATTERN.search(body):
+            workflow = WORKFLOW_ANALYSIS
+        elif (chart or operation or CHART_PATTERN.search(body)) and workflow == WORKFLOW_DATA:
+            workflow = WORKFLOW_VISUALIZATION
+        if workflow != parameters.get("workflow"):
+            changes.append("workflow")
+        parameters["workflow"] = workflow
+
+        if not changes:
+            return ParseResult(None, 0.0, reasons + ["no recognized follow-up change"])
+        reasons.append(f"follow-up changes: {', '.join(changes)}")
+        parameters["description"] = f"{previous.get('description') or ''} (follow-up: {query.strip()})".strip()
+        return ParseResult({"intent": workflow, "parameters": parameters}, max(confidence, 0.0), reasons)
+
+    def try_parse_followup(self, query: str, previous: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Like `try_parse`, for a follow-up to a query with the given parameters"""
+        result = self.parse_followup(query, previous)
+        taken = result.parsed is not None and result.confidence >= self.threshold
+        with self._lock:
+            self.total += 1
+            if taken:
+                self.fast_path += 1
+        if taken:
+            logger.info(f"Fast-path follow-up parse ({result.reasons[-1]})")
+            return result.parsed
+        logger.info(f"Falling back to query agent for follow-up (reasons: {result.reasons})")
+        return None
+
+    def try_parse(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse the query if confident enough, recording whether the fast path was taken.
+
+        Returns:
+            dict | None: The query agent JSON, or None to fall back to the LLM.
+        """
+        result = self.parse(query)
+        taken = result.parsed is not None and result.confidence >= self.threshold
+        with self._lock:
+            self.total += 1
+            if taken:
+                self.fast_path += 1
+        if taken:
+            logger.info(f"Fast-path parse (confidence {result.confidence:.2f})")
+            return result.parsed
+        logger.info(f"Falling back to query agent (confidence {result.confidence:.2f}, reasons: {result.reasons})")
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the fraction of queries that took the fast path"""
+        with self._lock:
+            return {
+                "total": self.total,
+                "fast_path": self.fast_path,
+                "fallback": self.total - self.fast_path,
+                "fast_path_ratio": self.fast_path / self.total if self.total else 0.0,
+            }
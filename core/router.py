@@ -1,10 +1,8 @@
 from core.state import State
-from typing import Literal, Union, Dict
-from langchain_core.messages import AIMessage
+from typing import Literal, Union, List
 from langgraph.graph import END
+from langgraph.types import Send
 from logger import setup_logger
-import json
-import ast
 
 logger = setup_logger()
 
@@ -23,45 +21,8 @@ def process_router(state: State) -> NodeType:
         NodeType: The next process node to route to based on the process decision.
     """
     logger.info("Entering process_router")
-    process_decision = state.get("process_decision", "")
-
-    decision_str: str = ""
-
-    try:
-        # Handle AIMessage content first
-        if isinstance(process_decision, AIMessage):
-            logger.debug("Process decision is an AIMessage")
-            content = process_decision.content.strip()
-            # Attempt JSON parsing
-            try:
-                decision_dict = json.loads(content.replace("'", '"'))
-                decision_str = str(decision_dict.get('next', ''))
-            except json.JSONDecodeError:
-                # Attempt Python literal evaluation for dict-like strings
-                try:
-                    decision_dict = ast.literal_eval(content)
-                    decision_str = str(decision_dict.get('next', ''))
-                except Exception:
-                    # Fallback to keyword detection
-                    upper = content.upper()
-                    if "NEXT: ANALYSIS" in upper:
-                        decision_str = "Analysis"
-                    elif "NEXT: VISUALIZATION" in upper:
-                        decision_str = "Visualization"
-                    elif "NEXT: REPORT" in upper:
-                        decision_str = "Report"
-                    elif "NEXT: FINISH" in upper or upper == "FINISH":
-                        decision_str = "FINISH"
-                    else:
-                        decision_str = content
-        # Handle plain dict
-        elif isinstance(process_decision, dict):
-            decision_str = str(process_decision.get('next', ''))
-        else:
-            decision_str = str(process_decision)
-    except Exception as e:
-        logger.error(f"Error processing decision: {e}")
-        decision_str = ""
+    decision = state.get("decision")
+    decision_str = decision.next.strip() if decision is not None else ""
 
     valid_decisions = {"Analysis", "Visualization", "Report", "Process"}
     logger.info(f"Processed decision: {decision_str}")
@@ -78,3 +39,41 @@ def process_router(state: State) -> NodeType:
     # Default to "Process"
     logger.warning(f"Invalid or empty process decision: {decision_str}. Defaulting to 'Process'.")
     return "Process"  # type: ignore
+
+
+def insight_sends(state: State) -> List[Send]:
+    """
+    Build one fan-out branch per insight found in the analysis state.
+
+    Args:
+        state (State): The current state of the system.
+
+    Returns:
+        List[Send]: Sends to the per-insight visualization node, empty if there are no insights.
+    """
+    analysis = state.get("analysis")
+    if analysis is None:
+        return []
+    return [
+        Send("VisualizeInsight", {**state, "insight": insight.model_dump(), "insight_index": index})
+        for index, insight in enumerate(analysis.insights, start=1)
+    ]
+
+
+def process_fanout_router(state: State) -> Union[NodeType, List[Send]]:
+    """
+    Route like `process_router`, but fan out one visualization branch per insight.
+
+    Args:
+        state (State): The current state of the system.
+
+    Returns:
+        NodeType | List[Send]: The next node, or the parallel visualization branches.
+    """
+    decision = process_router(state)
+    if decision == "Visualization":
+        sends = insight_sends(state)
+        if sends:
+            logger.info(f"Fanning out visualization into {len(sends)} parallel branches")
+            return sends
+    return decision
@@ -0,0 +1,174 @@
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import Any, Dict, List, Optional, Tuple, Type, Union
+import json
+import re
+from logger import setup_logger
+
+logger = setup_logger("logs/schemas.log")
+
+
+def load_json_content(content: Any) -> Any:
+    """
+    Parse JSON from an agent message content, tolerating code fences.
+
+    Returns None if the content isn't JSON, which sends it down the validation-error path.
+    """
+    if isinstance(content, (dict, list)):
+        return content
+    if not isinstance(content, str):
+        return None
+    text = content.strip()
+    # Strip ```json ... ``` fences
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+
+class QueryParameters(BaseModel):
+    """Structured parameters extracted from the user query"""
+    model_config = ConfigDict(extra="allow")
+
+    startDate: Optional[str] = None
+    endDate: Optional[str] = None
+    datePeriod: Optional[Union[str, List[str]]] = None
+    province_id: Optional[Union[int, List[int]]] = None
+    dataTypes: List[str] = Field(default_factory=list)
+    workflow: Optional[str] = None
+    operationType: Optional[str] = None
+    chartType: Optional[str] = None
+    description: Optional[str] = None
+
+
+class QueryResult(BaseModel):
+    """Output of the query agent"""
+    intent: Optional[str] = None
+    parameters: QueryParameters
+
+
+class ApiCall(BaseModel):
+    """A single EPİAŞ Transparency API call"""
+    method: str
+    service: str = "/electricity-service"
+    endpoint: str
+    body: Dict[str, Any] = Field(default_factory=dict)
+
+
+class RetrievalPlan(BaseModel):
+    """Output of the retrieval agent"""
+    api_calls: List[ApiCall]
+
+
+class ApiResult(BaseModel):
+    """Output of the API agent, the combined items of every call"""
+    model_config = ConfigDict(extra="allow")
+
+    items: List[Dict[str, Any]]
+
+
+class Insight(BaseModel):
+    """A single finding of the analysis agent"""
+    model_config = ConfigDict(extra="allow", populate_by_name=True)
+
+    finding: str = Field(alias="findings")
+    viz_recommendation: Optional[str] = None
+
+
+class AnalysisResult(BaseModel):
+    """Output of the analysis agent"""
+    insights: List[Insight]
+
+
+class Visualization(BaseModel):
+    """A rendered chart: a PNG `file`, or the Plotly figure JSON file `figure`"""
+    model_config = ConfigDict(extra="allow")
+
+    file: Optional[str] = None
+    figure: Optional[str] = None
+    description: str = ""
+    insight: Optional[int] = None
+
+
+class VisualizationResult(BaseModel):
+    """Output of the visualization agent"""
+    visualizations: List[Visualization]
+
+
+class Report(BaseModel):
+    """Output of the report agent"""
+    report: str
+
+
+class ProcessDecision(BaseModel):
+    """Routing decision of the process supervisor"""
+    next: str
+    task: str = ""
+
+
+# Every model that can appear in the graph state, e.g. for checkpoint deserialization
+STATE_MODELS: Tuple[Type[BaseModel], ...] = (
+    QueryParameters, QueryResult, ApiCall, RetrievalPlan, ApiResult, Insight, AnalysisResult,
+    Visualization, VisualizationResult, Report, ProcessDecision,
+)
+
+AGENT_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "query_agent": QueryResult,
+    "retrieval_agent": RetrievalPlan,
+    "api_agent": ApiResult,
+    "analysis_agent": AnalysisResult,
+    "visualization_agent": VisualizationResult,
+    "report_agent": Report,
+    "process_agent": ProcessDecision,
+}
+
+# State field holding each agent's typed result
+AGENT_STATE_FIELDS: Dict[str, str] = {
+    "query_agent": "query",
+    "retrieval_agent": "plan",
+    "api_agent": "api_data",
+    "analysis_agent": "analysis",
+    "visualization_agent": "visualization",
+    "report_agent": "report",
+    "process_agent": "decision",
+}
+
+
+def parse_agent_output(name: str, output: Any) -> Optional[BaseModel]:
+    """
+    Validate an agent's output against its schema.
+
+    This is the single place where agent text is parsed; downstream code reads the typed
+    object stored in the state.
+
+    Args:
+        name (str): The agent name, e.g. "query_agent".
+        output: The agent output, a string or an already structured dict.
+
+    Returns:
+        BaseModel | None: The validated result, or None if the output doesn't match.
+    """
+    schema = AGENT_SCHEMAS.get(name)
+    if schema is None:
+        return None
+
+    data = output
+    if isinstance(output, str):
+        text = output.strip()
+        if name == "api_agent" and text.startswith("compact_json:"):
+            text = text[len("compact_json:"):]
+        data = load_json_content(text)
+        if data is None and name == "report_agent" and text:
+            # A plain-text report is still a report
+            data = {"report": text}
+
+    if not isinstance(data, dict):
+        logger.warning(f"{name} output is not a JSON object")
+        return None
+    try:
+        return schema.model_validate(data)
+    except ValidationError as e:
+        logger.warning(f"{name} output does not match {schema.__name__}: {e.error_count()} error(s)")
+        return None
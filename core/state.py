@@ -1,5 +1,36 @@
-from langchain_core.messages import BaseMessage
-from typing import Sequence, TypedDict
+from langchain_core.messages import BaseMessage, HumanMessage
+from core.artifacts import get_artifact_store
+from core.schemas import (
+    AnalysisResult, ApiResult, ProcessDecision, QueryParameters, QueryResult, Report, RetrievalPlan,
+    Visualization, VisualizationResult
+)
+from logger import setup_logger
+from typing import Annotated, Any, Dict, List, Optional, Sequence, TypedDict
+import json
+
+logger = setup_logger("logs/state.log")
+
+
+def merge_visualizations(left: List[Visualization], right: Optional[List[Visualization]]) -> List[Visualization]:
+    """
+    Merge visualization entries written by parallel branches.
+
+    An entry is keyed by its branch (the insight it visualizes) and its position among that
+    branch's entries, so re-applying the same entries, as happens when a node returns the full
+    state, never duplicates them, and entries of different branches never replace each other.
+    Writing None clears the entries, which the Process node does before every fan-out.
+    """
+    if right is None:
+        return []
+    merged = {}
+    for entries in (left or [], right):
+        positions = {}
+        for entry in entries:
+            if isinstance(entry, dict):
+                entry = Visualization.model_validate(entry)
+            position = positions[entry.insight] = positions.get(entry.insight, -1) + 1
+            merged[(entry.insight, position)] = entry
+    return list(merged.values())
 
 
 class State(TypedDict):
@@ -28,8 +59,94 @@ class State(TypedDict):
     # The current state of data visualization planning and execution
     visualization_state: str = ""
 
+    # Visualizations produced by the parallel per-insight branches
+    visualizations: Annotated[List[Visualization], merge_visualizations]
+
     # The content of the report sections being written
     report_state: str = ""
 
     # The identifier of the agent who sent the last message
-    sender: str = ""
\ No newline at end of file
+    sender: str = ""
+
+    # Typed agent results, validated once when the agent output is recorded
+    query: Optional[QueryResult]
+    plan: Optional[RetrievalPlan]
+    api_data: Optional[ApiResult]
+    analysis: Optional[AnalysisResult]
+    visualization: Optional[VisualizationResult]
+    report: Optional[Report]
+    decision: Optional[ProcessDecision]
+
+    # Follow-ups: the query this one follows, and the parameter sets still to fetch
+    # (None fetches everything, an empty list reuses the previous data as is)
+    previous_query: Optional[QueryResult]
+    delta: Optional[List[QueryParameters]]
+
+
+def initial_state(user_input: str) -> dict:
+    """Build the initial graph state for a user query"""
+    return {
+        "messages": [HumanMessage(content=user_input)],
+        "process_state": "",
+        "process_decision": "",
+        "query_state": "",
+        "retrieval_state": "",
+        "api_state": "",
+        "analysis_state": "",
+        "visualization_state": "",
+        "report_state": "",
+        "sender": "",
+    }
+
+
+def inline_figures(visualization_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Read the Plotly figures of visualization entries into them as `figure_data`.
+
+    Done once when a query's results are stored, so the figures travel with the results and
+    the browser renders them without the server reading any file on display.
+    """
+    for entry in visualization_data.get("visualizations") or []:
+        if entry.get("figure") and "figure_data" not in entry:
+            try:
+                with open(entry["figure"], encoding="utf-8") as file:
+                    entry["figure_data"] = json.load(file)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read figure {entry['figure']}: {e}")
+    return visualization_data
+
+
+def state_results(final_state: Optional[dict], directory: Optional[str] = None) -> dict:
+    """
+    Extract what a finished query returns to the user from its final graph state.
+
+    The files of the visualizations are moved to the artifact store, see `core.artifacts`.
+
+    Args:
+        directory: Working directory of the query's code, which relative file names are in.
+
+    Returns:
+        dict: The fetched data, the visualizations and the report, None where missing.
+    """
+    results = {"result_data": None, "visualization_data": None, "report": None}
+    if not final_state:
+        return results
+    # Agent outputs were validated when recorded, read the typed results
+    if final_state.get("api_data") is not None:
+        results["result_data"] = final_state["api_data"].model_dump()
+    if final_state.get("visualization") is not None:
+        visualization_data = final_state["visualization"].model_dump(exclude_none=True)
+        results["visualization_data"] = inline_figures(get_artifact_store().collect(visualization_data, directory))
+    if final_state.get("report") is not None:
+        results["report"] = final_state["report"].report
+    elif final_state.get("report_state"):
+        results["report"] = str(final_state["report_state"].content)
+    return results
+
+
+def query_workflow(final_state: Optional[dict]) -> Optional[str]:
+    """Return the workflow (data, visualization, analysis) a finished query ran, None if unknown"""
+    query = (final_state or {}).get("query")
+    if query is None:
+        return None
+    return query.parameters.workflow or query.intent
@@ -0,0 +1,228 @@
+"""
+Compact encodings of tabular data that has to enter a prompt.
+
+API items are lists of flat JSON objects, which repeat every key on every row. When such a
+table must reach an LLM as text (and not through the REPL), `encode_table` writes it as
+either:
+
+- "csv": a header line and one line per row;
+- "columns": a JSON object with one list of values per column;
+
+after compacting the columns: numbers are rounded to significant digits, repeated strings
+are replaced by codes with a legend, and evenly spaced timestamps become a start and a step.
+The smaller encoding, in tokens, is kept. If it still exceeds the token budget, rows are
+downsampled: with Largest-Triangle-Three-Buckets on the first numeric column for time
+series, which keeps the peaks and troughs a plot would show, or evenly otherwise.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import csv
+import io
+import json
+import math
+import os
+import re
+
+from core.usage import count_tokens
+from logger import setup_logger
+from tools.downsampling import lttb
+
+logger = setup_logger("logs/table_encoding.log")
+
+ENCODINGS = ("csv", "columns")
+# Model whose tokenizer measures the encodings
+TOKEN_MODEL = "gpt-4.1"
+# Significant digits numbers are rounded to
+DIGITS = 5
+# Strings are dictionary-encoded when at most this share of the rows are distinct values
+DICTIONARY_RATIO = 0.5
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def table_token_budget() -> int:
+    """Most tokens a table may take in a prompt, from PROMPT_TABLE_TOKENS (default 4000)"""
+    return int(os.getenv("PROMPT_TABLE_TOKENS", "4000"))
+
+
+@dataclass
+class Column:
+    """A compacted column: its values, or the codes of its values, or a regular time range"""
+    name: str
+    values: List[Any]
+    legend: Optional[List[str]] = None
+    start: Optional[str] = None
+    step: Optional[str] = None
+
+
+def _round(value: Any, digits: int) -> Any:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    if not math.isfinite(value):
+        return None
+    if isinstance(value, int):
+        return value
+    rounded = float(f"{value:.{digits}g}")
+    return int(rounded) if rounded.is_integer() else rounded
+
+
+def _step_label(step: timedelta) -> str:
+    seconds = int(step.total_seconds())
+    for unit, size in (("d", 86400), ("h", 3600), ("min", 60)):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def _regular_step(values: List[Any]) -> Optional[timedelta]:
+    """The step of evenly spaced ISO timestamps, None if they aren't"""
+    if len(values) < 3 or not all(isinstance(v, str) and _ISO_DATE.match(v) for v in values):
+        return None
+    try:
+        stamps = [datetime.fromisoformat(v) for v in values]
+        step = stamps[1] - stamps[0]
+        if step <= timedelta(0) or any(b - a != step for a, b in zip(stamps, stamps[1:])):
+            return None
+    except (TypeError, ValueError):
+        # Unparseable, or naive and aware timestamps mixed
+        return None
+    return step
+
+
+def compact_columns(items: Sequence[Dict[str, Any]], digits: int = DIGITS) -> List[Column]:
+    """
+    Split items into compacted columns.
+
+    Args:
+        digits: Significant digits numbers are rounded to.
+    """
+    names: Dict[str, None] = {}
+    for item in items:
+        names.update(dict.fromkeys(item))
+    columns = []
+    for name in names:
+        values = [_round(item.get(name), digits) for item in items]
+        step = _regular_step(values)
+        if step is not None:
+            columns.append(Column(name, [], start=values[0], step=_step_label(step)))
+            continue
+        texts = [v for v in values if isinstance(v, str)]
+        distinct = list(dict.fromkeys(texts))
+        if len(texts) == len(values) and len(distinct) <= DICTIONARY_RATIO * len(values) \
+                and sum(map(len, texts)) > len(texts) * len(str(len(distinct))):
+            codes = {value: i for i, value in enumerate(distinct)}
+            columns.append(Column(name, [codes[v] for v in values], legend=distinct))
+            continue
+        columns.append(Column(name, [json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list)) else v
+                                     for v in values]))
+    return columns
+
+
+def _notes(columns: List[Column]) -> List[str]:
+    notes = []
+    for column in columns:
+        if column.step is not None:
+            notes.append(f"{column.name}: row i is {column.start} + i * {column.step}")
+        elif column.legend is not None:
+            notes.append(f"{column.name} codes: " + "|".join(f"{i}={v}" for i, v in enumerate(column.legend)))
+    return notes
+
+
+def render_csv(columns: List[Column], rows: int) -> str:
+    """A header line and one line per row; regular time ranges and code legends come first as notes"""
+    listed = [column for column in columns if column.step is None]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow([column.name for column in listed])
+    for i in range(rows):
+        writer.writerow(["" if column.values[i] is None else column.values[i] for column in listed])
+    return "".join(f"# {note}\n" for note in _notes(columns)) + buffer.getvalue()
+
+
+def render_columns(columns: List[Column], rows: int) -> str:
+    """One JSON list of values per column, codes with their legend, regular time ranges as start and step"""
+    table: Dict[str, Any] = {"rows": rows}
+    for column in columns:
+        if column.step is not None:
+            table[column.name] = {"start": column.start, "step": column.step}
+        elif column.legend is not None:
+            table[column.name] = {"codes": column.values, "legend": column.legend}
+        else:
+            table[column.name] = column.values
+    return json.dumps(table, ensure_ascii=False, separators=(",", ":"))
+
+
+RENDERERS = {"csv": render_csv, "columns": render_columns}
+
+
+def _series_axes(items: Sequence[Dict[str, Any]]) -> Optional[Tuple[str, List[float], List[float]]]:
+    """The first numeric column and the time axis of items forming a time series, None otherwise"""
+    if not items:
+        return None
+    first = items[0]
+    time_key = next((k for k, v in first.items() if isinstance(v, str) and _ISO_DATE.match(v)), None)
+    value_key = next((k for k, v in first.items()
+                      if isinstance(v, (int, float)) and not isinstance(v, bool)), None)
+    if time_key is None or value_key is None:
+        return None
+    try:
+        xs = [datetime.fromisoformat(item[time_key]).timestamp() for item in items]
+        ys = [float(item[value_key]) for item in items]
+    except (KeyError, TypeError, ValueError):
+        return None
+    # One row per timestamp, several series (e.g. per province) are sampled evenly instead
+    if any(b <= a for a, b in zip(xs, xs[1:])):
+        return None
+    return value_key, xs, ys
+
+
+def downsample(items: Sequence[Dict[str, Any]], rows: int) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Reduce items to about `rows` rows.
+
+    Returns:
+        tuple: The kept items and how they were chosen.
+    """
+    axes = _series_axes(items)
+    if axes is not None:
+        value_key, xs, ys = axes
+        return [items[i] for i in lttb(xs, ys, rows)], f"LTTB on {value_key}"
+    stride = len(items) / max(rows, 1)
+    return [items[int(i * stride)] for i in range(min(rows, len(items)))], "evenly spaced"
+
+
+def encode_items(items: Sequence[Dict[str, Any]], encoding: str, digits: int = DIGITS) -> str:
+    """Encode items with one of ENCODINGS, without any budget"""
+    return RENDERERS[encoding](compact_columns(items, digits), len(items))
+
+
+def encode_table(items: Sequence[Dict[str, Any]], max_tokens: Optional[int] = None,
+                 digits: int = DIGITS, model: str = TOKEN_MODEL) -> str:
+    """
+    Encode items in the smallest of ENCODINGS, downsampled to fit `max_tokens`.
+
+    Args:
+        max_tokens: Token budget, `table_token_budget()` by default.
+        digits: Significant digits numbers are rounded to.
+
+    Returns:
+        str: A one-line header naming the encoding and any sampling, then the table.
+    """
+    max_tokens = table_token_budget() if max_tokens is None else max_tokens
+    items = list(items)
+    kept, sampling = items, None
+    while True:
+        columns = compact_columns(kept, digits)
+        encoded = {name: render(columns, len(kept)) for name, render in RENDERERS.items()}
+        tokens = {name: count_tokens([text], model) for name, text in encoded.items()}
+        encoding = min(tokens, key=tokens.get)
+        if tokens[encoding] <= max_tokens or len(kept) <= 3:
+            break
+        # Shrink proportionally, with some headroom for the notes and the header
+        rows = max(3, min(len(kept) - 1, int(len(kept) * max_tokens / tokens[encoding] * 0.9)))
+        kept, sampling = downsample(items, rows)
+    header = f"table: {len(kept)} rows, {encoding}"
+    if sampling is not None:
+        header += f", sampled from {len(items)} rows ({sampling})"
+        logger.info(f"Table of {len(items)} rows downsampled to {len(kept)} ({sampling}) to fit {max_tokens} tokens")
+    return f"{header}\n{encoded[encoding]}"
@@ -0,0 +1,364 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.runnables.config import var_child_runnable_config
+from core.budget import add_callback, response_usage
+from logger import setup_logger
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = setup_logger("logs/tracing.log")
+
+# Span kinds, also the categories of the portal's waterfall view
+SPAN_KINDS = ("query", "node", "llm", "tool", "http", "db")
+
+
+@dataclass
+class Span:
+    """A timed operation of a query"""
+    span_id: str
+    query_id: str
+    name: str
+    kind: str
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    end: Optional[float] = None
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.end = time.time()
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = str(error)[:500]
+
+
+class SpanStore:
+    """
+    Local SQLite store of finished spans.
+
+    Spans are queued and written in batches by a background thread, so recording a span
+    never blocks a node or the event loop on disk I/O.
+    """
+
+    def __init__(self, path: str = "traces.db", batch_size: int = 256):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Span]" = queue.Queue()
+        conn = sqlite3.connect(path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS spans (
+                span_id TEXT PRIMARY KEY,
+                query_id TEXT,
+                parent_id TEXT,
+                name TEXT,
+                kind TEXT,
+                start REAL,
+                end REAL,
+                status TEXT,
+                attributes TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS spans_query ON spans (query_id, start)")
+        conn.commit()
+        conn.close()
+        writer = threading.Thread(target=self._write_loop, name="span-writer", daemon=True)
+        writer.start()
+
+    def record(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def _write_loop(self) -> None:
+        conn = sqlite3.connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(s.span_id, s.query_id, s.parent_id, s.name, s.kind, s.start, s.end, s.status,
+                      json.dumps(s.attributes, ensure_ascii=False, default=str)) for s in batch]
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Could not store {len(batch)} span(s): {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self) -> None:
+        """Wait until every recorded span is written"""
+        self._queue.join()
+
+    def spans(self, query_id: str) -> List[Dict[str, Any]]:
+        """
+        Return the spans of a query, oldest first.
+
+        Returns:
+            list: Span dicts with span_id, parent_id, name, kind, start, end, status and
+                attributes; start/end are epoch seconds.
+        """
+        self.flush()
+        conn = sqlite3.connect(self.path)
+        rows = conn.execute(
+            "SELECT span_id, parent_id, name, kind, start, end, status, attributes "
+            "FROM spans WHERE query_id = ? ORDER BY start", (query_id,)
+        ).fetchall()
+        conn.close()
+        return [
+            {"span_id": r[0], "parent_id": r[1], "name": r[2], "kind": r[3], "start": r[4], "end": r[5],
+             "status": r[6], "attributes": json.loads(r[7]) if r[7] else {}}
+            for r in rows
+        ]
+
+
+class QueryTracer(BaseCallbackHandler):
+    """
+    Collects the spans of one query.
+
+    As a callback handler in the graph run's config it turns graph nodes, LLM requests
+    (with token counts) and tool calls into spans. Operations outside LangChain (HTTP
+    requests, DB writes) open spans with `span`, which finds the tracer of the running
+    query through a context variable.
+    """
+
+    # Keep callbacks in the caller's context and order, they are cheap
+    run_inline = True
+
+    def __init__(self, query_id: str, store: SpanStore):
+        self.query_id = query_id
+        self.store = store
+        self.root_id: Optional[str] = None
+        self._open: Dict[str, Span] = {}
+        # Parent of every LangChain run seen, to attach spans to their nearest traced ancestor
+        self._run_parents: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def resolve_parent(self, run_id: Optional[Any]) -> Optional[str]:
+        """Return the nearest traced ancestor of a run, including itself, or the root span"""
+        run = str(run_id) if run_id is not None else None
+        with self._lock:
+            while run is not None:
+                if run in self._open or run == self.root_id:
+                    return run
+                run = self._run_parents.get(run)
+        return self.root_id
+
+    def open(self, name: str, kind: str, parent_id: Optional[str] = None, span_id: Optional[str] = None,
+             **attributes: Any) -> Span:
+        span = Span(span_id=span_id or uuid.uuid4().hex, query_id=self.query_id, name=name, kind=kind,
+                    parent_id=parent_id, attributes=attributes)
+        with self._lock:
+            self._open[span.span_id] = span
+        return span
+
+    def close(self, span: Span, error: Optional[BaseException] = None) -> None:
+        span.finish(error)
+        with self._lock:
+            self._open.pop(span.span_id, None)
+        self.store.record(span)
+
+    def _seen(self, run_id: Any, parent_run_id: Any) -> None:
+        with self._lock:
+            self._run_parents[str(run_id)] = str(parent_run_id) if parent_run_id is not None else None
+
+    def _open_run(self, run_id: Any, parent_run_id: Any, name: str, kind: str, **attributes: Any) -> None:
+        self._seen(run_id, parent_run_id)
+        self.open(name, kind, parent_id=self.resolve_parent(parent_run_id), span_id=str(run_id), **attributes)
+
+    def _close_run(self, run_id: Any, error: Optional[BaseException] = None, **attributes: Any) -> None:
+        with self._lock:
+            span = self._open.get(str(run_id))
+        if span is not None:
+            span.attributes.update(attributes)
+            self.close(span, error)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # The node's own run is named after it, the rest are runnables nested in the node
+        if node is not None and kwargs.get("name") == node:
+            self._open_run(run_id, parent_run_id, node, "node", step=metadata.get("langgraph_step"))
+        else:
+            self._seen(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._close_run(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._close_run(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or "llm"
+        self._open_run(run_id, parent_run_id, model, "llm", model=model,
+                       messages=sum(len(batch) for batch in messages))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model_name") or params.get("model") or "llm"
+        self._open_run(run_id, parent_run_id, model, "llm", model=model)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        model, prompt, completion, cached = response_usage(response)
+        attributes = {"prompt_tokens": prompt, "completion_tokens": completion, "cached_tokens": cached}
+        if model:
+            attributes["model"] = model
+        self._close_run(run_id, **attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._close_run(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._open_run(run_id, parent_run_id, name, "tool", input_bytes=len(str(input_str)))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._close_run(run_id, output_bytes=len(str(getattr(output, "content", output))))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._close_run(run_id, error)
+
+
+_current_tracer: ContextVar[Optional[QueryTracer]] = ContextVar("query_tracer", default=None)
+_current_span: ContextVar[Optional[str]] = ContextVar("trace_span", default=None)
+
+_store: Optional[SpanStore] = None
+_store_lock = threading.Lock()
+
+
+def tracing_enabled() -> bool:
+    return os.getenv("PORTAL_TRACING", "1").lower() not in ("0", "false", "no")
+
+
+def get_span_store() -> SpanStore:
+    """Return the process-wide span store, at PORTAL_TRACE_DB (default traces.db)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SpanStore(os.getenv("PORTAL_TRACE_DB", "traces.db"))
+    return _store
+
+
+def current_tracer() -> Optional[QueryTracer]:
+    """Return the tracer of the query running in this context, if any"""
+    return _current_tracer.get()
+
+
+def trace_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the current query's tracer to a graph run config"""
+    tracer = current_tracer()
+    if tracer is None:
+        return config
+    return {**config, "callbacks": add_callback(config.get("callbacks"), tracer)}
+
+
+@contextmanager
+def trace_query(query_id: str, store: Optional[SpanStore] = None, **attributes: Any) -> Iterator[Optional[QueryTracer]]:
+    """
+    Trace the enclosed run of a query under a root "query" span.
+
+    The tracer travels in a context variable, like the query budget, so spans opened in
+    graph worker threads, async tasks and tools are tagged with the query id. Pass the
+    graph config through `trace_config` to also trace nodes, LLM calls and tools.
+
+    Yields:
+        QueryTracer | None: The tracer, None if tracing is disabled (PORTAL_TRACING=0).
+    """
+    if not tracing_enabled():
+        yield None
+        return
+    tracer = QueryTracer(query_id, store or get_span_store())
+    root = tracer.open("query", "query", **attributes)
+    tracer.root_id = root.span_id
+    tracer_token, span_token = _current_tracer.set(tracer), _current_span.set(root.span_id)
+    error = None
+    try:
+        yield tracer
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _current_tracer.reset(tracer_token)
+        tracer.close(root, error)
+
+
+def _langchain_parent(tracer: QueryTracer) -> Optional[str]:
+    """The traced span of the LangChain run (e.g. a tool call) executing this code, if any"""
+    callbacks = (var_child_runnable_config.get() or {}).get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager) and callbacks.parent_run_id is not None:
+        return tracer.resolve_parent(callbacks.parent_run_id)
+    return None
+
+
+@contextmanager
+def span(name: str, kind: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    Time the enclosed block as a span of the current query.
+
+    Does nothing outside a traced query. The span is attached to the enclosing `span`, else
+    to the LangChain run (node, tool) executing the code, else to the query's root span.
+
+    Yields:
+        Span | None: The open span, whose attributes may be updated, or None.
+    """
+    tracer = current_tracer()
+    if tracer is None:
+        yield None
+        return
+    parent = _current_span.get()
+    if parent == tracer.root_id:
+        parent = _langchain_parent(tracer) or parent
+    opened = tracer.open(name, kind, parent_id=parent, **attributes)
+    token = _current_span.set(opened.span_id)
+    error = None
+    try:
+        yield opened
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.close(opened, error)
+
+
+def waterfall(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Order spans depth first for a waterfall view.
+
+    Returns:
+        list: The spans, each with `depth` and `offset_ms`/`duration_ms` relative to the
+            first span's start.
+    """
+    if not spans:
+        return []
+    origin = min(s["start"] for s in spans)
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    ids = {s["span_id"] for s in spans}
+    for s in spans:
+        parent = s["parent_id"] if s["parent_id"] in ids else None
+        children.setdefault(parent, []).append(s)
+
+    ordered = []
+
+    def visit(parent: Optional[str], depth: int) -> None:
+        for s in sorted(children.get(parent, []), key=lambda item: item["start"]):
+            end = s["end"] if s["end"] is not None else s["start"]
+            ordered.append({**s, "depth": depth, "offset_ms": (s["start"] - origin) * 1e3,
+                            "duration_ms": (end - s["start"]) * 1e3})
+            visit(s["span_id"], depth + 1)
+
+    visit(None, 0)
+    return ordered
@@ -0,0 +1,204 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import lru_cache
+from langchain_core.callbacks import BaseCallbackHandler, BaseCallbackManager
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import var_child_runnable_config
+from core.budget import add_callback, response_usage
+from core.llm import model_cost
+from logger import setup_logger
+from typing import Any, Dict, Iterator, List, Optional
+import threading
+
+logger = setup_logger("logs/usage.log")
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken ships with langchain_openai
+    tiktoken = None
+
+
+def run_attribution(metadata: Optional[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """
+    Return the agent, model tier and graph node a run belongs to, from its metadata.
+
+    Agents built by `Workflow` carry their name and tier in their run config metadata, which
+    every nested run (LLM calls, tools) inherits. Agents without it are attributed to their
+    graph node.
+    """
+    metadata = metadata or {}
+    node = metadata.get("langgraph_node")
+    return {"agent": metadata.get("agent") or node, "tier": metadata.get("tier"), "node": node}
+
+
+class UsageLedger(BaseCallbackHandler):
+    """
+    Records the tokens and cost of every LLM and embedding call of one query.
+
+    As a callback handler in the graph run's config it sees every chat model call, including
+    those of tiered agents that escalated; embedding calls are added by `MeteredEmbeddings`.
+    Each call becomes one record attributed to an agent, model tier and graph node, which
+    `QueryDatabase.save_usage` stores next to the query.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+        self._runs: Dict[Any, Dict[str, Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, model: Optional[str], prompt_tokens: int, completion_tokens: int = 0,
+               cached_tokens: int = 0, agent: Optional[str] = None, tier: Optional[str] = None,
+               node: Optional[str] = None) -> None:
+        """Record one call"""
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "kind": kind,
+            "agent": agent,
+            "tier": tier,
+            "node": node,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "cost": model_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+        }
+        with self._lock:
+            self.records.append(entry)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._runs[run_id] = run_attribution(metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._runs[run_id] = run_attribution(metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            attribution = self._runs.pop(run_id, None) or run_attribution(None)
+        model, prompt, completion, cached = response_usage(response)
+        self.record("llm", model, prompt, completion, cached, **attribution)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def totals(self) -> Dict[str, Any]:
+        """Return the summed calls, tokens and cost of the query"""
+        with self._lock:
+            records = list(self.records)
+        return {
+            "calls": len(records),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+            "completion_tokens": sum(r["completion_tokens"] for r in records),
+            "cached_tokens": sum(r["cached_tokens"] for r in records),
+            "cost": round(sum(r["cost"] for r in records), 6),
+        }
+
+
+_current_ledger: ContextVar[Optional[UsageLedger]] = ContextVar("usage_ledger", default=None)
+
+
+def current_ledger() -> Optional[UsageLedger]:
+    """Return the usage ledger of the query running in this context, if any"""
+    return _current_ledger.get()
+
+
+@contextmanager
+def use_ledger(ledger: Optional[UsageLedger]) -> Iterator[Optional[UsageLedger]]:
+    """
+    Make `ledger` the current usage ledger for the enclosed graph run.
+
+    Like the query budget it travels in a context variable, so embedding calls made inside
+    tools are charged to the right query.
+    """
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+
+
+def usage_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the current query's usage ledger to a graph run config"""
+    ledger = current_ledger()
+    if ledger is None:
+        return config
+    return {**config, "callbacks": add_callback(config.get("callbacks"), ledger)}
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """The tokenizer of `model`, None if tiktoken or its encoding files are unavailable"""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding files are downloaded on first use
+        logger.warning(f"No tokenizer for {model}, estimating tokens: {e}")
+        return None
+
+
+def count_tokens(texts: List[str], model: str) -> int:
+    """Count the tokens of `texts` as the embedding model does, ~4 characters each without a tokenizer"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return sum(max(len(text) // 4, 1) for text in texts)
+    return sum(len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=()))
+
+
+def _run_metadata() -> Dict[str, Any]:
+    """Metadata of the LangChain run executing this code, e.g. the tool calling the embeddings"""
+    config = var_child_runnable_config.get() or {}
+    metadata = dict(config.get("metadata") or {})
+    # Agent executors hand tools their metadata through the callback manager only
+    callbacks = config.get("callbacks")
+    if isinstance(callbacks, BaseCallbackManager):
+        metadata.update(callbacks.inheritable_metadata)
+    return metadata
+
+
+class MeteredEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that charges every call to the current query's usage ledger.
+
+    The embeddings API reports no usage, so tokens are counted locally with the model's
+    tokenizer. Calls outside a query (building the index at startup) are only logged.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str):
+        self.embeddings = embeddings
+        self.model = model
+
+    def _charge(self, texts: List[str]) -> None:
+        tokens = count_tokens(texts, self.model)
+        ledger = current_ledger()
+        if ledger is None:
+            logger.info(f"{self.model}: embedded {len(texts)} texts, {tokens} tokens outside a query")
+            return
+        # Embedding models have no tier, the calling agent's tier would be misleading
+        attribution = {**run_attribution(_run_metadata()), "tier": None}
+        ledger.record("embedding", self.model, tokens, **attribution)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._charge(texts)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        self._charge([text])
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._charge(texts)
+        return await self.embeddings.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self._charge([text])
+        return await self.embeddings.aembed_query(text)
@@ -1,8 +1,16 @@
+import sys
 from langgraph.graph import StateGraph, END, START
-from langgraph.checkpoint.memory import MemorySaver
 from core.state import State
-from core.node import agent_node
-from core.router import process_router
+from core.node import (
+    agent_node, agent_node_async, api_node, api_node_async, profile_node, profile_node_async,
+    query_node, query_node_async,
+    retrieval_node, retrieval_node_async, visualize_insight_node, visualize_insight_node_async,
+    visualization_join_node, visualization_join_node_async, graph_node
+)
+from core.plan_cache import PlanCache
+from core.llm import TieredAgent
+from core.query_parser import QueryParser
+from core.router import process_router, process_fanout_router
 from agent.query_agent import create_query_agent
 from agent.retrieval_agent import create_retrieval_agent
 from agent.api_agent import create_api_agent
@@ -10,55 +18,100 @@ from agent.process_agent import create_process_agent
 from agent.analysis_agent import create_analysis_agent
 from agent.visualization_agent import create_visualization_agent
 from agent.report_agent import create_report_agent
-from IPython.display import Image, display
 from logger import log_performance
 
+
+def _in_ipython():
+    """True inside an IPython shell or notebook, checked without importing IPython"""
+    shell = sys.modules.get("IPython")
+    return shell is not None and shell.get_ipython() is not None
+
+
 class Workflow:
-    def __init__(self, llms):
+    def __init__(self, llms, agents=None, parallel_visualization=True,
+                 parallel_tool_agents=("retrieval_agent", "api_agent"), model_router=None, checkpointer=None,
+                 display_graph=None):
         """
         Initialize the workflow class with language models and working directory.
 
         Args:
             llms (dict): Dictionary containing language model instances
+            agents (dict, optional): Prebuilt agents by name, created from `llms` if omitted
+            parallel_visualization (bool): Fan out one visualization branch per insight
+            parallel_tool_agents (tuple): Agents allowed to issue several tool calls per model turn
+            model_router (ModelRouter, optional): Route agents across model tiers instead of
+                binding each to a fixed tier
+            checkpointer (BaseCheckpointSaver, optional): Persist the state after every node,
+                keyed by the run's thread_id, so failed runs can be resumed
+            display_graph (bool, optional): Render the compiled graph as a mermaid diagram, which
+                needs the mermaid.ink web service. By default only inside an IPython session,
+                where it can be shown; servers, scripts and benchmarks skip it
         """
         self.llms = llms
         self.workflow = None
-        self.memory = None
+        self.memory = checkpointer
         self.graph = None
+        self.plan_cache = PlanCache()
+        self.query_parser = QueryParser()
         self.members = ["Query", "Retrieval", "API", "Process", "Analysis", "Visualization", "Report"]
-        self.agents = self.create_agents()
+        self.parallel_visualization = parallel_visualization
+        self.parallel_tool_agents = set(parallel_tool_agents)
+        self.model_router = model_router
+        self.display_graph = display_graph
+        self.agents = agents or self.create_agents()
         self.setup_workflow()
 
-    def create_agents(self):
-        """Create all system agents"""
-        # Get language models
-        llm_low = self.llms["llm_low"]
-        llm_mid = self.llms["llm_mid"]
-        llm_high = self.llms["llm_high"]
-
-        # Create agent dictionary
-        agents = {
-            "query_agent": create_query_agent(
-                llm_mid,
+    def agent_factories(self):
+        """Return each agent's factory and the model tier it is statically bound to"""
+        def parallel(name):
+            return name in self.parallel_tool_agents
+
+        return {
+            "query_agent": (lambda llm: create_query_agent(
+                llm,
                 self.members,
-        ),  "retrieval_agent": create_retrieval_agent(
-                llm_mid,
+                parallel_tools=parallel("query_agent"),
+            ), "llm_mid"),
+            "retrieval_agent": (lambda llm: create_retrieval_agent(
+                llm,
                 self.members,
-        ),  "api_agent": create_api_agent(
-                llm_high,
+                parallel_tools=parallel("retrieval_agent"),
+            ), "llm_mid"),
+            "api_agent": (lambda llm: create_api_agent(
+                llm,
                 self.members,
-        ),  "process_agent": create_process_agent(
-                llm_high
-        ),  "analysis_agent": create_analysis_agent(
-                llm_high,
+                parallel_tools=parallel("api_agent"),
+            ), "llm_high"),
+            "process_agent": (lambda llm: create_process_agent(
+                llm
+            ), "llm_high"),
+            "analysis_agent": (lambda llm: create_analysis_agent(
+                llm,
                 self.members,
-        ),  "visualization_agent": create_visualization_agent(
-                llm_high,
+                parallel_tools=parallel("analysis_agent"),
+            ), "llm_high"),
+            "visualization_agent": (lambda llm: create_visualization_agent(
+                llm,
                 self.members,
-        ),  "report_agent": create_report_agent(
-                llm_high,
+                parallel_tools=parallel("visualization_agent"),
+            ), "llm_high"),
+            "report_agent": (lambda llm: create_report_agent(
+                llm,
                 self.members,
-        )}
+                parallel_tools=parallel("report_agent"),
+            ), "llm_high"),
+        }
+
+    def create_agents(self):
+        """Create all system agents"""
+        agents = {}
+        for name, (factory, tier) in self.agent_factories().items():
+            if self.model_router is not None:
+                # Start on the cheapest adequate tier and escalate on invalid output
+                agents[name] = TieredAgent(name, factory, self.llms, self.model_router)
+            else:
+                # Name and tier reach every LLM and tool run of the agent for usage accounting
+                agents[name] = factory(self.llms[tier]).with_config(metadata={"agent": name, "tier": tier})
 
         return agents
 
@@ -67,47 +120,67 @@ class Workflow:
         """Set up the workflow graph"""
         self.workflow = StateGraph(State)
 
-        # Add nodes
+        # Add nodes, each usable from both graph.stream and graph.astream
         self.workflow.add_node("Query",
-                               lambda state: agent_node(state, self.agents["query_agent"], "query_agent"))
+                               graph_node(query_node, query_node_async,
+                                          self.agents["query_agent"], "query_agent", self.query_parser))
         self.workflow.add_node("Retrieval",
-                               lambda state: agent_node(state, self.agents["retrieval_agent"], "retrieval_agent"))
+                               graph_node(retrieval_node, retrieval_node_async,
+                                          self.agents["retrieval_agent"], "retrieval_agent", self.plan_cache))
         self.workflow.add_node("API",
-                               lambda state: agent_node(state, self.agents["api_agent"], "api_agent"))
+                               graph_node(api_node, api_node_async, self.agents["api_agent"], "api_agent"))
+        self.workflow.add_node("Profile", graph_node(profile_node, profile_node_async, "api_agent"))
         self.workflow.add_node("Process",
-                               lambda state: agent_node(state, self.agents["process_agent"], "process_agent"))
+                               graph_node(agent_node, agent_node_async, self.agents["process_agent"], "process_agent"))
         self.workflow.add_node("Analysis",
-                               lambda state: agent_node(state, self.agents["analysis_agent"], "analysis_agent"))
+                               graph_node(agent_node, agent_node_async, self.agents["analysis_agent"], "analysis_agent"))
         self.workflow.add_node("Visualization",
-                               lambda state: agent_node(state, self.agents["visualization_agent"], "visualization_agent"))
+                               graph_node(agent_node, agent_node_async,
+                                          self.agents["visualization_agent"], "visualization_agent"))
+        self.workflow.add_node("VisualizeInsight",
+                               graph_node(visualize_insight_node, visualize_insight_node_async,
+                                          self.agents["visualization_agent"], "visualization_agent"))
+        self.workflow.add_node("VisualizationJoin",
+                               graph_node(visualization_join_node, visualization_join_node_async,
+                                          "visualization_agent"))
         self.workflow.add_node("Report",
-                               lambda state: agent_node(state, self.agents["report_agent"], "report_agent"))
+                               graph_node(agent_node, agent_node_async, self.agents["report_agent"], "report_agent"))
 
         # Add edges
         self.workflow.add_edge(START, "Query")
         self.workflow.add_edge("Query", "Retrieval")
         self.workflow.add_edge("Retrieval", "API")
-        self.workflow.add_edge("API", "Process")
+        self.workflow.add_edge("API", "Profile")
+        self.workflow.add_edge("Profile", "Process")
 
         self.workflow.add_conditional_edges(
             "Process",
-            process_router,
+            process_fanout_router if self.parallel_visualization else process_router,
             {
                 "Analysis": "Analysis",
                 "Visualization": "Visualization",
                 "Report": "Report",
                 "Process": "Process",
+                "VisualizeInsight": "VisualizeInsight",
                 END: END
             }
         )
 
-        for member in ["Analysis", "Visualization", 'Report']:
+        # Parallel insight branches join before control returns to Process
+        self.workflow.add_edge("VisualizeInsight", "VisualizationJoin")
+
+        for member in ["Analysis", "Visualization", "VisualizationJoin", 'Report']:
             self.workflow.add_edge(member, "Process")
 
         # Compile workflow
-        self.memory = MemorySaver()
-        self.graph = self.workflow.compile()
+        self.graph = self.workflow.compile(checkpointer=self.memory)
+
+        if self.display_graph or (self.display_graph is None and _in_ipython()):
+            self.show_graph()
 
+    def show_graph(self):
+        """Display the compiled graph as a mermaid diagram in an IPython session"""
+        from IPython.display import Image, display
         display(Image(self.graph.get_graph().draw_mermaid_png()))
 
     def get_graph(self):
@@ -142,8 +142,31 @@ class LogLevelContext:
 def log_performance(func):
     """Decorator to log function execution time"""
     import functools
+    import inspect
     import time
     
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            logger = OptimizedLogger.get_logger(func.__module__)
+            start_time = time.time()
+            
+            try:
+                result = await func(*args, **kwargs)
+                execution_time = time.time() - start_time
+                
+                if execution_time > 1.0:  # Only log slow operations
+                    logger.info(f"{func.__name__} completed in {execution_time:.2f}s")
+                    
+                return result
+                
+            except Exception as e:
+                execution_time = time.time() - start_time
+                logger.error(f"{func.__name__} failed after {execution_time:.2f}s: {e}")
+                raise
+                
+        return async_wrapper
+    
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         logger = OptimizedLogger.get_logger(func.__module__)
@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from core.artifacts import URL_PREFIX, ArtifactStore, set_artifact_store
+
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "artifacts"))
+
+
+def test_collect_stores_files_by_content(store):
+    directory = store.session_dir("query-1")
+    for name in ("chart.png", "copy.png"):
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(PNG)
+    data = {"visualizations": [{"file": "chart.png"}, {"file": os.path.join(directory, "copy.png")},
+                               {"file": "missing.png"}, {"description": "No file"}]}
+    entries = store.collect(data, directory)["visualizations"]
+    name = os.path.basename(entries[0]["file"])
+    assert entries[0]["file"] == entries[1]["file"] == store.path(name)
+    assert entries[0]["url"] == URL_PREFIX + name
+    assert os.listdir(store.objects)[0].endswith(".png")
+    assert entries[2] == {"file": "missing.png"}
+    assert entries[3] == {"description": "No file"}
+    # Collecting again leaves stored paths alone
+    assert store.collect(data, directory)["visualizations"][0]["file"] == store.path(name)
+
+
+def test_collect_skips_files_it_cannot_serve(store):
+    directory = store.session_dir("query-1")
+    for name in ("data.csv", "chart.svg"):
+        with open(os.path.join(directory, name), "w") as f:
+            f.write("<svg onload='alert(1)'/>")
+    data = {"visualizations": [{"file": "data.csv"}, {"file": "chart.svg"}]}
+    assert store.collect(data, directory) == {"visualizations": [{"file": "data.csv"}, {"file": "chart.svg"}]}
+    assert not os.path.exists(store.objects)
+
+
+def test_collect_rejects_paths_outside_the_session(store, tmp_path):
+    secret = tmp_path / "secret.json"
+    secret.write_text('{"token": "x"}')
+    directory = store.session_dir("query-1")
+    os.symlink(secret, os.path.join(directory, "link.json"))
+    entries = [{"figure": str(secret)}, {"figure": "../../../secret.json"}, {"figure": "link.json"}]
+    assert store.collect({"visualizations": [dict(entry) for entry in entries]}, directory) == {
+        "visualizations": entries
+    }
+    assert not os.path.exists(store.objects)
+
+
+def test_remove_session(store):
+    directory = store.session_dir("query/1")
+    open(os.path.join(directory, "chart.png"), "wb").close()
+    store.remove_session("query/1")
+    assert not os.path.exists(directory)
+    store.remove_session("never-started")
+
+
+def test_serve_artifacts(store, tmp_path):
+    web_app = pytest.importorskip("web_app")
+    chart = tmp_path / "chart.png"
+    chart.write_bytes(PNG)
+    name = store.put(str(chart))
+    unknown = "0" * 64 + ".gif"
+    open(os.path.join(store.objects, unknown), "wb").close()
+    previous = set_artifact_store(store)
+    try:
+        client = web_app.app.server.test_client()
+        response = client.get(URL_PREFIX + name)
+        assert response.status_code == 200 and response.mimetype == "image/png"
+        # The digest is the ETag, and the name never changes meaning
+        digest = name.split(".", 1)[0]
+        assert response.get_etag() == (digest, False)
+        assert response.cache_control.public and response.cache_control.immutable
+        assert response.cache_control.max_age == web_app.ARTIFACT_MAX_AGE
+        revalidated = client.get(URL_PREFIX + name, headers={"If-None-Match": f'"{digest}"'})
+        assert revalidated.status_code == 304 and not revalidated.data
+        assert client.get(URL_PREFIX + unknown).status_code == 404
+    finally:
+        set_artifact_store(previous)
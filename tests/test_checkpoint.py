@@ -0,0 +1,116 @@
+import operator
+from typing import Annotated, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.graph import END, START, StateGraph
+
+from core.checkpoint import COMPRESSED_SUFFIX, CompressedSerializer, last_good_checkpoint, sqlite_checkpointer
+from core.schemas import ApiResult, QueryParameters, QueryResult
+
+
+def test_large_state_round_trips_compressed():
+    serializer = CompressedSerializer()
+    state = {
+        "messages": [HumanMessage(content="Ocak 2024 PTF"), AIMessage(content="{}", name="api_agent")],
+        "query": QueryResult(parameters=QueryParameters(dataTypes=["ptf"], province_id=42)),
+        "api_data": ApiResult(items=[{"date": f"2024-01-01T{h:02d}:00:00+03:00", "price": 2000 + h}
+                                     for h in range(24)] * 10),
+    }
+    type_, blob = serializer.dumps_typed(state)
+    assert type_.endswith(COMPRESSED_SUFFIX)
+    assert len(blob) < len(JsonPlusSerializer().dumps_typed(state)[1])
+    loaded = serializer.loads_typed((type_, blob))
+    assert loaded["query"] == state["query"] and loaded["api_data"] == state["api_data"]
+    assert [message.content for message in loaded["messages"]] == ["Ocak 2024 PTF", "{}"]
+
+
+def test_small_and_uncompressed_blobs():
+    serializer = CompressedSerializer()
+    type_, blob = serializer.dumps_typed({"sender": "query_agent"})
+    assert not type_.endswith(COMPRESSED_SUFFIX)
+    assert serializer.loads_typed((type_, blob)) == {"sender": "query_agent"}
+    # Checkpoints written without compression still load
+    assert serializer.loads_typed(JsonPlusSerializer().dumps_typed([1, 2])) == [1, 2]
+
+
+FAILURES = {}
+
+
+class PipelineState(TypedDict):
+    messages: Annotated[list, operator.add]
+
+
+def stage(name):
+    def run(state):
+        failure = FAILURES.get(name)
+        if failure == "raise":
+            raise RuntimeError(f"{name} crashed")
+        return {"messages": [AIMessage(content=failure or f"{name} done", name=name)]}
+    return run
+
+
+@pytest.fixture
+def graph():
+    FAILURES.clear()
+    builder = StateGraph(PipelineState)
+    for name in ("Query", "API", "Report"):
+        builder.add_node(name, stage(name))
+    builder.add_edge(START, "Query")
+    builder.add_edge("Query", "API")
+    builder.add_edge("API", "Report")
+    builder.add_edge("Report", END)
+    return builder.compile(checkpointer=sqlite_checkpointer(":memory:"))
+
+
+CONFIG = {"configurable": {"thread_id": "query-1"}}
+
+
+def resume(graph):
+    """Resume like the portal's `retry_query`: from the last good checkpoint, forking the thread there"""
+    web_app = pytest.importorskip("web_app")
+    portal = object.__new__(web_app.DataAnalyticsPortalWeb)
+    checkpoint = last_good_checkpoint(graph.get_state_history(CONFIG))
+    graph_input, config = portal.resume_input("query-1", "Ocak 2024 PTF", checkpoint)
+    assert graph_input is None
+    graph.invoke(graph_input, config)
+    return checkpoint
+
+
+def test_resumes_before_the_node_that_recorded_an_error(graph):
+    FAILURES["API"] = "Error: the API timed out"
+    graph.invoke({"messages": [HumanMessage(content="Ocak 2024 PTF")]}, CONFIG)
+    checkpoint = last_good_checkpoint(graph.get_state_history(CONFIG))
+    assert checkpoint.next == ("API",)
+    assert [message.content for message in checkpoint.values["messages"]] == ["Ocak 2024 PTF", "Query done"]
+
+
+def test_resumes_at_the_node_that_raised(graph):
+    FAILURES["Report"] = "raise"
+    with pytest.raises(RuntimeError):
+        graph.invoke({"messages": [HumanMessage(content="Ocak 2024 PTF")]}, CONFIG)
+    assert last_good_checkpoint(graph.get_state_history(CONFIG)).next == ("Report",)
+
+
+def test_follows_the_latest_retry(graph):
+    FAILURES["API"] = "Error: the API timed out"
+    graph.invoke({"messages": [HumanMessage(content="Ocak 2024 PTF")]}, CONFIG)
+    # The retry gets past the API and fails later, on its own branch of the thread
+    FAILURES["API"], FAILURES["Report"] = None, "Error: no report"
+    first = resume(graph)
+    checkpoint = last_good_checkpoint(graph.get_state_history(CONFIG))
+    assert checkpoint.next == ("Report",)
+    assert checkpoint.config["configurable"]["checkpoint_id"] != first.config["configurable"]["checkpoint_id"]
+    assert [message.content for message in checkpoint.values["messages"]][-1] == "API done"
+
+    # A retry that completes leaves nothing to resume
+    FAILURES.clear()
+    resume(graph)
+    assert last_good_checkpoint(graph.get_state_history(CONFIG)) is None
+
+
+def test_nothing_to_resume(graph):
+    assert last_good_checkpoint([]) is None
+    graph.invoke({"messages": [HumanMessage(content="Ocak 2024 PTF")]}, CONFIG)
+    assert last_good_checkpoint(graph.get_state_history(CONFIG)) is None
@@ -0,0 +1,61 @@
+from core.followup import parameter_delta, plan_followup
+from core.schemas import ApiResult, QueryResult
+
+
+def day(value):
+    return f"{value}T00:00:00+03:00"
+
+
+def january(**params):
+    return {"dataTypes": ["ptf"], "startDate": day("2024-01-01"), "endDate": day("2024-01-31"), **params}
+
+
+def query(**params):
+    return QueryResult.model_validate({"parameters": params})
+
+
+def test_extended_range_fetches_only_the_new_days():
+    current = january(endDate=day("2024-02-15"))
+    assert parameter_delta(january(), current) == [
+        {"startDate": day("2024-02-01"), "endDate": day("2024-02-15"), "dataTypes": ["ptf"]}
+    ]
+
+
+def test_added_data_type_fetches_it_for_all_dates():
+    assert parameter_delta(january(), january(dataTypes=["ptf", "smf"])) == [
+        {"startDate": day("2024-01-01"), "endDate": day("2024-01-31"), "dataTypes": ["smf"]}
+    ]
+
+
+def test_new_periods_are_fetched():
+    previous = {"dataTypes": ["ptf"], "datePeriod": [day("2024-01-01")]}
+    current = {"dataTypes": ["ptf"], "datePeriod": [day("2024-01-01"), day("2024-03-01")]}
+    assert parameter_delta(previous, current) == [{"datePeriod": [day("2024-03-01")], "dataTypes": ["ptf"]}]
+
+
+def test_incompatible_changes_refetch_everything():
+    assert parameter_delta(january(province_id=6), january(province_id=34)) is None
+    assert parameter_delta(january(dataTypes=["ptf", "smf"]), january()) is None
+    assert parameter_delta(january(), january(startDate=day("2024-03-01"), endDate=day("2024-03-31"))) is None
+    assert parameter_delta(january(), {"dataTypes": ["ptf"], "datePeriod": [day("2024-01-01")]}) is None
+
+
+def test_narrower_range_reuses_the_data_locally():
+    items = [{"date": day(f"2024-01-{d:02d}"), "price": d} for d in range(1, 32)]
+    plan = plan_followup(query(**january()), query(**january(endDate=day("2024-01-10"))), ApiResult(items=items))
+    assert plan.delta == []
+    assert [item["price"] for item in plan.items] == list(range(1, 11))
+    assert plan.rerun == {"analysis", "visualization", "report"}
+
+
+def test_chart_change_only_redraws():
+    items = [{"date": day("2024-01-01"), "price": 1}]
+    plan = plan_followup(query(**january()), query(**january(chartType="bar")), ApiResult(items=items))
+    assert plan.delta == [] and plan.items == items
+    assert plan.rerun == {"visualization", "report"}
+
+
+def test_without_previous_data_everything_runs():
+    plan = plan_followup(query(**january()), query(**january()), None)
+    assert plan.delta is None and plan.items is None
+    assert plan.rerun == {"analysis", "visualization", "report"}
@@ -0,0 +1,70 @@
+import json
+import os
+
+from core.llm import ModelRouter, TieredAgent
+
+
+def test_saves_every_n_attempts(tmp_path):
+    path = tmp_path / "stats.json"
+    router = ModelRouter(str(path), save_every=3)
+    for _ in range(2):
+        router.record("query_agent", "llm_low", True, 0.1, 0.0)
+        assert not router.save_due
+    router.record("query_agent", "llm_low", False, 0.1, 0.0)
+    assert router.save_due
+    router.save()
+    assert not router.save_due
+    assert json.loads(path.read_text())["query_agent"]["llm_low"]["attempts"] == 3
+    # Only the stats file is left, the temporary file was renamed over it
+    assert os.listdir(tmp_path) == ["stats.json"]
+
+
+def test_flush_saves_only_unsaved_attempts(tmp_path):
+    path = tmp_path / "stats.json"
+    router = ModelRouter(str(path))
+    router.flush()
+    assert not path.exists()
+    router.record("process_agent", "llm_mid", True, 0.2, 0.01)
+    router.flush()
+    assert ModelRouter(str(path)).report()["process_agent"]["llm_mid"]["success_rate"] == 1.0
+
+
+def failing_router(explore):
+    router = ModelRouter(None, min_samples=2, explore=explore)
+    for _ in range(2):
+        router.record("query_agent", "llm_low", False, 0.1, 0.0)
+    return router
+
+
+def test_failing_tier_is_skipped_but_explored():
+    assert failing_router(0.0).start_tier("query_agent") == "llm_mid"
+    assert failing_router(1.0).start_tier("query_agent") == "llm_low"
+
+
+class ScriptedAgent:
+    def __init__(self, tier, calls):
+        self.tier, self.calls = tier, calls
+
+    def invoke(self, state, config=None, **kwargs):
+        self.calls.append(self.tier)
+        return {"output": '{"api_calls": [], "items": []}' if self.tier == "llm_high" else "not json"}
+
+
+def tiered(name, calls):
+    llms = {tier: tier for tier in ("llm_low", "llm_mid", "llm_high")}
+    return TieredAgent(name, lambda tier: ScriptedAgent(tier, calls), llms, ModelRouter(None, explore=0.0))
+
+
+def test_invalid_output_escalates():
+    calls = []
+    result = tiered("retrieval_agent", calls).invoke({})
+    assert calls == ["llm_low", "llm_mid", "llm_high"]
+    assert result == {"output": '{"api_calls": [], "items": []}'}
+
+
+def test_agents_with_side_effects_are_not_rerun():
+    calls = []
+    agent = tiered("api_agent", calls)
+    assert agent.invoke({}) == {"output": "not json"}
+    assert calls == ["llm_low"]
+    assert agent.router.report()["api_agent"]["llm_low"]["success_rate"] == 0.0
@@ -0,0 +1,78 @@
+import os
+
+from core.plan_cache import PlanCache, plan_shape
+
+PTF = "/v1/markets/dam/data/mcp"
+CONSUMPTION = "/v1/consumption/data/realtime-consumption"
+
+
+def cache(tmp_path, metadata="[]"):
+    path = tmp_path / "api_metadata.json"
+    path.write_text(metadata)
+    return PlanCache(str(path))
+
+
+def test_shape_ignores_values():
+    first = {"dataTypes": ["PTF"], "datePeriod": ["2024-01-01T00:00:00+03:00"], "province_id": 42}
+    second = {"dataTypes": "ptf", "datePeriod": ["2023-05-01T00:00:00+03:00"], "province_id": 6}
+    assert plan_shape(first) == plan_shape(second) == (("ptf",), "period", True)
+    assert plan_shape({"dataTypes": ["ptf"], "province_id": [6, 34]}) is None
+    assert plan_shape({"datePeriod": ["2024-01-01T00:00:00+03:00"]}) is None
+
+
+def test_per_period_calls_collapse_and_expand(tmp_path):
+    plans = cache(tmp_path)
+    january, february = "2024-01-01T00:00:00+03:00", "2024-02-01T00:00:00+03:00"
+    plan = {"api_calls": [{"endpoint": PTF, "params": {"startDate": period, "endDate": period}}
+                          for period in (january, february)]}
+    assert plans.store({"dataTypes": ["ptf"], "datePeriod": [january, february]}, plan)
+
+    march = "2023-03-01T00:00:00+03:00"
+    assert plans.lookup({"dataTypes": ["ptf"], "datePeriod": [march]}) == {
+        "api_calls": [{"endpoint": PTF, "params": {"startDate": march, "endDate": march}}]
+    }
+
+
+def test_range_and_province_slots(tmp_path):
+    plans = cache(tmp_path)
+    params = {"dataTypes": ["consumption"], "startDate": "2024-01-01T00:00:00+03:00",
+              "endDate": "2024-01-31T00:00:00+03:00", "province_id": 42}
+    plan = {"api_calls": [{"endpoint": CONSUMPTION, "params": {
+        "startDate": params["startDate"], "endDate": params["endDate"], "provinceId": 42, "region": 42}}]}
+    assert plans.store(params, plan)
+
+    other = dict(params, startDate="2023-06-01T00:00:00+03:00", endDate="2023-06-30T00:00:00+03:00",
+                 province_id=6)
+    call = plans.lookup(other)["api_calls"][0]
+    # Only keys naming a province are slotted
+    assert call["params"] == {"startDate": other["startDate"], "endDate": other["endDate"],
+                              "provinceId": 6, "region": 42}
+
+
+def test_plans_with_unslotted_dates_are_not_cached(tmp_path):
+    plans = cache(tmp_path)
+    params = {"dataTypes": ["ptf"], "datePeriod": ["2024-01-01T00:00:00+03:00"]}
+    plan = {"api_calls": [{"endpoint": PTF, "params": {"startDate": "2023-12-31T00:00:00+03:00"}}]}
+    assert not plans.store(params, plan)
+    assert plans.lookup(params) is None
+    assert plans.stats()["misses"] == 1
+
+
+def test_metadata_change_invalidates(tmp_path):
+    plans = cache(tmp_path)
+    params = {"dataTypes": ["ptf"], "datePeriod": ["2024-01-01T00:00:00+03:00"]}
+    plans.store(params, {"api_calls": [{"endpoint": PTF, "params": {"startDate": params["datePeriod"][0]}}]})
+    metadata = tmp_path / "api_metadata.json"
+
+    # Touched but unchanged metadata keeps the templates
+    os.utime(metadata, (1, 1))
+    assert plans.lookup(params) is not None
+
+    metadata.write_text('[{"endpoint": "/v2"}]')
+    os.utime(metadata, (2, 2))
+    assert plans.lookup(params) is None
+    assert plans.stats()["invalidations"] == 1
+
+    plans.store(params, {"api_calls": [{"endpoint": PTF}]})
+    plans.invalidate()
+    assert plans.stats()["entries"] == 0
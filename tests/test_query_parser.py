@@ -0,0 +1,68 @@
+from core.query_parser import WORKFLOW_ANALYSIS, WORKFLOW_DATA, WORKFLOW_VISUALIZATION, QueryParser
+
+parser = QueryParser()
+
+
+def test_parse_province():
+    result = parser.parse("Konya 2024 ocak PTF")
+    parameters = result.parsed["parameters"]
+    assert result.confidence == 1.0
+    assert parameters["province_id"] is not None
+    assert parameters["startDate"] == "2024-01-01T00:00:00+03:00"
+    assert parameters["endDate"] == "2024-01-31T00:00:00+03:00"
+    assert parameters["dataTypes"] == ["MCP"]
+    assert parameters["workflow"] == WORKFLOW_DATA
+
+
+def test_followup_keeps_unchanged_province():
+    previous = parser.parse("Konya 2024 ocak PTF").parsed["parameters"]
+    result = parser.parse_followup("Konya için mart da ekle", previous)
+    assert "province" not in result.reasons[-1]
+    assert result.parsed["parameters"]["province_id"] == previous["province_id"]
+    assert result.parsed["parameters"]["endDate"] == "2024-03-31T00:00:00+03:00"
+
+
+def test_followup_changes_province():
+    previous = parser.parse("Konya 2024 ocak PTF").parsed["parameters"]
+    result = parser.parse_followup("Peki Adana'da?", previous)
+    assert "province" in result.reasons[-1]
+    assert result.parsed["parameters"]["province_id"] != previous["province_id"]
+
+
+def test_inflected_chart_word_asks_for_a_visualization():
+    for query in ("2024 ocak-mart PTF grafiği", "Ocak 2024 SMF grafiğini çiz", "2023 aralık tüketim grafikleri"):
+        assert parser.parse(query).parsed["intent"] == WORKFLOW_VISUALIZATION, query
+
+
+def test_month_range():
+    parameters = parser.parse("2024 ocak-mart PTF grafiği").parsed["parameters"]
+    assert parameters["startDate"] == "2024-01-01T00:00:00+03:00"
+    assert parameters["endDate"] == "2024-03-31T00:00:00+03:00"
+
+
+def test_english_may_is_a_month_only_in_a_date():
+    parameters = parser.parse("May I see the PTF for June 2024?").parsed["parameters"]
+    assert parameters["startDate"] == "2024-06-01T00:00:00+03:00"
+    assert parameters["endDate"] == "2024-06-30T00:00:00+03:00"
+    for query in ("PTF for May 2024", "Show the market clearing price in May 2024", "SMP 2024 may"):
+        parameters = parser.parse(query).parsed["parameters"]
+        assert parameters["startDate"] == "2024-05-01T00:00:00+03:00", query
+        assert parameters["endDate"] == "2024-05-31T00:00:00+03:00", query
+
+
+def test_turkish_may():
+    parameters = parser.parse("Mayıs 2024 İzmir'in tüketimi").parsed["parameters"]
+    assert parameters["datePeriod"] == "2024-05-01T00:00:00+03:00"
+    assert parameters["dataTypes"] == ["consumption"]
+
+
+def test_analysis_and_relative_months():
+    result = parser.parse("Bugünün tarihi: 15.06.2024. Son 3 ay tüketimi analiz et")
+    assert result.parsed["intent"] == WORKFLOW_ANALYSIS
+    assert result.parsed["parameters"]["datePeriod"] == [
+        "2024-03-01T00:00:00+03:00", "2024-04-01T00:00:00+03:00", "2024-05-01T00:00:00+03:00"]
+
+
+def test_unparseable_queries_fall_back():
+    assert parser.parse("Elektrik piyasası hakkında bilgi ver").parsed is None
+    assert parser.try_parse("What was the PTF?") is None
@@ -0,0 +1,72 @@
+from tools.repl_cache import ReplExecutionCache, SessionLineage, analyze_code
+
+
+def test_formatting_and_comments_do_not_change_the_key():
+    lineage = SessionLineage("dataset-1")
+    first = analyze_code("summary = dataframe['price'].describe()  # stats\nprint(summary)")
+    second = analyze_code("# Summary\nsummary = dataframe[ 'price' ].describe()\n\nprint( summary )\n")
+    assert first.normalized == second.normalized
+    assert lineage.key(first) == lineage.key(second) is not None
+
+
+def test_loads_and_defines():
+    analysis = analyze_code(
+        "import math\n"
+        "scaled = [math.sqrt(v) for v in dataframe['price']]\n"
+        "dataframe['scaled'] = scaled\n"
+        "def top(frame, n=3):\n    return frame.nlargest(n, 'price')\n"
+        "plt.savefig('chart.png')\n"
+    )
+    assert analysis.loads == {"dataframe", "scaled", "plt"}
+    assert analysis.defines >= {"scaled", "dataframe", "top", "math", "plt"}
+    assert analysis.artifacts == ["chart.png"]
+    assert analysis.cacheable
+
+
+def test_uncacheable_code():
+    for code in ("import random\nprint(random.random())", "print(pd.Timestamp.now())",
+                 "dataframe.to_csv(name)", "open('x.txt', 'w').write('x')"):
+        assert SessionLineage().key(analyze_code(code)) is None, code
+    assert analyze_code("print(") is None
+
+
+def test_key_follows_the_inputs_lineage():
+    mean = analyze_code("print(dataframe['price'].mean())")
+    assert SessionLineage("dataset-1").key(mean) != SessionLineage("dataset-2").key(mean)
+
+    lineage = SessionLineage("dataset-1")
+    before = lineage.key(mean)
+    # Changed by code the cache can't reproduce, later reads have no key
+    change = analyze_code("dataframe['price'] = dataframe['price'] * 2")
+    lineage.record(change, lineage.key(change))
+    changed = lineage.key(mean)
+    assert changed is not None and changed != before
+    lineage.record(analyze_code("dataframe = dataframe.sample(5)"), None)
+    assert lineage.key(mean) is None
+    # Names no snippet of the session set
+    assert SessionLineage("dataset-1").key(analyze_code("print(result)")) is None
+
+
+def test_replayed_snippets_run_before_their_variables_are_read():
+    lineage = SessionLineage("dataset-1")
+    define = analyze_code("daily = dataframe.resample('D').mean()")
+    lineage.record(define, lineage.key(define), replayed=True)
+    assert lineage.take_pending(analyze_code("print(np.pi)")) == []
+    assert lineage.take_pending(analyze_code("print(daily.max())")) == [define.normalized]
+    assert lineage.pending == []
+
+
+def test_cache_replays_artifacts_and_skips_errors(tmp_path):
+    cache = ReplExecutionCache()
+    analysis = analyze_code("plt.savefig('chart.png')\nprint('saved')")
+    (tmp_path / "chart.png").write_bytes(b"png")
+    cache.put("key", "saved\n", analysis, str(tmp_path))
+    cache.put("error", "NameError('x')", analyze_code("print(x)"), str(tmp_path))
+    assert cache.get("error") is None
+
+    other = tmp_path / "other"
+    entry = cache.get("key")
+    entry.restore_artifacts(str(other))
+    assert entry.output == "saved\n"
+    assert (other / "chart.png").read_bytes() == b"png"
+    assert cache.stats()["hits"] == 1
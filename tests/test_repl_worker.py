@@ -0,0 +1,38 @@
+import signal
+from collections import OrderedDict
+
+from tools import repl_worker
+
+
+def test_timeout_is_not_swallowed_by_agent_code():
+    previous = signal.signal(signal.SIGALRM, repl_worker._on_alarm)
+    try:
+        code = "while True:\n    try:\n        pass\n    except Exception:\n        pass\n"
+        assert repl_worker.run({}, code, 0.2) == "Error: execution timed out after 0.2s"
+    finally:
+        signal.signal(signal.SIGALRM, previous)
+
+
+def test_a_run_in_an_evicted_session_reports_it(monkeypatch):
+    monkeypatch.setattr(repl_worker, "MAX_SESSIONS", 2)
+    sessions, evicted = OrderedDict(), OrderedDict()
+
+    def run(session, code, **message):
+        return repl_worker.handle(sessions, dict(message, op="run", session=session, code=code), evicted)
+
+    assert run("a", "x = 1\nprint(x)") == {"output": "1\n"}
+    run("b", "pass")
+    run("c", "pass")
+    assert list(sessions) == ["b", "c"]
+    assert run("a", "print(x)") == {"evicted": True}
+    # Reported once, the session starts over
+    assert run("a", "x = 2\nprint(x)") == {"output": "2\n"}
+
+
+def test_dropped_sessions_are_not_reported_evicted(monkeypatch):
+    monkeypatch.setattr(repl_worker, "MAX_SESSIONS", 1)
+    sessions, evicted = OrderedDict(), OrderedDict()
+    repl_worker.handle(sessions, {"op": "run", "session": "a", "code": "pass"}, evicted)
+    repl_worker.handle(sessions, {"op": "run", "session": "b", "code": "pass"}, evicted)
+    repl_worker.handle(sessions, {"op": "run", "session": "b", "code": "pass", "drop": ["a"]}, evicted)
+    assert repl_worker.handle(sessions, {"op": "run", "session": "a", "code": "print(1)"}, evicted) == {"output": "1\n"}
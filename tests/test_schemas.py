@@ -0,0 +1,41 @@
+from core.schemas import (
+    AnalysisResult, ApiResult, ProcessDecision, QueryResult, Report, RetrievalPlan, load_json_content,
+    parse_agent_output
+)
+
+
+def test_fenced_json_only():
+    assert load_json_content('```json\n{"next": "API"}\n```') == {"next": "API"}
+    assert load_json_content("{'next': 'API', 'done': True}") is None
+    assert load_json_content("not json") is None
+    assert load_json_content(42) is None
+
+
+def test_query_output():
+    output = '{"intent": "price", "parameters": {"dataTypes": ["ptf"], "province_id": 42, "region": "TR1"}}'
+    result = parse_agent_output("query_agent", output)
+    assert isinstance(result, QueryResult)
+    assert result.parameters.province_id == 42
+    # Parameters the schema doesn't name are kept
+    assert result.parameters.model_dump()["region"] == "TR1"
+
+
+def test_structured_outputs_are_validated_as_is():
+    decision = parse_agent_output("process_agent", {"next": "Visualization"})
+    assert decision == ProcessDecision(next="Visualization", task="")
+    plan = parse_agent_output("retrieval_agent", {"api_calls": [{"method": "POST", "endpoint": "/v1/mcp"}]})
+    assert isinstance(plan, RetrievalPlan) and plan.api_calls[0].service == "/electricity-service"
+
+
+def test_agent_specific_formats():
+    assert parse_agent_output("api_agent", 'compact_json:{"items": [{"price": 1}]}') == ApiResult(items=[{"price": 1}])
+    assert parse_agent_output("report_agent", "Prices rose in January.") == Report(report="Prices rose in January.")
+    analysis = parse_agent_output("analysis_agent", '{"insights": [{"findings": "Peak at 18:00"}]}')
+    assert isinstance(analysis, AnalysisResult) and analysis.insights[0].finding == "Peak at 18:00"
+
+
+def test_invalid_outputs():
+    assert parse_agent_output("query_agent", '{"intent": "price"}') is None
+    assert parse_agent_output("api_agent", "[1, 2]") is None
+    assert parse_agent_output("process_agent", "{'next': 'API'}") is None
+    assert parse_agent_output("unknown_agent", "{}") is None
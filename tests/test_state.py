@@ -0,0 +1,68 @@
+import operator
+from typing import Annotated, List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Send
+
+from core.schemas import Visualization
+from core.state import merge_visualizations
+
+
+def test_entries_without_names_are_kept_per_branch():
+    first = [Visualization(insight=1), Visualization(insight=1, description="Trend")]
+    second = [Visualization(insight=2)]
+    merged = merge_visualizations(merge_visualizations([], first), second)
+    assert [(entry.insight, entry.description) for entry in merged] == [(1, ""), (1, "Trend"), (2, "")]
+
+
+def test_reapplying_the_full_state_does_not_duplicate():
+    merged = merge_visualizations([], [{"insight": 1, "file": "a.png"}, {"insight": 2, "file": "a.png"}])
+    assert merge_visualizations(merged, merged) == merged
+    assert len(merged) == 2
+
+
+def test_none_clears_the_entries():
+    merged = merge_visualizations([], [Visualization(insight=1, file="a.png")])
+    assert merge_visualizations(merged, None) == []
+
+
+class FanoutState(TypedDict):
+    visualizations: Annotated[List[Visualization], merge_visualizations]
+    insights: List[str]
+    rounds: Annotated[List[int], operator.add]
+
+
+def _graph():
+    """Process -> one branch per insight -> join, as the workflow's visualization fan-out"""
+    def process(state):
+        return {"visualizations": None}
+
+    def fanout(state):
+        return [Send("branch", {"insight": insight, "index": index})
+                for index, insight in enumerate(state["insights"], start=1)]
+
+    def branch(payload):
+        return {"visualizations": [Visualization(insight=payload["index"]) for _ in payload["insight"]]}
+
+    def join(state):
+        return {"rounds": [len(state["visualizations"])]}
+
+    graph = StateGraph(FanoutState)
+    graph.add_node("process", process)
+    graph.add_node("branch", branch)
+    graph.add_node("join", join)
+    graph.add_edge(START, "process")
+    graph.add_conditional_edges("process", fanout, ["branch"])
+    graph.add_edge("branch", "join")
+    graph.add_edge("join", END)
+    return graph.compile()
+
+
+def test_a_new_fanout_starts_without_the_previous_entries():
+    graph = _graph()
+    state = graph.invoke({"insights": ["ab", "c"], "rounds": []})
+    assert state["rounds"] == [3]
+    # A follow-up on the same thread state carries the old entries in
+    state = graph.invoke({**state, "insights": ["d"]})
+    assert state["rounds"] == [3, 1]
+    assert [entry.insight for entry in state["visualizations"]] == [1]
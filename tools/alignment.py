@@ -0,0 +1,162 @@
+"""
+Timezone-aware alignment of EPİAŞ time series.
+
+Endpoints disagree on how they stamp time: ISO strings with a +03:00 offset, naive local
+times, epoch milliseconds, or a midnight date plus a separate "hour" column ("05:00" or 5).
+`normalize_time` puts a frame on a sorted, tz-aware DatetimeIndex in the local timezone,
+and `align` resamples several frames to one granularity and joins them on that index, so
+e.g. prices and consumption can be compared hour by hour.
+
+Imported inside the REPL session (see `tools.analytics_tools.align_datasets`), where the
+frames of the query are bound as `datasets`.
+"""
+import json
+from typing import Any, Dict, Mapping, Optional, Sequence, Union
+
+import pandas as pd
+
+from tools.analytics import AGGREGATIONS, _column, _label
+from tools.dataset import LOCAL_TIMEZONE
+
+# Names of the column holding the hour of day when the dates are midnight-only
+HOUR_COLUMNS = ("hour", "time", "period")
+FILLS = ("ffill", "interpolate")
+
+
+def _to_datetime(series: pd.Series, tz: str) -> pd.Series:
+    """Parse timestamps of any supported kind into tz-aware datetimes in `tz`"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        parsed = series
+    elif pd.api.types.is_numeric_dtype(series):
+        # Epoch timestamps, in milliseconds when they are too large for seconds
+        unit = "ms" if series.abs().max() > 1e11 else "s"
+        parsed = pd.to_datetime(series, unit=unit, utc=True)
+    else:
+        try:
+            parsed = pd.to_datetime(series, format="ISO8601")
+        except ValueError:
+            # Mixed UTC offsets (DST periods)
+            parsed = pd.to_datetime(series, format="ISO8601", utc=True)
+    if parsed.dt.tz is None:
+        return parsed.dt.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward")
+    return parsed.dt.tz_convert(tz)
+
+
+def _hour_offsets(series: pd.Series) -> pd.Series:
+    """Hours of day given as "HH:MM" text or integers, as timedeltas"""
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_timedelta(series, unit="h")
+    return pd.to_timedelta(series.astype(str).str.slice(0, 5) + ":00", errors="coerce")
+
+
+def _time_column(frame: pd.DataFrame) -> Optional[str]:
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            return column
+    for column in ("date", "datetime", "timestamp", "ts", "time", "period"):
+        if column in frame.columns:
+            return column
+    return None
+
+
+def normalize_time(frame: pd.DataFrame, time: Optional[str] = None, tz: str = LOCAL_TIMEZONE) -> pd.DataFrame:
+    """
+    Index a frame by its timestamps, converted to `tz`.
+
+    Accepts ISO strings with or without (even mixed) offsets, naive local times, epoch
+    seconds or milliseconds, or an existing DatetimeIndex. When the dates are all at
+    midnight and the frame has an hour column, the hour is added to them.
+
+    Args:
+        time: Timestamp column, the first datetime (or date-like named) column by default.
+
+    Returns:
+        pandas.DataFrame: The frame without the time column, indexed by a sorted, tz-aware
+        DatetimeIndex named "time".
+    """
+    if time is None and isinstance(frame.index, pd.DatetimeIndex):
+        index = frame.index.tz_localize(tz) if frame.index.tz is None else frame.index.tz_convert(tz)
+        return frame.set_axis(index.rename("time")).sort_index()
+    time = time or _time_column(frame)
+    if time is None:
+        raise ValueError(f"No time column found, pass `time`; columns: {', '.join(map(str, frame.columns))}")
+    stamps = _to_datetime(_column(frame, time), tz)
+    rest = frame.drop(columns=[time])
+    if (stamps.dropna() == stamps.dropna().dt.normalize()).all():
+        hour = next((c for c in HOUR_COLUMNS if c in rest.columns), None)
+        if hour is not None:
+            offsets = _hour_offsets(rest[hour])
+            if offsets.notna().all():
+                stamps = stamps + offsets
+                rest = rest.drop(columns=[hour])
+    aligned = rest.set_axis(pd.DatetimeIndex(stamps, name="time"))
+    return aligned[aligned.index.notna()].sort_index()
+
+
+def align(datasets: Union[pd.DataFrame, Mapping[str, pd.DataFrame]], names: Optional[Sequence[str]] = None,
+          freq: str = "h", how: str = "mean", join: str = "inner", fill: Optional[str] = None,
+          time: Optional[str] = None, tz: str = LOCAL_TIMEZONE) -> pd.DataFrame:
+    """
+    Resample frames to a common granularity and join them on their time index.
+
+    Args:
+        datasets: Frames by name (the REPL's `datasets`), or a single frame.
+        names: Names of the frames to align, all by default.
+        freq: pandas offset alias of the common granularity, e.g. "h", "D", "MS".
+        how: Aggregation of each period, one of `tools.analytics.AGGREGATIONS`.
+        join: "inner" keeps the periods every frame has data for, "outer" every period any
+            frame has data for.
+        fill: None, "ffill" or "interpolate" (in time) for the periods missing after an
+            outer join.
+        time: Timestamp column of the frames, see `normalize_time`.
+
+    Returns:
+        pandas.DataFrame: The numeric columns of every frame, prefixed with the frame's name
+        when there are several, indexed by time.
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {how!r}, use one of {', '.join(AGGREGATIONS)}")
+    if join not in ("inner", "outer"):
+        raise ValueError("`join` must be 'inner' or 'outer'")
+    if fill is not None and fill not in FILLS:
+        raise ValueError(f"`fill` must be None, {' or '.join(map(repr, FILLS))}")
+    if isinstance(datasets, pd.DataFrame):
+        datasets = {"data": datasets}
+    names = list(names) if names else list(datasets)
+    missing = [name for name in names if name not in datasets]
+    if missing:
+        raise ValueError(f"Unknown datasets {', '.join(missing)}; available: {', '.join(datasets)}")
+
+    frames = []
+    for name in names:
+        numeric = normalize_time(datasets[name], time, tz).select_dtypes("number")
+        if how == "sum":
+            # Periods without data stay missing instead of summing to 0
+            resampled = numeric.resample(freq).sum(min_count=1)
+        else:
+            resampled = numeric.resample(freq).agg(how)
+        if len(names) > 1:
+            resampled = resampled.add_prefix(f"{name}_")
+        frames.append(resampled)
+    aligned = pd.concat(frames, axis=1, join="outer").sort_index()
+    if join == "inner":
+        present = pd.concat([frame.notna().any(axis=1) for frame in frames], axis=1, join="outer")
+        aligned = aligned[present.fillna(False).all(axis=1)]
+    else:
+        aligned = aligned.dropna(how="all")
+    if fill == "ffill":
+        aligned = aligned.ffill()
+    elif fill == "interpolate":
+        aligned = aligned.interpolate(method="time", limit_area="inside")
+    return aligned
+
+
+def summary(aligned: pd.DataFrame) -> str:
+    """Describe an aligned frame as compact JSON: periods, columns, range and coverage"""
+    result: Dict[str, Any] = {"rows": int(len(aligned)), "columns": [str(c) for c in aligned.columns]}
+    if len(aligned):
+        result.update(start=_label(aligned.index.min()), end=_label(aligned.index.max()),
+                      freq=pd.infer_freq(aligned.index) if len(aligned) > 2 else None,
+                      coverage_pct={str(c): round(100 * float(aligned[c].notna().mean()), 1)
+                                    for c in aligned.columns})
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,262 @@
+"""
+Vectorized analytics primitives for EPİAŞ series.
+
+Imported inside the REPL session (see `tools.analytics_tools`), where they run on a
+DataFrame of the session, usually the bound `dataframe`, and return compact JSON for the
+agent: rounded numbers, a bounded number of points, no raw rows.
+
+Every function takes the frame first. `time` names its timestamp column; by default the
+first datetime column (or a DatetimeIndex) is used.
+"""
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+# Most points a series result lists before it is summarized
+MAX_POINTS = 48
+AGGREGATIONS = ("mean", "sum", "min", "max", "median", "std", "first", "last", "count")
+
+
+def _number(value: Any) -> Any:
+    """Round to 5 significant digits, NaN and infinities become None"""
+    if isinstance(value, (np.integer, int)) and not isinstance(value, bool):
+        return int(value)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return value
+    if not math.isfinite(value):
+        return None
+    return float(f"{value:.5g}")
+
+
+def _label(value: Any) -> str:
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(result: Dict[str, Any]) -> str:
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+
+
+def _column(frame: pd.DataFrame, name: str) -> pd.Series:
+    if name not in frame.columns:
+        raise ValueError(f"Column {name!r} not found; columns: {', '.join(map(str, frame.columns))}")
+    return frame[name]
+
+
+def _numeric(frame: pd.DataFrame, name: str) -> pd.Series:
+    series = _column(frame, name)
+    if not pd.api.types.is_numeric_dtype(series):
+        series = pd.to_numeric(series, errors="coerce")
+    return series
+
+
+def _time_index(frame: pd.DataFrame, time: Optional[str]) -> pd.DatetimeIndex:
+    if time is not None:
+        return pd.DatetimeIndex(pd.to_datetime(_column(frame, time)))
+    if isinstance(frame.index, pd.DatetimeIndex):
+        return frame.index
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            return pd.DatetimeIndex(frame[column])
+    raise ValueError("No datetime column found, pass `time`")
+
+
+def _series(frame: pd.DataFrame, value: str, time: Optional[str]) -> pd.Series:
+    """The value column indexed by time, sorted, without missing values"""
+    series = pd.Series(_numeric(frame, value).to_numpy(), index=_time_index(frame, time), name=value)
+    return series[series.index.notna()].dropna().sort_index()
+
+
+def _points(series: pd.Series, limit: int = MAX_POINTS) -> Dict[str, Any]:
+    """A series as {label: value}, or its head and tail if it is longer than `limit`"""
+    if len(series) <= limit:
+        return {"values": {_label(k): _number(v) for k, v in series.items()}}
+    half = limit // 2
+    return {
+        "head": {_label(k): _number(v) for k, v in series.iloc[:half].items()},
+        "tail": {_label(k): _number(v) for k, v in series.iloc[-half:].items()},
+        "omitted": len(series) - 2 * half,
+    }
+
+
+def _extremes(series: pd.Series) -> Dict[str, Any]:
+    series = series.dropna()
+    if series.empty:
+        return {"count": 0}
+    return {
+        "count": int(series.size), "mean": _number(series.mean()),
+        "min": _number(series.min()), "min_at": _label(series.idxmin()),
+        "max": _number(series.max()), "max_at": _label(series.idxmax()),
+    }
+
+
+def resample(frame: pd.DataFrame, value: str, freq: str = "D", how: str = "mean",
+             time: Optional[str] = None, change: Optional[str] = None, limit: int = MAX_POINTS) -> str:
+    """
+    Aggregate a series to another granularity, optionally as period-over-period changes.
+
+    Args:
+        freq: pandas offset alias, e.g. "h", "D", "W", "MS" (month start), "QS", "YS".
+        how: Aggregation, one of AGGREGATIONS.
+        change: None for the levels, "diff" or "pct" for the change against the previous
+            period (MoM with freq="MS", YoY with freq="YS").
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation {how!r}, use one of {', '.join(AGGREGATIONS)}")
+    aggregated = _series(frame, value, time).resample(freq).agg(how)
+    if change == "diff":
+        aggregated = aggregated.diff()
+    elif change == "pct":
+        aggregated = aggregated.pct_change(fill_method=None) * 100
+    elif change is not None:
+        raise ValueError("`change` must be None, 'diff' or 'pct'")
+    result = {"value": value, "freq": freq, "how": how, "change": change, "periods": int(aggregated.size)}
+    result.update(_extremes(aggregated))
+    result.update(_points(aggregated, limit))
+    return _dumps(result)
+
+
+def rolling(frame: pd.DataFrame, value: str, window: Union[int, str] = 24, time: Optional[str] = None,
+            stats: Sequence[str] = ("mean", "std", "min", "max")) -> str:
+    """
+    Rolling statistics of a series, summarized by their extremes and latest values.
+
+    Args:
+        window: Number of rows, or a time span like "7D" on the time index.
+    """
+    series = _series(frame, value, time)
+    windowed = series.rolling(window, min_periods=1 if isinstance(window, str) else max(1, int(window) // 2))
+    result = {"value": value, "window": window, "stats": {}}
+    for stat in stats:
+        if stat not in AGGREGATIONS:
+            raise ValueError(f"Unknown statistic {stat!r}, use one of {', '.join(AGGREGATIONS)}")
+        rolled = windowed.agg(stat)
+        summary = _extremes(rolled)
+        summary["last"] = _number(rolled.iloc[-1]) if rolled.size else None
+        result["stats"][stat] = summary
+    return _dumps(result)
+
+
+def share_of_total(frame: pd.DataFrame, category: str, value: Union[str, List[str]],
+                   by: Optional[str] = None, limit: int = 20) -> str:
+    """
+    Share of each category in the total, e.g. industrial consumption over all sectors.
+
+    Args:
+        category: Column with the categories (e.g. consumerSector).
+        value: Value column, or several columns summed per row (e.g. the consumption of
+            each consumer type).
+        by: Optional column (e.g. province or a period) to compute shares within each group.
+        limit: Most categories listed per group, the rest are summed as "other".
+    """
+    columns = [value] if isinstance(value, str) else list(value)
+    totals = sum(_numeric(frame, column).fillna(0) for column in columns)
+    keys = [by, category] if by else [category]
+    for key in keys:
+        _column(frame, key)
+    amounts = totals.groupby([frame[key] for key in keys]).sum()
+
+    def shares(group: pd.Series) -> Dict[str, Any]:
+        group = group.sort_values(ascending=False)
+        total = group.sum()
+        if len(group) > limit:
+            group = pd.concat([group.iloc[:limit], pd.Series({"other": group.iloc[limit:].sum()})])
+        return {
+            "total": _number(total),
+            "shares": {str(k): {"value": _number(v), "share_pct": _number(100 * v / total) if total else None}
+                       for k, v in group.items()},
+        }
+
+    result: Dict[str, Any] = {"category": category, "value": columns}
+    if by:
+        result["groups"] = {str(k): shares(g.droplevel(0)) for k, g in amounts.groupby(level=0)}
+    else:
+        result.update(shares(amounts))
+    return _dumps(result)
+
+
+def peak_offpeak(frame: pd.DataFrame, value: str, time: Optional[str] = None, peak_start: int = 8,
+                 peak_end: int = 20, weekdays_only: bool = True) -> str:
+    """
+    Split a series into peak and off-peak hours.
+
+    Peak defaults to the base/peak convention of power markets: 08:00-20:00 on weekdays.
+    """
+    series = _series(frame, value, time)
+    hours = series.index.hour
+    peak = (hours >= peak_start) & (hours < peak_end)
+    if weekdays_only:
+        peak &= series.index.dayofweek < 5
+
+    def summary(part: pd.Series) -> Dict[str, Any]:
+        return {"hours": int(part.size), "mean": _number(part.mean()), "sum": _number(part.sum()),
+                "min": _number(part.min()), "max": _number(part.max())}
+
+    on, off = series[peak], series[~peak]
+    result = {
+        "value": value, "peak_hours": f"{peak_start:02d}:00-{peak_end:02d}:00",
+        "weekdays_only": weekdays_only, "peak": summary(on), "offpeak": summary(off),
+        "base_mean": _number(series.mean()),
+        "peak_offpeak_ratio": _number(on.mean() / off.mean()) if off.size and off.mean() else None,
+    }
+    return _dumps(result)
+
+
+def zscore_anomalies(frame: pd.DataFrame, value: str, time: Optional[str] = None, threshold: float = 3.0,
+                     window: Optional[Union[int, str]] = None, limit: int = 10) -> str:
+    """
+    Points further than `threshold` standard deviations from the mean.
+
+    Args:
+        window: Compare to a rolling mean and deviation (rows or a span like "7D") instead of
+            the whole series, so slow trends and seasons are not flagged.
+        limit: Most anomalies listed, the largest first.
+    """
+    series = _series(frame, value, time)
+    if window is None:
+        mean, std = series.mean(), series.std()
+    else:
+        rolled = series.rolling(window, min_periods=2)
+        mean, std = rolled.mean(), rolled.std()
+    scores = (series - mean) / std
+    scores = scores.replace([np.inf, -np.inf], np.nan).dropna()
+    flagged = scores[scores.abs() > threshold]
+    top = flagged.abs().sort_values(ascending=False).index[:limit]
+    result = {
+        "value": value, "threshold": threshold, "window": window, "points": int(series.size),
+        "anomalies": int(flagged.size), "high": int((flagged > 0).sum()), "low": int((flagged < 0).sum()),
+        "largest": [{"at": _label(at), "value": _number(series[at]), "z": _number(scores[at])} for at in top],
+    }
+    return _dumps(result)
+
+
+def correlation(frame: pd.DataFrame, columns: Optional[List[str]] = None, method: str = "pearson",
+                freq: Optional[str] = None, time: Optional[str] = None) -> str:
+    """
+    Correlation matrix of numeric columns.
+
+    Args:
+        columns: Columns to correlate, all numeric columns by default.
+        method: "pearson", "spearman" or "kendall".
+        freq: Resample to this granularity (mean) first, e.g. "D" to correlate daily profiles.
+    """
+    if columns is None:
+        numeric = frame.select_dtypes("number")
+    else:
+        numeric = pd.DataFrame({column: _numeric(frame, column) for column in columns})
+    if freq is not None:
+        numeric = numeric.set_axis(_time_index(frame, time)).sort_index().resample(freq).mean()
+    if numeric.shape[1] < 2:
+        raise ValueError("Need at least two numeric columns to correlate")
+    matrix = numeric.corr(method=method)
+    result = {
+        "method": method, "freq": freq, "rows": int(len(numeric)),
+        "matrix": {str(a): {str(b): _number(v) for b, v in row.items()} for a, row in matrix.iterrows()},
+    }
+    return _dumps(result)
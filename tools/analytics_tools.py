@@ -0,0 +1,186 @@
+from logger import setup_logger
+from typing import Annotated, Any, Callable, List, Optional, Union
+from typing_extensions import NotRequired, TypedDict
+from langchain.tools import StructuredTool
+from pydantic import Field
+from tools.python_repl import run_python_code, run_python_code_parallel
+from tools.repl_pool import get_repl_pool
+import asyncio
+import json
+import time
+
+logger = setup_logger("logs/analytics_tools.log")
+
+Dataset = Annotated[str, "Name of a DataFrame in the Python REPL; `dataframe` is the query's API data"]
+Value = Annotated[str, "Numeric column to analyze"]
+Time = Annotated[Optional[str], "Timestamp column, the first datetime column by default"]
+Window = Annotated[Union[int, str], "Number of rows, or a time span like '24h' or '7D'"]
+
+
+def _analytics_call(function: str, dataset: str, module: str = "analytics", **arguments: Any) -> str:
+    """
+    Run a function of `tools.<module>` (`tools.analytics` by default) on a DataFrame of the
+    current REPL session.
+
+    The data stays in the session; only the compact JSON result comes back. The call goes
+    through `run_python_code`, so it is cached like agent code.
+    """
+    if not dataset.isidentifier():
+        return f"Error: {dataset!r} is not the name of a DataFrame variable"
+    call = ", ".join([dataset] + [f"{name}={value!r}" for name, value in arguments.items() if value is not None])
+    logger.info(f"Running {function} on {dataset}")
+    return run_python_code(f"from tools import {module} as _{module}\nprint(_{module}.{function}({call}))")
+
+
+def resample_series(value: Value, freq: Annotated[
+        str, "Target granularity: 'h', 'D', 'W', 'MS' (month), 'QS' (quarter), 'YS' (year)"] = "D",
+        how: Annotated[str, "mean, sum, min, max, median, std, first, last or count"] = "mean",
+        change: Annotated[Optional[str], "None for levels, 'diff' or 'pct' for change vs the previous "
+                                         "period (MoM with freq='MS', YoY with freq='YS')"] = None,
+        time: Time = None, dataset: Dataset = "dataframe") -> str:
+    """Aggregate a time series to another granularity, optionally as period-over-period changes"""
+    return _analytics_call("resample", dataset, value=value, freq=freq, how=how, change=change, time=time)
+
+
+def rolling_stats(value: Value, window: Window = 24,
+                  stats: Annotated[Optional[List[str]], "Statistics: mean, std, min, max, sum, median"] = None,
+                  time: Time = None, dataset: Dataset = "dataframe") -> str:
+    """Rolling statistics of a time series: extremes (and when) and latest value of each"""
+    return _analytics_call("rolling", dataset, value=value, window=window, stats=stats, time=time)
+
+
+def share_of_total(category: Annotated[str, "Column with the categories, e.g. consumerSector"],
+                   value: Annotated[Union[str, List[str]], "Value column, or columns summed per row"],
+                   by: Annotated[Optional[str], "Column to compute the shares within, e.g. province"] = None,
+                   dataset: Dataset = "dataframe") -> str:
+    """Share of each category in the total, e.g. industrial consumption over all sectors"""
+    return _analytics_call("share_of_total", dataset, category=category, value=value, by=by)
+
+
+def peak_offpeak(value: Value, peak_start: Annotated[int, "First peak hour"] = 8,
+                 peak_end: Annotated[int, "Hour the peak ends (exclusive)"] = 20,
+                 weekdays_only: Annotated[bool, "Weekends are off-peak"] = True,
+                 time: Time = None, dataset: Dataset = "dataframe") -> str:
+    """Compare peak and off-peak hours of an hourly series (mean, sum, extremes, peak/off-peak ratio)"""
+    return _analytics_call("peak_offpeak", dataset, value=value, peak_start=peak_start, peak_end=peak_end,
+                           weekdays_only=weekdays_only, time=time)
+
+
+def zscore_anomalies(value: Value, threshold: Annotated[float, "Standard deviations from the mean"] = 3.0,
+                     window: Annotated[Optional[Union[int, str]], "Rolling window to compare against, "
+                                                                  "the whole series by default"] = None,
+                     time: Time = None, dataset: Dataset = "dataframe") -> str:
+    """Find anomalous points of a time series by z-score, largest first"""
+    return _analytics_call("zscore_anomalies", dataset, value=value, threshold=threshold, window=window,
+                           time=time)
+
+
+def correlation(columns: Annotated[Optional[List[str]], "Columns to correlate, all numeric by default"] = None,
+                method: Annotated[str, "pearson, spearman or kendall"] = "pearson",
+                freq: Annotated[Optional[str], "Resample (mean) to this granularity first, e.g. 'D'"] = None,
+                time: Time = None, dataset: Dataset = "dataframe") -> str:
+    """Correlation matrix of numeric columns"""
+    return _analytics_call("correlation", dataset, columns=columns, method=method, freq=freq, time=time)
+
+
+def align_datasets(names: Annotated[Optional[List[str]], "Names in `datasets` to align, all by default"] = None,
+                   freq: Annotated[str, "Common granularity: 'h', 'D', 'W', 'MS' (month)"] = "h",
+                   how: Annotated[str, "Aggregation of each period: mean, sum, min, max, ..."] = "mean",
+                   join: Annotated[str, "'inner': periods every dataset covers, 'outer': any"] = "inner",
+                   fill: Annotated[Optional[str], "Fill gaps after an outer join: None, 'ffill' or "
+                                                  "'interpolate'"] = None,
+                   output: Annotated[str, "Variable to store the aligned DataFrame in"] = "aligned") -> str:
+    """
+    Align the per-result frames of `datasets` on a common timezone-aware time index, so
+    series of different endpoints (e.g. prices and consumption) can be compared period by
+    period. The result is stored in the REPL and usable by the other tools as `dataset`.
+    """
+    if not output.isidentifier():
+        return f"Error: {output!r} is not a valid variable name"
+    call = ", ".join(["datasets"] + [f"{name}={value!r}" for name, value in (
+        ("names", names), ("freq", freq), ("how", how), ("join", join), ("fill", fill)) if value is not None])
+    logger.info(f"Aligning datasets into {output}")
+    return run_python_code(f"from tools import alignment as _alignment\n{output} = _alignment.align({call})\n"
+                           f"print(_alignment.summary({output}))")
+
+
+def plot_figure(file: Annotated[str, "File name of the figure, e.g. visualization_price_trend.json"],
+                kind: Annotated[str, "line, scatter, area or bar"] = "line",
+                x: Annotated[Optional[str], "Column on the x axis, the first datetime column by default"] = None,
+                y: Annotated[Optional[Union[str, List[str]]], "Column(s) to plot, all numeric by default"] = None,
+                color: Annotated[Optional[str], "Column to split the traces by, e.g. province"] = None,
+                title: Annotated[Optional[str], "Figure title"] = None,
+                dataset: Dataset = "dataframe") -> str:
+    """
+    Save an interactive Plotly figure of a DataFrame as JSON, for the browser to render.
+    Long series are downsampled server side; returns the file and the points drawn.
+    """
+    if not file.endswith(".json") or "/" in file or "\\" in file:
+        return f"Error: {file!r} must be a file name ending with .json"
+    return _analytics_call("save_figure", dataset, path=file, kind=kind, x=x, y=y, color=color, title=title,
+                           module="figures")
+
+
+class ChartSpec(TypedDict):
+    """A PNG chart of the query's API data"""
+    file: Annotated[str, Field(description="PNG file name, e.g. visualization_price_trend.png")]
+    kind: NotRequired[Annotated[str, Field(description="line, scatter, area or bar")]]
+    x: NotRequired[Annotated[str, Field(description="Column on the x axis, the first datetime column by default")]]
+    y: NotRequired[Annotated[Union[str, List[str]], Field(description="Column(s) to plot, all numeric by default")]]
+    color: NotRequired[Annotated[str, Field(description="Column to split the series by, e.g. province")]]
+    title: NotRequired[Annotated[str, Field(description="Chart title")]]
+    dataset: NotRequired[Annotated[str, Field(description="API result in `datasets` to plot, all the "
+                                                          "data (`dataframe`) by default")]]
+
+
+CHART_ARGUMENTS = ("kind", "x", "y", "color", "title")
+
+
+def render_charts(charts: Annotated[List[ChartSpec], "The charts to render"]) -> str:
+    """
+    Render several Matplotlib PNG charts of the query's API data at once, in parallel REPL
+    workers, from their specs. Returns each chart's file, points drawn and render time, or its error.
+    """
+    codes, results = [], []
+    for spec in charts:
+        file, dataset = spec.get("file", ""), spec.get("dataset")
+        if not file.endswith(".png") or "/" in file or "\\" in file:
+            results.append({"file": file, "error": f"{file!r} must be a file name ending with .png"})
+            continue
+        frame = "dataframe" if dataset in (None, "dataframe") else f"datasets[{dataset!r}]"
+        call = ", ".join([frame, f"path={file!r}"] + [f"{name}={spec[name]!r}" for name in CHART_ARGUMENTS
+                                                      if spec.get(name) is not None])
+        codes.append(f"from tools import charts as _charts\nprint(_charts.save_chart({call}))")
+        results.append({"file": file})
+    logger.info(f"Rendering {len(codes)} charts")
+    start = time.perf_counter()
+    outputs = iter(run_python_code_parallel(codes))
+    elapsed = time.perf_counter() - start
+    for result in results:
+        if "error" in result:
+            continue
+        output = next(outputs).strip()
+        try:
+            result.update(json.loads(output))
+        except ValueError:
+            result["error"] = output
+    pool = get_repl_pool()
+    workers = min(len(codes), pool.size) if pool is not None else 1
+    return json.dumps({"charts": results, "workers": workers, "seconds": round(elapsed, 3)},
+                      ensure_ascii=False, separators=(",", ":"))
+
+
+def _analytics_tool(function: Callable[..., str]) -> StructuredTool:
+    async def coroutine(**kwargs: Any) -> str:
+        # The REPL may be busy, keep the event loop responsive
+        return await asyncio.to_thread(function, **kwargs)
+    return StructuredTool.from_function(func=function, coroutine=coroutine, name=function.__name__)
+
+
+analytics_tools = [
+    _analytics_tool(function)
+    for function in (resample_series, rolling_stats, share_of_total, peak_offpeak, zscore_anomalies, correlation)
+]
+alignment_tool = _analytics_tool(align_datasets)
+figure_tool = _analytics_tool(plot_figure)
+charts_tool = _analytics_tool(render_charts)
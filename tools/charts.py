@@ -0,0 +1,94 @@
+"""
+Matplotlib PNG charts of a DataFrame of the REPL session, described by a spec.
+
+The visualization agent only describes a chart (kind, x/y columns, grouping, title) and
+`save_chart` draws it: the series are those of the Plotly figures (`tools.figures`, bars of
+repeated x values show their mean, long series are downsampled with LTTB), rendered on an
+Agg canvas without pyplot's global state.
+
+Imported inside the REPL session (see `tools.analytics_tools.render_charts`, which renders
+several specs at once in parallel workers).
+"""
+import time
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from tools.analytics import _dumps
+from tools.figures import MAX_POINTS, chart_series
+
+FIGURE_SIZE = (10, 5)
+DPI = 100
+# Bar groups take this share of the space of their x value
+BAR_WIDTH = 0.8
+
+
+def _x_values(xs: pd.Series) -> Union[pd.Series, np.ndarray]:
+    """x values Matplotlib can place, local wall-clock times for tz-aware timestamps"""
+    if isinstance(xs.dtype, pd.DatetimeTZDtype):
+        return xs.dt.tz_localize(None).to_numpy()
+    return xs.to_numpy()
+
+
+def _label(value) -> str:
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d %H:%M" if value != value.normalize() else "%Y-%m-%d")
+    return str(value)
+
+
+def _draw_bars(axes, series: List[tuple]) -> None:
+    """Bars side by side per x value, one color per series"""
+    labels = list(dict.fromkeys(value for _, points in series for value in points["x"]))
+    positions = {value: i for i, value in enumerate(labels)}
+    width = BAR_WIDTH / len(series)
+    for i, (name, points) in enumerate(series):
+        offsets = np.array([positions[value] for value in points["x"]]) + (i - (len(series) - 1) / 2) * width
+        axes.bar(offsets, points["y"], width=width, label=name)
+    step = max(1, len(labels) // 24)
+    axes.set_xticks(range(0, len(labels), step))
+    axes.set_xticklabels([_label(labels[i]) for i in range(0, len(labels), step)], rotation=45, ha="right")
+
+
+def save_chart(frame: pd.DataFrame, path: str, kind: str = "line", x: Optional[str] = None,
+               y: Optional[Union[str, List[str]]] = None, color: Optional[str] = None,
+               title: Optional[str] = None, max_points: int = MAX_POINTS) -> str:
+    """
+    Render a chart to a PNG, see `tools.figures.figure_spec` for the chart arguments.
+
+    Returns:
+        str: Compact JSON with the file, the series and points drawn, and the render time.
+    """
+    start = time.perf_counter()
+    if not path.endswith(".png"):
+        raise ValueError("The chart path must end with .png")
+    x, columns, series = chart_series(frame, kind, x, y, color, max_points)
+    figure = Figure(figsize=FIGURE_SIZE, dpi=DPI)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    if kind == "bar":
+        _draw_bars(axes, series)
+    else:
+        for name, points in series:
+            xs = _x_values(points["x"])
+            if kind == "scatter":
+                axes.scatter(xs, points["y"], s=8, label=name)
+            elif kind == "area":
+                axes.fill_between(xs, points["y"], alpha=0.4, label=name)
+                axes.plot(xs, points["y"], linewidth=1)
+            else:
+                axes.plot(xs, points["y"], linewidth=1.2, label=name)
+        if pd.api.types.is_datetime64_any_dtype(series[0][1]["x"]):
+            figure.autofmt_xdate()
+    axes.set_title(title or ", ".join(columns))
+    axes.set_xlabel(x)
+    axes.set_ylabel(", ".join(columns))
+    axes.grid(alpha=0.3)
+    if len(series) > 1:
+        axes.legend(fontsize="small")
+    figure.savefig(path, bbox_inches="tight")
+    points = sum(len(points) for _, points in series)
+    return _dumps({"file": path, "kind": kind, "series": len(series), "points": points, "rows": int(len(frame)),
+                   "seconds": round(time.perf_counter() - start, 3)})
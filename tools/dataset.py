@@ -0,0 +1,150 @@
+"""
+Datasets bound into the REPL namespace of a query.
+
+The API items of a query are loaded into the agent's REPL session as a typed pandas
+DataFrame named `dataframe` (ISO date strings parsed to timestamps, numeric strings to
+numbers), so agent code starts from the data instead of pasting it into the code. The
+agents only see the frame's schema, built by `describe_frame`.
+
+A query calling several endpoints gets their items combined; `datasets` maps a name per
+API result (the endpoint's last path segment) to a frame of that result's items alone,
+ready for `tools.alignment`.
+
+Used by both the in-process REPL and the REPL workers, so pandas is imported lazily.
+"""
+from typing import Any, Dict, List, Sequence, Tuple
+import hashlib
+import json
+import re
+
+# Names of the bound dataset and of the per-result frames in the REPL namespace
+DATASET_VARIABLE = "dataframe"
+DATASETS_VARIABLE = "datasets"
+
+# Leading ISO date (2024-01-01, 2024-01-01T00:00:00+03:00, ...)
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+# Timezone of EPİAŞ timestamps, used when a column mixes UTC offsets (DST periods)
+LOCAL_TIMEZONE = "Europe/Istanbul"
+
+
+def dataset_fingerprint(items: List[Dict[str, Any]], endpoints: Sequence[str] = ()) -> str:
+    """Identify a dataset by the canonical JSON of its items and the endpoints naming its results"""
+    canonical = json.dumps([items, list(endpoints)] if endpoints else items, sort_keys=True,
+                           separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _parse_dates(series):
+    import pandas as pd
+    try:
+        return pd.to_datetime(series, errors="coerce", format="ISO8601")
+    except ValueError:
+        # Mixed UTC offsets, align them on the local timezone
+        return pd.to_datetime(series, errors="coerce", format="ISO8601", utc=True).dt.tz_convert(LOCAL_TIMEZONE)
+
+
+def typed_frame(items: List[Dict[str, Any]]):
+    """
+    Build a DataFrame from API items with proper dtypes.
+
+    Text columns whose every value is an ISO date become datetime columns (tz-aware when the
+    API sends offsets), and columns whose every value is a number or numeric text become
+    numeric. Anything else keeps its values untouched.
+
+    Returns:
+        pandas.DataFrame: The typed frame.
+    """
+    import pandas as pd
+    frame = pd.DataFrame.from_records(items)
+    for column in frame.columns:
+        series = frame[column]
+        if not (series.dtype == object or pd.api.types.is_string_dtype(series)):
+            continue
+        values = series.dropna()
+        if values.empty:
+            continue
+        texts = values.map(lambda v: isinstance(v, str))
+        if texts.all() and values.str.match(_ISO_DATE).all():
+            parsed = _parse_dates(series)
+        elif (texts | values.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))).all():
+            parsed = pd.to_numeric(series, errors="coerce")
+        else:
+            continue
+        # Only convert when no value was lost on the way
+        if parsed.notna().sum() == len(values):
+            frame[column] = parsed
+    return frame
+
+
+def describe_frame(frame, name: str = DATASET_VARIABLE) -> str:
+    """
+    Describe a bound frame for an agent prompt: row count, columns, dtypes, nulls and the
+    covered time range of date columns.
+    """
+    import pandas as pd
+    lines = [f"`{name}`: pandas DataFrame, {len(frame)} rows x {len(frame.columns)} columns"]
+    for column in frame.columns:
+        series = frame[column]
+        line = f"- {column}: {series.dtype}"
+        nulls = int(series.isna().sum())
+        if nulls:
+            line += f", {nulls} null"
+        if pd.api.types.is_datetime64_any_dtype(series) and series.notna().any():
+            line += f", {series.min().isoformat()} .. {series.max().isoformat()}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _dataset_names(endpoints: Sequence[str], count: int) -> List[str]:
+    """Name the results after their endpoints when they match one to one, else number them"""
+    names = []
+    for endpoint in endpoints:
+        name = re.sub(r"\W", "_", endpoint.rstrip("/").rsplit("/", 1)[-1]).strip("_").lower()
+        if name and name not in names:
+            names.append(name)
+    if len(names) == count:
+        return names
+    return [f"dataset_{i}" for i in range(1, count + 1)]
+
+
+def split_results(items: List[Dict[str, Any]], endpoints: Sequence[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Split combined API items back into one list per API result.
+
+    Items of an endpoint share their keys, so results are told apart by their key sets, in
+    the order they appear (the order of the calls).
+
+    Args:
+        endpoints: Endpoints of the calls, in order, to name the results after.
+    """
+    groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+    for item in items:
+        groups.setdefault(tuple(sorted(item)), []).append(item)
+    return dict(zip(_dataset_names(endpoints, len(groups)), groups.values()))
+
+
+def bind_dataset(namespace: Dict[str, Any], items: List[Dict[str, Any]], endpoints: Sequence[str] = ()) -> str:
+    """
+    Load items into a REPL namespace as the typed `dataframe`, and as one frame per API
+    result in `datasets`.
+
+    Returns:
+        str: The frames' description, see `describe_frame`.
+    """
+    frame = typed_frame(items)
+    results = split_results(items, endpoints)
+    if len(results) > 1:
+        datasets = {name: typed_frame(result) for name, result in results.items()}
+    else:
+        datasets = {name: frame for name in results}
+    namespace[DATASET_VARIABLE] = frame
+    namespace[DATASETS_VARIABLE] = datasets
+    if len(datasets) <= 1:
+        return describe_frame(frame)
+    descriptions = [
+        describe_frame(frame).split("\n", 1)[0] + ", all results combined",
+        f"`{DATASETS_VARIABLE}`: one DataFrame per API result; align them on a common time index "
+        f"with `align_datasets` or `tools.alignment.align({DATASETS_VARIABLE})`",
+    ]
+    descriptions += [describe_frame(result, f"{DATASETS_VARIABLE}[{name!r}]") for name, result in datasets.items()]
+    return "\n".join(descriptions)
@@ -0,0 +1,36 @@
+"""
+Downsampling of series for prompts and charts.
+
+Pure Python, so it is usable both by the prompt encoders and inside the REPL workers.
+"""
+from typing import List, Sequence
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Keeps the first and last points and, from each of `threshold - 2` buckets in between,
+    the point forming the largest triangle with the previously kept point and the mean of
+    the next bucket.
+
+    Returns:
+        list: Indices of the kept points, in order.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    for bucket in range(threshold - 2):
+        start, end = int(bucket * every) + 1, int((bucket + 1) * every) + 1
+        following = range(end, min(int((bucket + 2) * every) + 1, n))
+        mean_x = sum(xs[j] for j in following) / len(following)
+        mean_y = sum(ys[j] for j in following) / len(following)
+        ax, ay = xs[kept[-1]], ys[kept[-1]]
+        kept.append(max(range(start, end),
+                        key=lambda j: abs((ax - mean_x) * (ys[j] - ay) - (ax - xs[j]) * (mean_y - ay))))
+    kept.append(n - 1)
+    return kept
@@ -1,30 +1,162 @@
 import requests
+import httpx
 import dotenv
 import os
-from langchain.tools import tool
+from langchain.tools import StructuredTool
 from logger import setup_logger, LogLevelContext
-from typing import Dict, Annotated
+from core.api_cache import ApiResponseCache
+from core.budget import BudgetExceeded, current_budget
+from core.tracing import span
+from typing import Dict, Annotated, Optional, Tuple
+import asyncio
 import json
+import threading
+import time
+import weakref
 
 logger = setup_logger("logs/epias_api.log")
 
 dotenv.load_dotenv()
 
-def get_token(username, password):
-    url = "https://giris.epias.com.tr/cas/v1/tickets"
-    body = {"username": username, "password": password}
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded",
-        "Accept": "text/plain"
-    }
-    response = requests.post(url, headers=headers, data=body)
-    return response.text
+TOKEN_URL = "https://giris.epias.com.tr/cas/v1/tickets"
+HOST = "https://seffaflik.epias.com.tr"
+TOKEN_HEADERS = {
+    "Content-Type": "application/x-www-form-urlencoded",
+    "Accept": "text/plain"
+}
+
+# TGTs are valid for two hours, reuse one until shortly before it expires
+TOKEN_TTL = 110 * 60
+API_TIMEOUT = 60
+API_MAX_CONNECTIONS = int(os.getenv("EPIAS_MAX_CONNECTIONS", "20"))
 
 username = os.getenv("EPIAS_USERNAME")
 password = os.getenv("EPIAS_PASSWORD")
 
-@tool
-def call_transparency_api(
+# Pooled clients: one keep-alive session per thread, one async client per event loop
+_local = threading.local()
+_async_clients = weakref.WeakKeyDictionary()
+
+_token_lock = threading.Lock()
+_token = {"tgt": None, "expires": 0.0}
+
+# Optional cache shared by every query of the process, see `set_response_cache`
+_response_cache: Optional[ApiResponseCache] = None
+
+def _session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+def _async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=API_TIMEOUT,
+            limits=httpx.Limits(max_connections=API_MAX_CONNECTIONS, max_keepalive_connections=API_MAX_CONNECTIONS)
+        )
+        _async_clients[loop] = client
+    return client
+
+async def aclose_clients() -> None:
+    """Close the pooled async client of the running event loop"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+def _cached_token() -> Optional[str]:
+    with _token_lock:
+        if _token["tgt"] and time.monotonic() < _token["expires"]:
+            return _token["tgt"]
+    return None
+
+def _store_token(tgt: str) -> str:
+    with _token_lock:
+        _token["tgt"], _token["expires"] = tgt, time.monotonic() + TOKEN_TTL
+    return tgt
+
+def _invalidate_token(error: Exception) -> None:
+    # A rejected TGT has expired or been revoked, fetch a new one on the next call
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 401:
+        with _token_lock:
+            _token["tgt"] = None
+
+def _record_response(http_span, response) -> None:
+    if http_span is not None:
+        http_span.attributes["status_code"] = response.status_code
+        http_span.attributes["response_bytes"] = len(response.content)
+
+def _token_for_call() -> str:
+    tgt = _cached_token()
+    if tgt is None:
+        with span("POST ticket", "http", url=TOKEN_URL) as http_span:
+            response = _session().post(TOKEN_URL, headers=TOKEN_HEADERS,
+                                       data={"username": username, "password": password}, timeout=API_TIMEOUT)
+            _record_response(http_span, response)
+            response.raise_for_status()
+        tgt = _store_token(response.text)
+    return tgt
+
+async def _atoken_for_call(client: httpx.AsyncClient) -> str:
+    tgt = _cached_token()
+    if tgt is None:
+        with span("POST ticket", "http", url=TOKEN_URL) as http_span:
+            response = await client.post(TOKEN_URL, headers=TOKEN_HEADERS,
+                                         data={"username": username, "password": password})
+            _record_response(http_span, response)
+            response.raise_for_status()
+        tgt = _store_token(response.text)
+    return tgt
+
+def set_response_cache(cache: Optional[ApiResponseCache]) -> Optional[ApiResponseCache]:
+    """
+    Share `cache` between every API call of the process, None to disable caching.
+
+    Returns:
+        ApiResponseCache | None: The previously installed cache.
+    """
+    global _response_cache
+    previous, _response_cache = _response_cache, cache
+    return previous
+
+def _cache_lookup(method: str, service: str, endpoint: str, body: dict) -> Tuple[Optional[str], Optional[str]]:
+    """Return the cache key of a call and its cached response, (None, None) without a cache"""
+    cache = _response_cache
+    if cache is None:
+        return None, None
+    key = cache.key(method, service, endpoint, body)
+    cached = cache.get(key)
+    if cached is not None:
+        logger.info(f"API cache hit for {endpoint}")
+    return key, cached
+
+def _cache_response(key: Optional[str], compact_json: str) -> None:
+    cache = _response_cache
+    if key is not None and cache is not None:
+        cache.put(key, compact_json)
+
+def _request_headers(tgt: str) -> Dict[str, str]:
+    return {
+        "Accept-Language": "en",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        "TGT": tgt
+    }
+
+def _compact(data) -> str:
+    # Serialize without spaces or newlines
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def _charge_api_call() -> None:
+    """Charge the call to the query budget, raising BudgetExceeded if it's used up"""
+    budget = current_budget()
+    if budget is not None:
+        budget.charge_api_call()
+
+def _call_transparency_api(
         method: Annotated[str, "HTTP method e.g., GET or POST"],
         service: Annotated[str, "This is always '/electricity-service'"],
         endpoint: Annotated[str, "Specify the full endpoint e.g., '/v1/markets/dam/data/mcp'"],
@@ -35,28 +167,67 @@ def call_transparency_api(
     as a compact string (no spaces, no unnecessary escapes).
     method, service, endpoint, and body are required parameters.
     """
-    tgt = get_token(username, password)
-    host = "https://seffaflik.epias.com.tr"
-    url = host + service + endpoint
-    headers = {
-        "Accept-Language": "en",
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "TGT": tgt
-    }
+    cache_key, cached = _cache_lookup(method, service, endpoint, body)
+    if cached is not None:
+        return cached
     try:
+        _charge_api_call()
+    except BudgetExceeded as e:
+        logger.warning(f"API call to {endpoint} refused: {e}")
+        return _compact({"error": str(e)})
+    url = HOST + service + endpoint
+    try:
+        headers = _request_headers(_token_for_call())
         with LogLevelContext(logger, "DEBUG"):
             logger.debug(f"API call: {method} {endpoint}")
         logger.info(f"API call to {endpoint} - {len(str(body))} bytes")
-        response = requests.request(method, url, headers=headers, json=body)
+        with span(f"{method.upper()} {endpoint}", "http", url=url) as http_span:
+            response = _session().request(method, url, headers=headers, json=body, timeout=API_TIMEOUT)
+            _record_response(http_span, response)
         response.raise_for_status()
-        data = response.json()
-        # Serialize without spaces or newlines
-        compact_json = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        compact_json = _compact(response.json())
         logger.info(f"API call successful, returning compact JSON: {compact_json}")
+        _cache_response(cache_key, compact_json)
         return compact_json
 
     except Exception as e:
         logger.error(f"Error calling EPIAS API: {e}")
+        _invalidate_token(e)
         # Return the error as a compact JSON too
-        return json.dumps({"error": str(e)}, separators=(',', ':'), ensure_ascii=False)
\ No newline at end of file
+        return _compact({"error": str(e)})
+
+async def _acall_transparency_api(
+        method: str,
+        service: str,
+        endpoint: str,
+        body: dict
+) -> str:
+    """Non-blocking version of `_call_transparency_api` for the async graph"""
+    url = HOST + service + endpoint
+    cache_key, cached = _cache_lookup(method, service, endpoint, body)
+    if cached is not None:
+        return cached
+    try:
+        _charge_api_call()
+        client = _async_client()
+        tgt = await _atoken_for_call(client)
+        logger.info(f"Async API call to {endpoint} - {len(str(body))} bytes")
+        with span(f"{method.upper()} {endpoint}", "http", url=url) as http_span:
+            response = await client.request(method, url, headers=_request_headers(tgt), json=body)
+            _record_response(http_span, response)
+        response.raise_for_status()
+        compact_json = _compact(response.json())
+        logger.info(f"Async API call successful, returning compact JSON: {compact_json}")
+        _cache_response(cache_key, compact_json)
+        return compact_json
+
+    except Exception as e:
+        logger.error(f"Error calling EPIAS API: {e}")
+        _invalidate_token(e)
+        return _compact({"error": str(e)})
+
+call_transparency_api = StructuredTool.from_function(
+    func=_call_transparency_api,
+    coroutine=_acall_transparency_api,
+    name="call_transparency_api",
+)
@@ -0,0 +1,143 @@
+"""
+Interactive Plotly figures of a DataFrame of the REPL session.
+
+The visualization agent describes a chart (kind, x/y columns, grouping, title) and
+`save_figure` writes its Plotly figure JSON, which the browser renders interactively
+instead of a rasterized PNG. Traces longer than `max_points` are downsampled with LTTB, so
+the JSON stays small whatever the covered period while peaks and troughs remain visible.
+
+Imported inside the REPL session (see `tools.analytics_tools.plot_figure`). The figure is
+built as plain JSON, plotly is only needed by the browser.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from tools.analytics import _column, _dumps, _number
+from tools.downsampling import lttb
+
+KINDS = ("line", "scatter", "area", "bar")
+# Most points drawn per trace
+MAX_POINTS = 1000
+
+
+def _values(series: pd.Series) -> List[Any]:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return [None if pd.isna(v) else v.isoformat() for v in series]
+    if pd.api.types.is_numeric_dtype(series):
+        return [_number(v) for v in series]
+    return [None if pd.isna(v) else str(v) for v in series]
+
+
+def _positions(xs: pd.Series) -> List[float]:
+    """Numeric positions of the x values for downsampling: seconds, numbers or row order"""
+    if pd.api.types.is_datetime64_any_dtype(xs):
+        return (xs - xs.min()).dt.total_seconds().tolist()
+    if pd.api.types.is_numeric_dtype(xs):
+        return xs.astype(float).tolist()
+    return list(range(len(xs)))
+
+
+def _points(kind: str, xs: pd.Series, ys: pd.Series, max_points: int) -> pd.DataFrame:
+    """The x/y points of a series as drawn, downsampled to `max_points`"""
+    points = pd.DataFrame({"x": xs.reset_index(drop=True),
+                           "y": pd.to_numeric(ys, errors="coerce").reset_index(drop=True)}).dropna()
+    if kind == "bar" and points["x"].duplicated().any():
+        # A bar per x value, showing the mean of its rows (e.g. the price by hour of day)
+        points = points.groupby("x", sort=True)["y"].mean().reset_index()
+    elif pd.api.types.is_datetime64_any_dtype(points["x"]) or pd.api.types.is_numeric_dtype(points["x"]):
+        points = points.sort_values("x", kind="stable")
+    if len(points) > max_points:
+        points = points.iloc[lttb(_positions(points["x"]), points["y"].tolist(), max_points)]
+    return points
+
+
+def _trace(kind: str, name: str, points: pd.DataFrame) -> Dict[str, Any]:
+    """A Plotly trace of the points"""
+    if kind == "bar":
+        trace = {"type": "bar"}
+    else:
+        trace = {"type": "scatter", "mode": "markers" if kind == "scatter" else "lines"}
+        if kind == "area":
+            trace["fill"] = "tozeroy"
+    trace.update(name=name, x=_values(points["x"]), y=_values(points["y"]))
+    return trace
+
+
+def _default_x(frame: pd.DataFrame) -> str:
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            return column
+    raise ValueError("No datetime column found, pass `x`")
+
+
+def chart_series(frame: pd.DataFrame, kind: str = "line", x: Optional[str] = None,
+                 y: Optional[Union[str, List[str]]] = None, color: Optional[str] = None,
+                 max_points: int = MAX_POINTS) -> Tuple[str, List[str], List[Tuple[str, pd.DataFrame]]]:
+    """
+    Split a chart's data into its named series, see `figure_spec` for the arguments.
+
+    Returns:
+        tuple: The x column, the plotted columns, and (name, points) per series.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind {kind!r}, use one of {', '.join(KINDS)}")
+    if x is None and isinstance(frame.index, pd.DatetimeIndex):
+        frame = frame.rename_axis(frame.index.name or "time").reset_index()
+    x = x or _default_x(frame)
+    # Fails early, naming the available columns
+    _column(frame, x)
+    columns = [y] if isinstance(y, str) else list(y or frame.select_dtypes("number").columns.drop(x, errors="ignore"))
+    if not columns:
+        raise ValueError("No numeric column to plot, pass `y`")
+    groups = [(None, frame)] if color is None else list(frame.groupby(_column(frame, color), sort=True))
+    series = []
+    for group, part in groups:
+        for column in columns:
+            name = column if group is None else (str(group) if len(columns) == 1 else f"{group} {column}")
+            series.append((name, _points(kind, part[x], _column(part, column), max_points)))
+    return x, columns, series
+
+
+def figure_spec(frame: pd.DataFrame, kind: str = "line", x: Optional[str] = None,
+                y: Optional[Union[str, List[str]]] = None, color: Optional[str] = None,
+                title: Optional[str] = None, max_points: int = MAX_POINTS) -> Dict[str, Any]:
+    """
+    Build the Plotly figure JSON of a chart.
+
+    Args:
+        kind: One of KINDS. Bars of x values repeated over rows show the mean of the rows.
+        x: Column on the x axis, the first datetime column (or a DatetimeIndex) by default.
+        y: Column or columns to plot, every numeric column by default.
+        color: Column to split the traces by, e.g. a province or a consumer type.
+        max_points: Most points per trace, longer traces are downsampled with LTTB.
+
+    Returns:
+        dict: The figure, {"data": [traces], "layout": {...}}.
+    """
+    x, columns, series = chart_series(frame, kind, x, y, color, max_points)
+    traces = [_trace(kind, name, points) for name, points in series]
+    layout = {
+        "title": {"text": title or ", ".join(columns)},
+        "xaxis": {"title": {"text": x}},
+        "yaxis": {"title": {"text": ", ".join(columns)}},
+        "hovermode": "x unified",
+    }
+    return {"data": traces, "layout": layout}
+
+
+def save_figure(frame: pd.DataFrame, path: str, **spec: Any) -> str:
+    """
+    Write the Plotly figure JSON of a chart, see `figure_spec` for the chart arguments.
+
+    Returns:
+        str: Compact JSON with the path, the traces and the points drawn against the rows.
+    """
+    if not path.endswith(".json"):
+        raise ValueError("The figure path must end with .json")
+    figure = figure_spec(frame, **spec)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(figure, file, ensure_ascii=False, separators=(",", ":"))
+    points = sum(len(trace["x"]) for trace in figure["data"])
+    return _dumps({"figure": path, "traces": len(figure["data"]), "points": points, "rows": int(len(frame))})
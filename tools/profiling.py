@@ -0,0 +1,164 @@
+"""
+Statistical profile of a query's data, for agents that should not read its rows.
+
+Imported inside the REPL session by the profiling stage (see `core.node.profile_node`),
+where it runs on the bound `dataframe` / `datasets` and returns compact JSON: a summary
+per column, the time coverage, aggregates at the granularities that fit the covered
+period, and the extreme and anomalous points. The rows stay in the session for the agents'
+code.
+"""
+import json
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from tools.analytics import _extremes, _label, _number
+
+# Granularities aggregates are computed at, finest first, and the label of their periods
+GRANULARITIES = (("hourly", "h"), ("daily", "D"), ("weekly", "W"), ("monthly", "MS"), ("yearly", "YS"))
+PERIOD_LABELS = {"h": "%Y-%m-%d %H:00", "D": "%Y-%m-%d", "W": "week to %Y-%m-%d", "MS": "%Y-%m", "YS": "%Y"}
+# Shortest span of a period of each granularity
+GRANULARITY_SPANS = {"h": pd.Timedelta("1h"), "D": pd.Timedelta("1D"), "W": pd.Timedelta("7D"),
+                     "MS": pd.Timedelta("28D"), "YS": pd.Timedelta("365D")}
+# Aggregates are listed at the granularities giving between 2 and this many periods
+MAX_PERIODS = 36
+# Most granularities, numeric columns aggregated, top values and anomalies listed
+MAX_GRANULARITIES = 2
+MAX_COLUMNS = 8
+TOP_VALUES = 5
+TOP_ANOMALIES = 3
+ANOMALY_THRESHOLD = 3.0
+
+
+def _time(frame: pd.DataFrame) -> Optional[pd.Series]:
+    """The first datetime column as a series of the frame, None without one"""
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            return frame[column]
+    return None
+
+
+def _columns(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Summary of every column: count, nulls and quantiles, distinct values or date range"""
+    summaries = {}
+    for column in frame.columns:
+        series = frame[column]
+        summary: Dict[str, Any] = {"dtype": str(series.dtype), "nulls": int(series.isna().sum())}
+        values = series.dropna()
+        if pd.api.types.is_datetime64_any_dtype(series):
+            if not values.empty:
+                summary.update(min=_label(values.min()), max=_label(values.max()))
+        elif pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+            counts = values.astype(str).value_counts()
+            summary["distinct"] = int(counts.size)
+            summary["top"] = {str(k): int(v) for k, v in counts.iloc[:TOP_VALUES].items()}
+        elif not values.empty:
+            quantiles = values.quantile([0.25, 0.5, 0.75])
+            summary.update(
+                mean=_number(values.mean()), std=_number(values.std()), min=_number(values.min()),
+                p25=_number(quantiles[0.25]), median=_number(quantiles[0.5]), p75=_number(quantiles[0.75]),
+                max=_number(values.max()), sum=_number(values.sum()),
+            )
+        summaries[str(column)] = summary
+    return summaries
+
+
+def _coverage(stamps: pd.Series) -> Dict[str, Any]:
+    """Covered period, typical step, and the periods missing or repeated at that step"""
+    stamps = stamps.dropna().sort_values()
+    unique = stamps.drop_duplicates().reset_index(drop=True)
+    coverage: Dict[str, Any] = {"start": _label(unique.iloc[0]), "end": _label(unique.iloc[-1]),
+                                "timestamps": int(unique.size), "duplicates": int(stamps.size - unique.size)}
+    steps = unique.diff()
+    step = steps.median()
+    if pd.isna(step) or not step:
+        return coverage
+    coverage["step"] = str(step)
+    coverage["missing"] = max(0, int((unique.iloc[-1] - unique.iloc[0]) / step) + 1 - int(unique.size))
+    if coverage["missing"]:
+        largest = steps.idxmax()
+        coverage["largest_gap"] = {"after": _label(unique[largest - 1]), "length": str(steps[largest])}
+    return coverage
+
+
+def _granularities(index: pd.DatetimeIndex, step: Optional[pd.Timedelta]) -> List[tuple]:
+    """The granularities coarser than the data's step giving a listable number of periods"""
+    chosen = []
+    for name, freq in GRANULARITIES:
+        if step is not None and GRANULARITY_SPANS[freq] <= step:
+            continue
+        periods = pd.Series(1, index=index).resample(freq).size()
+        if 2 <= periods.size <= MAX_PERIODS:
+            chosen.append((name, freq))
+        if len(chosen) == MAX_GRANULARITIES:
+            break
+    return chosen
+
+
+def _aggregates(values: pd.DataFrame, granularities: List[tuple], hourly: bool) -> Dict[str, Any]:
+    """Mean of each numeric column per period, and per hour of day for sub-daily data"""
+    aggregates: Dict[str, Any] = {}
+    for name, freq in granularities:
+        resampled = values.resample(freq).mean()
+        aggregates[name] = {column: {k.strftime(PERIOD_LABELS[freq]): _number(v)
+                                     for k, v in resampled[column].dropna().items()}
+                            for column in resampled.columns}
+    if hourly:
+        by_hour = values.groupby(values.index.hour).mean()
+        aggregates["hour_of_day"] = {column: {int(k): _number(v) for k, v in by_hour[column].items()}
+                                     for column in by_hour.columns}
+    return aggregates
+
+
+def _anomalies(series: pd.Series) -> Dict[str, Any]:
+    """Points further than ANOMALY_THRESHOLD standard deviations from the mean, largest first"""
+    std = series.std()
+    if not std or not np.isfinite(std):
+        return {"count": 0}
+    scores = (series - series.mean()) / std
+    flagged = scores[scores.abs() > ANOMALY_THRESHOLD]
+    top = flagged.abs().sort_values(ascending=False).index[:TOP_ANOMALIES]
+    return {"count": int(flagged.size),
+            "largest": [{"at": _label(at), "value": _number(series[at]), "z": _number(scores[at])} for at in top]}
+
+
+def profile_frame(frame: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Profile one frame.
+
+    Returns:
+        dict: rows, columns, and with a datetime column also coverage, aggregates,
+        extremes and anomalies of the numeric columns.
+    """
+    profile: Dict[str, Any] = {"rows": int(len(frame)), "columns": _columns(frame)}
+    stamps = _time(frame)
+    numeric = frame.select_dtypes("number").iloc[:, :MAX_COLUMNS]
+    if stamps is None or stamps.notna().sum() < 2 or numeric.empty:
+        return profile
+    profile["coverage"] = _coverage(stamps)
+    values = numeric.set_axis(pd.DatetimeIndex(stamps))
+    values = values[values.index.notna()].sort_index()
+    step = pd.Timedelta(profile["coverage"]["step"]) if "step" in profile["coverage"] else None
+    hourly = step is not None and step < pd.Timedelta("1D")
+    profile["aggregates"] = _aggregates(values, _granularities(values.index, step), hourly)
+    profile["extremes"] = {column: _extremes(values[column]) for column in values.columns}
+    profile["anomalies"] = {column: _anomalies(values[column].dropna()) for column in values.columns}
+    return profile
+
+
+def profile(data: Union[pd.DataFrame, Mapping[str, pd.DataFrame]]) -> str:
+    """
+    Profile the query's data as compact JSON.
+
+    Args:
+        data: The bound `dataframe`, or `datasets` to profile each API result on its own
+            when there are several.
+    """
+    if isinstance(data, pd.DataFrame):
+        result = profile_frame(data)
+    elif len(data) == 1:
+        result = profile_frame(next(iter(data.values())))
+    else:
+        result = {"datasets": {name: profile_frame(frame) for name, frame in data.items()}}
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":"))
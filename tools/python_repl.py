@@ -1,25 +1,267 @@
 from logger import setup_logger
-from typing import Annotated, Dict
-from langchain.tools import tool
+from core.artifacts import get_artifact_store
+from core.budget import current_budget
+from core.tracing import span
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Annotated, Any, Dict, Iterator, List, Optional, Sequence
+from langchain.tools import StructuredTool
 from langchain_experimental.utilities import PythonREPL
+from tools.dataset import bind_dataset, dataset_fingerprint
+from tools.repl_cache import SessionLineage, analyze_code, get_repl_cache
+from tools.repl_pool import SESSION_RESET, get_repl_pool
+import asyncio
+import os
+import threading
 
 # Set up a logger
 logger = setup_logger("logs/python_repl.log")
-# Initialize REPL with pre-imported libraries
+
+# Session whose namespace agent code runs in, one per query
+DEFAULT_SESSION = "default"
+_repl_session: ContextVar[Optional[str]] = ContextVar("repl_session", default=None)
+
+
+def current_repl_session() -> str:
+    """Return the REPL session of the query running in this context"""
+    return _repl_session.get() or DEFAULT_SESSION
+
+
+@contextmanager
+def repl_session(session_id: str) -> Iterator[str]:
+    """
+    Run the enclosed query's code in its own REPL namespace, freed when the query ends.
+
+    Like the query budget the session travels in a context variable, so it reaches the tool
+    from graph worker threads and async tasks.
+    """
+    token = _repl_session.set(session_id)
+    try:
+        yield session_id
+    finally:
+        _repl_session.reset(token)
+        with _repl_lock:
+            _datasets.pop(session_id, None)
+        with _lineage_lock:
+            _lineages.pop(session_id, None)
+        pool = get_repl_pool()
+        if pool is not None:
+            pool.close_session(session_id)
+
+
+def session_directory(session: Optional[str] = None) -> str:
+    """
+    Working directory the code of a REPL session writes its files in, the current session's
+    by default.
+
+    Worker sessions each get their own in the artifact store, see `core.artifacts`. In-process
+    code shares this process's working directory, which can't change per thread.
+    """
+    if get_repl_pool() is None:
+        return os.getcwd()
+    return get_artifact_store().session_dir(session or current_repl_session())
+
+
+# In-process fallback (REPL_WORKERS=0): one namespace shared by every query
 repl = PythonREPL()
-# Seed common libraries into the REPL namespace
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-repl.globals.update({
-    "pd": pd,
-    "np": np,
-    "plt": plt
-})
-
-@tool
-def execute_python_code(
-    code: Annotated[str, "Python code to execute in REPL"]
+_seeded = False
+# PythonREPL swaps sys.stdout while running, so executions must not overlap
+_repl_lock = threading.Lock()
+# Bound dataset of each in-process session: fingerprint, description and current variables
+_datasets: Dict[str, Dict[str, Any]] = {}
+# Origin of each session's variables, for the execution cache
+_lineages: Dict[str, SessionLineage] = {}
+_lineage_lock = threading.Lock()
+
+
+def _seed_namespace():
+    """
+    Seed common libraries into the REPL namespace on first use.
+
+    matplotlib takes a noticeable part of startup, so it is only imported once an agent
+    actually runs code. Called with `_repl_lock` held.
+    """
+    global _seeded
+    if _seeded:
+        return
+    import pandas as pd
+    import numpy as np
+    import matplotlib
+    # No display on the server, render to files only
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    repl.globals.update({
+        "pd": pd,
+        "np": np,
+        "plt": plt
+    })
+    _seeded = True
+
+def load_dataset(items: List[Dict[str, Any]], endpoints: Sequence[str] = ()) -> str:
+    """
+    Preload the current query's API items into its REPL session as the typed `dataframe`,
+    and as one frame per API result in `datasets`.
+
+    Agent code then starts from the bound frames instead of rebuilding them from data pasted
+    into the code; the agent only needs the returned schema.
+
+    Args:
+        endpoints: Endpoints of the API calls, in order, to name the results after.
+
+    Returns:
+        str: The frames' schemas and row counts, see `tools.dataset.bind_dataset`.
+    """
+    session = current_repl_session()
+    fingerprint = dataset_fingerprint(items, endpoints)
+    with span("bind dataset", "tool", rows=len(items)):
+        pool = get_repl_pool()
+        if pool is not None:
+            description = pool.bind(session, items, endpoints, fingerprint)
+        else:
+            description = _load_dataset_in_process(session, items, endpoints, fingerprint)
+    with _lineage_lock:
+        lineage = _lineages.get(session)
+        if lineage is None or lineage.dataset != fingerprint:
+            _lineages[session] = SessionLineage(fingerprint)
+    return description
+
+def _load_dataset_in_process(session: str, items: List[Dict[str, Any]], endpoints: Sequence[str],
+                             fingerprint: str) -> str:
+    with _repl_lock:
+        bound = _datasets.get(session)
+        if bound is None or bound["fingerprint"] != fingerprint:
+            _seed_namespace()
+            namespace = {}
+            bound = {"fingerprint": fingerprint, "description": bind_dataset(namespace, items, endpoints),
+                     "variables": namespace}
+            _datasets[session] = bound
+        return bound["description"]
+
+def _run_code(session: str, code: str) -> str:
+    pool = get_repl_pool()
+    if pool is not None:
+        return pool.execute(session, code, session_directory(session))
+    with _repl_lock:
+        _seed_namespace()
+        bound = _datasets.get(session)
+        if bound is not None:
+            # The namespace is shared, put this session's frames in place. Top level
+            # assignments of agent code land in the REPL's locals, which shadow its globals.
+            repl.locals.update(bound["variables"])
+        result = repl.run(code)
+        if bound is not None:
+            for name in bound["variables"]:
+                bound["variables"][name] = repl.locals.get(name, bound["variables"][name])
+    return result
+
+def _budget_refusal() -> Optional[str]:
+    """The error to answer executions with once the query's budget is exhausted, None before"""
+    budget = current_budget()
+    reason = budget.exceeded() if budget is not None else None
+    if reason is None:
+        return None
+    logger.warning(f"REPL execution refused, query {reason} budget exhausted")
+    return f"Error: query {reason} budget exhausted"
+
+def run_python_code(code: str, cache: bool = True) -> str:
+    """
+    Run code in the current query's REPL session, through the execution cache.
+
+    Returns:
+        str: What the code printed, or an error message.
+    """
+    refusal = _budget_refusal()
+    if refusal is not None:
+        return refusal
+    session = current_repl_session()
+    execution_cache = get_repl_cache()
+    if execution_cache is None:
+        return _run_code(session, code)
+
+    analysis = analyze_code(code)
+    directory = session_directory(session)
+    with _lineage_lock:
+        lineage = _lineages.setdefault(session, SessionLineage())
+    key = lineage.key(analysis) if cache else None
+    if key is not None:
+        entry = execution_cache.get(key)
+        if entry is not None:
+            try:
+                entry.restore_artifacts(directory)
+                lineage.record(analysis, key, replayed=True)
+                logger.info(f"REPL cache hit in session {session}")
+                return entry.output
+            except OSError as e:
+                logger.warning(f"Could not restore cached artifacts, executing again: {e}")
+
+    # Variables this code reads may come from snippets answered by the cache
+    for skipped in lineage.take_pending(analysis):
+        _run_code(session, skipped)
+    output = _run_code(session, code)
+    if SESSION_RESET in output:
+        with _lineage_lock:
+            _lineages[session] = SessionLineage(lineage.dataset)
+        return output
+    if key is not None:
+        execution_cache.put(key, output, analysis, directory)
+    lineage.record(analysis, key)
+    return output
+
+def run_python_code_parallel(codes: Sequence[str]) -> List[str]:
+    """
+    Run independent snippets of the current query at once, through the execution cache.
+
+    With the worker pool, each snippet runs on its own worker in a fresh namespace holding
+    only the query's bound dataset (see `ReplWorkerPool.execute_many`), so snippets must not
+    read variables defined by other code. In-process they run one after another.
+
+    Returns:
+        list: What each snippet printed, or an error message, in order.
+    """
+    pool = get_repl_pool()
+    if pool is None:
+        return [run_python_code(code) for code in codes]
+    refusal = _budget_refusal()
+    if refusal is not None:
+        return [refusal] * len(codes)
+    session = current_repl_session()
+    directory = session_directory(session)
+    execution_cache = get_repl_cache()
+    with _lineage_lock:
+        lineage = _lineages.get(session)
+    # Keys as in a namespace that holds nothing but the dataset
+    fresh = SessionLineage(lineage.dataset if lineage is not None else None)
+    outputs: List[Optional[str]] = [None] * len(codes)
+    keys: List[tuple] = [(None, None)] * len(codes)
+    for i, code in enumerate(codes):
+        if execution_cache is None:
+            break
+        analysis = analyze_code(code)
+        key = fresh.key(analysis)
+        entry = execution_cache.get(key) if key is not None else None
+        if entry is not None:
+            try:
+                entry.restore_artifacts(directory)
+                outputs[i] = entry.output
+                continue
+            except OSError as e:
+                logger.warning(f"Could not restore cached artifacts, executing again: {e}")
+        keys[i] = (key, analysis)
+
+    missing = [i for i, output in enumerate(outputs) if output is None]
+    logger.info(f"Running {len(missing)} snippets in parallel in session {session}, "
+                f"{len(codes) - len(missing)} from the cache")
+    for i, output in zip(missing, pool.execute_many(session, [codes[i] for i in missing], directory)):
+        outputs[i] = output
+        key, analysis = keys[i]
+        if key is not None:
+            execution_cache.put(key, output, analysis, directory)
+    return outputs
+
+def _execute_python_code(
+    code: Annotated[str, "Python code to execute in REPL"],
+    cache: Annotated[bool, "Reuse the result of the same code on the same data; "
+                           "false if its side effects must happen again"] = True,
 ) -> Annotated[str, "Execution result or error message"]:
     """
     Executes Python code in a REPL environment and returns structured results.
@@ -27,5 +269,14 @@ def execute_python_code(
     Returns result string:
         result: str
     """
-    result = repl.run(code)
-    return result
+    return run_python_code(code, cache)
+
+async def _aexecute_python_code(code: str, cache: bool = True) -> str:
+    """Run the REPL in a worker thread so the event loop stays responsive"""
+    return await asyncio.to_thread(_execute_python_code, code, cache)
+
+execute_python_code = StructuredTool.from_function(
+    func=_execute_python_code,
+    coroutine=_aexecute_python_code,
+    name="execute_python_code",
+)
@@ -1,36 +1,59 @@
-from langchain.chat_models import init_chat_model
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.vectorstores import InMemoryVectorStore
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.tools.retriever import create_retriever_tool
-import json
 from langchain.schema import Document
+from typing import List, Optional
+import hashlib
+import json
+import os
+import threading
 import dotenv
+from core.fake_llm import fake_llm_enabled
+from core.usage import MeteredEmbeddings, use_ledger
+from logger import setup_logger
 
 dotenv.load_dotenv()
 
-llm = init_chat_model("o4-mini", model_provider="openai")
+logger = setup_logger("logs/rag.log")
+
+API_METADATA_PATH = "data/api_metadata.json"
+
+_vector_store: Optional[InMemoryVectorStore] = None
+_vector_store_lock = threading.Lock()
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
 
-with open("data/api_metadata.json", "r", encoding="utf-8") as f:
-    api_entries = json.load(f)
+def build_embeddings() -> Embeddings:
+    """Create the embeddings of the API metadata index"""
+    if fake_llm_enabled():
+        # Offline runs on scripted models: deterministic hash embeddings, no API calls
+        return MeteredEmbeddings(DeterministicFakeEmbedding(size=256), "fake-embedding")
+    from langchain_openai import OpenAIEmbeddings
+    return MeteredEmbeddings(OpenAIEmbeddings(model="text-embedding-3-large"), "text-embedding-3-large")
 
-docs = []
 
-for entry in api_entries:
-    method = entry.get("method")
-    endpoint = entry.get("endpoint")
-    service = entry.get("service")
-    description = entry.get("description")
-    body_fields = entry.get("body", [])
+def load_documents(path: str = API_METADATA_PATH) -> List[Document]:
+    """Read the API metadata and split it into the documents to index"""
+    with open(path, "r", encoding="utf-8") as f:
+        api_entries = json.load(f)
 
-    # Skip incomplete entries
-    if not all([method, endpoint, service, description]):
-        continue
+    docs = []
 
-    # Format content
-    content = f"""\
+    for entry in api_entries:
+        method = entry.get("method")
+        endpoint = entry.get("endpoint")
+        service = entry.get("service")
+        description = entry.get("description")
+        body_fields = entry.get("body", [])
+
+        # Skip incomplete entries
+        if not all([method, endpoint, service, description]):
+            continue
+
+        # Format content
+        content = f"""\
     Method: {method}
     Endpoint: {endpoint}
     Service: {service}
@@ -40,26 +63,82 @@ for entry in api_entries:
 
     Body:
     """
-    for field in body_fields:
-        name = field.get("name", "unknown")
-        dtype = field.get("type", "unknown")
-        desc = field.get("description", "")
-        content += f"- {name} ({dtype}): {desc}\n"
-    
-    docs.append(Document(page_content=content.strip(), metadata={"endpoint": endpoint}))
-
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-all_splits = text_splitter.split_documents(docs)
-
-vector_store = InMemoryVectorStore.from_documents(
-    documents=all_splits,
-    embedding=embeddings
-)
+        for field in body_fields:
+            name = field.get("name", "unknown")
+            dtype = field.get("type", "unknown")
+            desc = field.get("description", "")
+            content += f"- {name} ({dtype}): {desc}\n"
 
-retriever = vector_store.as_retriever()
+        docs.append(Document(page_content=content.strip(), metadata={"endpoint": endpoint}))
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    return text_splitter.split_documents(docs)
+
+
+def _index_fingerprint(model: str) -> str:
+    """Identify the metadata file and embedding model an index was built from"""
+    with open(API_METADATA_PATH, "rb") as f:
+        return hashlib.sha256(f.read() + model.encode("utf-8")).hexdigest()
+
+
+def build_vector_store() -> InMemoryVectorStore:
+    """
+    Build the API metadata vector store.
+
+    Embedding every document takes one embeddings API round trip per batch, so the
+    embedded index is saved to RAG_INDEX_CACHE (default rag_index.json, empty disables) and
+    reused while the metadata file and embedding model are unchanged.
+    """
+    embeddings = build_embeddings()
+    cache_path = os.getenv("RAG_INDEX_CACHE", "rag_index.json")
+    fingerprint = _index_fingerprint(getattr(embeddings, "model", type(embeddings).__name__))
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("fingerprint") == fingerprint:
+                vector_store = InMemoryVectorStore(embedding=embeddings)
+                vector_store.store = cached["store"]
+                logger.info(f"Loaded API metadata index from {cache_path}")
+                return vector_store
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable API metadata index {cache_path}: {e}")
+
+    vector_store = InMemoryVectorStore.from_documents(documents=load_documents(), embedding=embeddings)
+    if cache_path:
+        try:
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump({"fingerprint": fingerprint, "store": vector_store.store}, f)
+        except OSError as e:
+            logger.warning(f"Could not save API metadata index to {cache_path}: {e}")
+    logger.info(f"Built API metadata index of {len(vector_store.store)} chunks")
+    return vector_store
+
+
+def get_vector_store() -> InMemoryVectorStore:
+    """Return the API metadata vector store, building it on first use"""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                # Indexing is a startup cost, not charged to the query that happens to trigger it
+                with use_ledger(None):
+                    _vector_store = build_vector_store()
+    return _vector_store
+
+
+class LazyRetriever(BaseRetriever):
+    """Retriever over the API metadata vector store, which is built on the first search"""
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return get_vector_store().as_retriever().invoke(query, {"callbacks": run_manager.get_child()})
+
+
+retriever = LazyRetriever()
 
 retriever_tool = create_retriever_tool(
     retriever,
     "retrieve_api_metadata",
     "Retrieve API metadata based on a query",
-)
\ No newline at end of file
+)
@@ -0,0 +1,338 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from logger import setup_logger
+from tools.dataset import DATASET_VARIABLE, DATASETS_VARIABLE
+from typing import Dict, List, Optional, Set
+import ast
+import builtins
+import hashlib
+import json
+import os
+import re
+import threading
+
+logger = setup_logger("logs/repl_cache.log")
+
+# Names every session namespace starts with (see `tools.repl_worker.seed_namespace`)
+SEED_NAMES = ("pd", "np", "plt")
+# Files agent code may produce, replayed from the cache on a hit
+ARTIFACT_EXTENSIONS = (".png", ".jpg", ".jpeg", ".svg", ".pdf", ".html", ".csv", ".json", ".xlsx", ".parquet")
+# Calls writing their first argument (or path keyword) to a file
+WRITE_CALLS = {"savefig", "to_csv", "to_excel", "to_parquet", "to_pickle", "to_html", "to_json",
+               "write_image", "write_html", "imsave", "save_figure", "save_chart"}
+PATH_KEYWORDS = {"fname", "path", "path_or_buf", "excel_writer", "buf", "file"}
+# Code touching these has effects or results the cache can't reproduce
+UNCACHEABLE_NAMES = {"open", "input", "exec", "eval", "globals", "locals", "vars", "__import__",
+                     "os", "sys", "shutil", "subprocess", "socket", "requests", "httpx", "urllib", "pathlib",
+                     "Path", "random", "uuid", "secrets", "time"}
+UNCACHEABLE_ATTRIBUTES = {"random", "now", "today", "utcnow", "perf_counter"}
+_BUILTINS = set(dir(builtins))
+# What `PythonREPL.run` and the pool return when the code failed
+_ERROR_OUTPUT = re.compile(r"^\s*(Error:|Traceback|[A-Za-z_][\w.]*(Error|Exception|Timeout|Interrupt)\()")
+
+
+@dataclass
+class CodeAnalysis:
+    """What a REPL snippet reads, changes and writes, as far as the cache is concerned"""
+
+    normalized: str
+    # Names read from the session namespace
+    loads: Set[str] = field(default_factory=set)
+    # Names assigned, deleted or possibly mutated (method calls, item/attribute assignment)
+    defines: Set[str] = field(default_factory=set)
+    # Literal paths of the files the code writes
+    artifacts: List[str] = field(default_factory=list)
+    cacheable: bool = True
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _path_argument(call: ast.Call) -> Optional[ast.AST]:
+    # save_figure(frame, path="...") names the path, the frame comes first
+    for keyword in call.keywords:
+        if keyword.arg in PATH_KEYWORDS:
+            return keyword.value
+    return call.args[0] if call.args else None
+
+
+def analyze_code(code: str) -> Optional[CodeAnalysis]:
+    """
+    Analyze a snippet for the execution cache.
+
+    The normalized form drops comments and formatting, so reformatted retries of the same
+    code share an entry. Names bound inside functions, lambdas and comprehensions are local
+    and not counted as loads. Code that reads the clock or randomness, touches the file
+    system or processes other than through literal artifact paths is marked uncacheable.
+
+    Returns:
+        CodeAnalysis | None: None if the code doesn't parse.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    analysis = CodeAnalysis(normalized=ast.unparse(tree))
+    local: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.arg):
+            local.add(node.arg)
+        elif isinstance(node, ast.comprehension):
+            local.update(n.id for n in ast.walk(node.target) if isinstance(n, ast.Name))
+        elif isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                analysis.loads.add(node.id)
+            else:
+                analysis.defines.add(node.id)
+            if node.id in UNCACHEABLE_NAMES:
+                analysis.cacheable = False
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            analysis.defines.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+            if any(alias.name.split(".")[0] in UNCACHEABLE_NAMES for alias in node.names) or \
+                    (isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] in UNCACHEABLE_NAMES):
+                analysis.cacheable = False
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            analysis.defines.add(node.name)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            analysis.defines.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            analysis.cacheable = False
+        elif isinstance(node, ast.Attribute):
+            if node.attr in UNCACHEABLE_ATTRIBUTES:
+                analysis.cacheable = False
+            if not isinstance(node.ctx, ast.Load):
+                # dataframe.x = ... changes the object
+                root = _root_name(node)
+                if root is not None:
+                    analysis.defines.add(root)
+        elif isinstance(node, ast.Subscript) and not isinstance(node.ctx, ast.Load):
+            root = _root_name(node)
+            if root is not None:
+                analysis.defines.add(root)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            # Any method may change its object (inplace=True, list.append, plt.plot, ...)
+            root = _root_name(node.func)
+            if root is not None:
+                analysis.defines.add(root)
+            if node.func.attr in WRITE_CALLS:
+                path = _path_argument(node)
+                if isinstance(path, ast.Constant) and isinstance(path.value, str) \
+                        and path.value.lower().endswith(ARTIFACT_EXTENSIONS):
+                    analysis.artifacts.append(path.value)
+                elif path is not None:
+                    # Written somewhere only known at run time
+                    analysis.cacheable = False
+    analysis.loads -= local | _BUILTINS | _imported_first(tree)
+    analysis.defines -= local
+    return analysis
+
+
+def _imported_first(tree: ast.Module) -> Set[str]:
+    """Names a snippet imports at the top level before reading them, which don't come from the session"""
+    imported, seen = set(), set()
+    for statement in tree.body:
+        if isinstance(statement, (ast.Import, ast.ImportFrom)):
+            imported.update((alias.asname or alias.name).split(".")[0] for alias in statement.names
+                            if (alias.asname or alias.name).split(".")[0] not in seen)
+        seen.update(n.id for n in ast.walk(statement) if isinstance(n, ast.Name))
+    return imported
+
+
+class SessionLineage:
+    """
+    Where the variables of one REPL session come from.
+
+    Every name of the session maps to the cache key of the snippet that last set it (the
+    bound `dataframe` and `datasets` to their dataset fingerprint, the seeded libraries to a constant), or to
+    None if it was set by code the cache can't reproduce. A snippet's key combines its
+    normalized code with the keys of the names it reads, so a hit means the same code ran on
+    the same inputs.
+
+    Snippets answered from the cache don't run, so the variables they define are missing
+    from the namespace; they are kept pending and run once a snippet that executes needs them.
+    """
+
+    def __init__(self, dataset: Optional[str] = None):
+        self.keys: Dict[str, Optional[str]] = {name: "seed" for name in SEED_NAMES}
+        if dataset is not None:
+            self.keys[DATASET_VARIABLE] = self.keys[DATASETS_VARIABLE] = dataset
+        self.dataset = dataset
+        self.pending: List[tuple] = []
+
+    def key(self, analysis: Optional[CodeAnalysis]) -> Optional[str]:
+        """The cache key of a snippet, None if its result depends on unknown state"""
+        if analysis is None or not analysis.cacheable:
+            return None
+        inputs = []
+        for name in sorted(analysis.loads):
+            if name in self.keys:
+                if self.keys[name] is None:
+                    return None
+                inputs.append([name, self.keys[name]])
+            elif name not in analysis.defines:
+                # Left by code outside this session's lineage
+                return None
+        canonical = json.dumps([analysis.normalized, inputs], ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def record(self, analysis: Optional[CodeAnalysis], key: Optional[str], replayed: bool = False) -> None:
+        """Note what a snippet, executed or answered from the cache, set in the namespace"""
+        if analysis is None:
+            return
+        # A retry of code that already ran on the same inputs left its variables in place
+        current = key is not None and all(self.keys.get(name) == key for name in analysis.defines)
+        for name in analysis.defines:
+            self.keys[name] = key
+        if replayed and analysis.defines and not current:
+            self.pending.append((analysis.normalized, set(analysis.defines)))
+
+    def take_pending(self, analysis: Optional[CodeAnalysis]) -> List[str]:
+        """
+        The skipped snippets to run before a snippet that executes, in order.
+
+        All of them run as soon as one of their variables is read, which keeps their order.
+        """
+        if analysis is None or not any(analysis.loads & defines for _, defines in self.pending):
+            return []
+        pending, self.pending = self.pending, []
+        return [code for code, _ in pending]
+
+
+@dataclass
+class CachedExecution:
+    output: str
+    # Path -> content of the files the code wrote
+    artifacts: Dict[str, bytes]
+
+    @property
+    def size(self) -> int:
+        return len(self.output) + sum(len(content) for content in self.artifacts.values())
+
+    def restore_artifacts(self, directory: str = ".") -> None:
+        """Write back artifacts that were removed or overwritten since, relative to `directory`"""
+        for path, content in self.artifacts.items():
+            path = os.path.join(directory, path)
+            try:
+                with open(path, "rb") as f:
+                    if f.read() == content:
+                        continue
+            except OSError:
+                pass
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+
+
+class ReplExecutionCache:
+    """
+    LRU cache of REPL executions, see `SessionLineage` for the keys.
+
+    Entries hold what the code printed and the content of the files it wrote, bounded by
+    `max_entries` and `max_bytes`. Errors are never stored, so retries run again.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedExecution]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CachedExecution]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, output: str, analysis: CodeAnalysis, directory: str = ".") -> None:
+        """
+        Store an execution and the artifacts it wrote; errors and oversized results are skipped.
+
+        Args:
+            directory: Working directory the code ran in. Artifacts are kept by the paths the
+                code wrote, so a replay in another session restores them in its own directory.
+        """
+        if _ERROR_OUTPUT.match(output):
+            return
+        artifacts = {}
+        for path in analysis.artifacts:
+            try:
+                with open(os.path.join(directory, path), "rb") as f:
+                    artifacts[path] = f.read()
+            except OSError:
+                logger.debug(f"Artifact {path} was not written, not caching the execution")
+                return
+        entry = CachedExecution(output, artifacts)
+        if entry.size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_cache: Optional[ReplExecutionCache] = None
+_cache_configured = False
+_cache_lock = threading.Lock()
+
+
+def get_repl_cache() -> Optional[ReplExecutionCache]:
+    """
+    Return the process-wide REPL execution cache, created from the environment on first use.
+
+    REPL_CACHE_SIZE sets the number of entries (default 256, 0 disables the cache) and
+    REPL_CACHE_MB the memory they may take (default 64).
+    """
+    global _cache, _cache_configured
+    if not _cache_configured:
+        with _cache_lock:
+            if not _cache_configured:
+                size = int(os.getenv("REPL_CACHE_SIZE", "256"))
+                if size > 0:
+                    _cache = ReplExecutionCache(size, int(os.getenv("REPL_CACHE_MB", "64")) * 2 ** 20)
+                _cache_configured = True
+    return _cache
+
+
+def set_repl_cache(cache: Optional[ReplExecutionCache]) -> Optional[ReplExecutionCache]:
+    """
+    Install the REPL execution cache, None to always execute.
+
+    Returns:
+        ReplExecutionCache | None: The previously installed cache, to restore later.
+    """
+    global _cache, _cache_configured
+    with _cache_lock:
+        previous = _cache if _cache_configured else None
+        _cache, _cache_configured = cache, True
+    return previous
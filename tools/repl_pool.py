@@ -0,0 +1,366 @@
+from concurrent.futures import ThreadPoolExecutor
+from logger import setup_logger
+from tools.dataset import dataset_fingerprint
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import atexit
+import json
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+
+logger = setup_logger("logs/repl_pool.log")
+
+# Seconds a worker gets past the execution timeout to report it before being killed
+KILL_GRACE = 5.0
+# Ends the error message of executions whose worker was replaced or evicted their session
+SESSION_RESET = "the session's variables were reset"
+# Repository root, so workers import `tools` whatever the working directory
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ReplWorkerError(RuntimeError):
+    """A worker timed out or crashed; it was replaced and its sessions were reset"""
+
+
+class ReplWorker:
+    """One `tools.repl_worker` process and the pipes to it"""
+
+    def __init__(self, memory_mb: int, startup_timeout: float = 60.0):
+        env = dict(os.environ, REPL_MEMORY_MB=str(memory_mb), MPLBACKEND="Agg",
+                   # One BLAS thread per worker, the pool provides the parallelism
+                   OPENBLAS_NUM_THREADS="1", OMP_NUM_THREADS="1", MKL_NUM_THREADS="1",
+                   PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.getenv("PYTHONPATH")])))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "tools.repl_worker"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env, text=True, encoding="utf-8",
+            cwd=os.getcwd(),
+        )
+        self.lock = threading.Lock()
+        self.sessions = set()
+        # Fingerprint of the dataset each session holds in this worker
+        self.datasets: Dict[str, str] = {}
+        # Finished sessions, dropped by the worker with the next execution
+        self.dropped: List[str] = []
+        self._startup_timeout = startup_timeout
+        self._ready = False
+        # Set once the pool replaced this worker
+        self.retired = False
+
+    def wait_ready(self) -> None:
+        """Block until the worker has imported its libraries"""
+        if not self._ready:
+            self._read(self._startup_timeout)
+            self._ready = True
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _read(self, timeout: Optional[float]) -> dict:
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise TimeoutError()
+        line = self.process.stdout.readline()
+        if not line:
+            raise EOFError(f"REPL worker exited with code {self.process.wait()}")
+        return json.loads(line)
+
+    def request(self, message: dict, timeout: Optional[float]) -> dict:
+        """Send one message and wait for its reply, at most `timeout` seconds"""
+        self.wait_ready()
+        self.process.stdin.write(json.dumps(message) + "\n")
+        self.process.stdin.flush()
+        return self._read(timeout)
+
+    def kill(self) -> None:
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+
+    def close(self) -> None:
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill()
+
+
+class ReplWorkerPool:
+    """
+    Pool of warm REPL worker processes with one isolated namespace per session.
+
+    Workers are started ahead of use with pandas, numpy and matplotlib (Agg) imported, so
+    executions don't pay for imports, and run in parallel instead of sharing one
+    interpreter. A session (one per query, see `tools.python_repl.repl_session`) sticks to
+    the worker holding its namespace; new sessions go to the worker with the fewest.
+
+    Every execution is limited to `timeout` seconds, enforced inside the worker and, if the
+    code doesn't return to the interpreter, by killing and replacing the worker. Workers
+    cap the memory agent code may allocate at `memory_mb` (Linux).
+
+    A session's dataset (see `bind`) is kept by the pool too, and bound again if the
+    session's worker was replaced or evicted it.
+    """
+
+    def __init__(self, size: int = 4, timeout: float = 60.0, memory_mb: int = 2048):
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._workers: List[ReplWorker] = []
+        self._sessions: Dict[str, ReplWorker] = {}
+        # Session -> bind message and description of its dataset
+        self._datasets: Dict[str, Tuple[Dict[str, Any], str]] = {}
+        self._lock = threading.Lock()
+        self.restarts = 0
+
+    def start(self) -> "ReplWorkerPool":
+        """Start the workers without waiting for them, so they warm up in the background"""
+        with self._lock:
+            while len(self._workers) < self.size:
+                self._workers.append(ReplWorker(self.memory_mb))
+        return self
+
+    def wait_ready(self) -> "ReplWorkerPool":
+        """Start the workers and block until all have imported their libraries"""
+        self.start()
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            with worker.lock:
+                worker.wait_ready()
+        return self
+
+    def _worker_for(self, session: str) -> ReplWorker:
+        self.start()
+        with self._lock:
+            worker = self._sessions.get(session)
+            if worker is None:
+                worker = min(self._workers, key=lambda w: len(w.sessions))
+                worker.sessions.add(session)
+                self._sessions[session] = worker
+            return worker
+
+    def _replace(self, worker: ReplWorker) -> None:
+        """Kill a stuck or crashed worker and start a fresh one in its place"""
+        worker.kill()
+        with self._lock:
+            worker.retired = True
+            for session in worker.sessions:
+                self._sessions.pop(session, None)
+            if worker in self._workers:
+                self._workers[self._workers.index(worker)] = ReplWorker(self.memory_mb)
+                self.restarts += 1
+
+    def _acquire(self, session: str) -> ReplWorker:
+        """Return the session's worker with its lock held"""
+        worker = self._worker_for(session)
+        worker.lock.acquire()
+        while worker.retired:
+            # Replaced while we waited, the session moves to a fresh worker
+            worker.lock.release()
+            worker = self._worker_for(session)
+            worker.lock.acquire()
+        return worker
+
+    def _request(self, worker: ReplWorker, session: str, message: dict) -> dict:
+        """
+        Send a session's message to its worker, with the lock held.
+
+        Raises:
+            ReplWorkerError: The worker hung past the timeout or crashed, and was replaced.
+        """
+        with self._lock:
+            dropped, worker.dropped = worker.dropped, []
+        message = dict(message, session=session, drop=dropped)
+        try:
+            return worker.request(message, self.timeout + KILL_GRACE if self.timeout else None)
+        except TimeoutError:
+            logger.warning(f"REPL worker stuck past {self.timeout}s in session {session}, restarting it")
+            self._replace(worker)
+            raise ReplWorkerError(f"execution timed out after {self.timeout:g}s; {SESSION_RESET}")
+        except (EOFError, OSError, ValueError) as e:
+            logger.error(f"REPL worker crashed in session {session}: {e}")
+            self._replace(worker)
+            raise ReplWorkerError(f"the Python worker crashed ({e}); {SESSION_RESET}")
+
+    def bind(self, session: str, items: List[Dict[str, Any]], endpoints: Sequence[str] = (),
+             fingerprint: Optional[str] = None) -> str:
+        """
+        Load a dataset into a session's namespace, see `tools.dataset.bind_dataset`.
+
+        Binding the dataset the session already holds costs nothing. `fingerprint` saves
+        hashing the items again if the caller already did.
+
+        Returns:
+            str: The frame's schema and row count, see `tools.dataset.describe_frame`.
+
+        Raises:
+            ReplWorkerError: The worker hung or crashed while loading the dataset.
+            ValueError: The items could not be loaded into a DataFrame.
+        """
+        fingerprint = fingerprint or dataset_fingerprint(items, endpoints)
+        with self._lock:
+            bound = self._datasets.get(session)
+        if bound is not None and bound[0]["fingerprint"] == fingerprint:
+            return bound[1]
+        worker = self._acquire(session)
+        try:
+            with self._lock:
+                bound = self._datasets.get(session)
+            if bound is not None and bound[0]["fingerprint"] == fingerprint:
+                # Bound by a concurrent branch of the same query while we waited
+                return bound[1]
+            dataset = {"fingerprint": fingerprint, "items": items, "endpoints": list(endpoints)}
+            reply = self._request(worker, session, dict(dataset, op="bind"))
+            if "error" in reply:
+                raise ValueError(reply["error"])
+            worker.datasets[session] = fingerprint
+            with self._lock:
+                self._datasets[session] = (dataset, reply["output"])
+            return reply["output"]
+        finally:
+            worker.lock.release()
+
+    def execute(self, session: str, code: str, cwd: Optional[str] = None) -> str:
+        """
+        Run code in a session's namespace.
+
+        Args:
+            cwd: Working directory of the code, where relative paths it writes land.
+
+        Returns:
+            str: What the code printed, the repr of the exception it raised, or an error
+                message if the worker timed out or crashed (its sessions are then reset).
+        """
+        worker = self._acquire(session)
+        try:
+            start = time.perf_counter()
+            with self._lock:
+                bound = self._datasets.get(session)
+            message = {"op": "run", "code": code, "timeout": self.timeout}
+            if cwd:
+                message["cwd"] = cwd
+            try:
+                if bound is not None:
+                    message["fingerprint"] = bound[0]["fingerprint"]
+                    if worker.datasets.get(session) != bound[0]["fingerprint"]:
+                        message["dataset"] = bound[0]
+                reply = self._request(worker, session, message)
+                if reply.get("evicted"):
+                    # The worker dropped the session's variables to make room for others
+                    worker.datasets.pop(session, None)
+                    return f"Error: the session was evicted from its Python worker; {SESSION_RESET}"
+                if reply.get("missing_dataset"):
+                    # The worker evicted the session, bind its dataset again
+                    message["dataset"] = bound[0]
+                    reply = self._request(worker, session, message)
+            except ReplWorkerError as e:
+                return f"Error: {e}"
+            if "error" in reply:
+                return f"Error: the dataset could not be loaded: {reply['error']}"
+            if bound is not None:
+                worker.datasets[session] = bound[0]["fingerprint"]
+            logger.debug(f"Session {session} executed in {time.perf_counter() - start:.3f}s")
+            return reply["output"]
+        finally:
+            worker.lock.release()
+
+    def execute_many(self, session: str, codes: Sequence[str], cwd: Optional[str] = None) -> List[str]:
+        """
+        Run independent snippets in parallel, each in a fresh namespace holding only the
+        session's dataset.
+
+        Every snippet gets a short-lived session of its own, placed like a new session on the
+        least busy worker, so up to `size` snippets run at once. Variables they define are
+        discarded; the session's own namespace is left untouched.
+
+        Returns:
+            list: The output of each snippet, in order, see `execute`.
+        """
+        with self._lock:
+            bound = self._datasets.get(session)
+
+        def run(fork: str, code: str) -> str:
+            if bound is not None:
+                with self._lock:
+                    self._datasets[fork] = bound
+            try:
+                return self.execute(fork, code, cwd)
+            finally:
+                self.close_session(fork)
+
+        forks = [f"{session}#{i}" for i in range(len(codes))]
+        if len(codes) <= 1:
+            return [run(fork, code) for fork, code in zip(forks, codes)]
+        with ThreadPoolExecutor(max_workers=min(len(codes), self.size)) as executor:
+            return list(executor.map(run, forks, codes))
+
+    def close_session(self, session: str) -> None:
+        """
+        Free a finished session's namespace.
+
+        Doesn't wait for the worker, which may be busy with another session: the namespace
+        is dropped before its next execution.
+        """
+        with self._lock:
+            self._datasets.pop(session, None)
+            worker = self._sessions.pop(session, None)
+            if worker is not None:
+                worker.sessions.discard(session)
+                worker.datasets.pop(session, None)
+                worker.dropped.append(session)
+
+    def close(self) -> None:
+        """Stop every worker"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._sessions.clear()
+            self._datasets.clear()
+        for worker in workers:
+            worker.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"workers": len(self._workers), "sessions": len(self._sessions), "restarts": self.restarts}
+
+
+_pool: Optional[ReplWorkerPool] = None
+_pool_configured = False
+_pool_lock = threading.Lock()
+
+
+def get_repl_pool() -> Optional[ReplWorkerPool]:
+    """
+    Return the process-wide REPL pool, created from the environment on first use.
+
+    REPL_WORKERS sets the number of workers (default min(4, CPUs)); 0 runs agent code in
+    this process instead. REPL_TIMEOUT and REPL_MEMORY_MB set the per-execution limits.
+    """
+    global _pool, _pool_configured
+    if not _pool_configured:
+        with _pool_lock:
+            if not _pool_configured:
+                size = int(os.getenv("REPL_WORKERS", str(min(4, os.cpu_count() or 1))))
+                if size > 0:
+                    _pool = ReplWorkerPool(size, timeout=float(os.getenv("REPL_TIMEOUT", "60")),
+                                           memory_mb=int(os.getenv("REPL_MEMORY_MB", "2048")))
+                    atexit.register(_pool.close)
+                _pool_configured = True
+    return _pool
+
+
+def set_repl_pool(pool: Optional[ReplWorkerPool]) -> Optional[ReplWorkerPool]:
+    """
+    Install the REPL pool used by `execute_python_code`, None to run code in-process.
+
+    Returns:
+        ReplWorkerPool | None: The previously installed pool, to restore later.
+    """
+    global _pool, _pool_configured
+    with _pool_lock:
+        previous = _pool if _pool_configured else None
+        _pool, _pool_configured = pool, True
+    return previous
@@ -0,0 +1,174 @@
+"""
+REPL worker process of `tools.repl_pool.ReplWorkerPool`.
+
+Started as `python -m tools.repl_worker`, it imports pandas, numpy and matplotlib (Agg)
+once, then executes agent code sent by the pool. Every session (one per query) has its own
+namespace, so variables like `dataframe` or `fig` never leak between queries.
+
+Protocol: one JSON object per line on stdin, one JSON reply per line on a private copy of
+stdout; the real stdout is pointed at stderr so code writing to file descriptor 1 directly
+can't corrupt the replies.
+
+    {"op": "run", "session": "...", "code": "...", "timeout": 60, "cwd": "...", "drop": ["finished", ...]}
+        ->  {"output": "..."}
+    {"op": "bind", "session": "...", "fingerprint": "...", "items": [...], "endpoints": [...]}
+        ->  {"output": "<schema of the bound frames>"} or {"error": "..."}
+
+A run message may carry the session's dataset (`"dataset"`, the fields of a bind) to
+bind before executing, or only its `"fingerprint"`: a session that doesn't hold that dataset
+(e.g. it was evicted) then answers `{"missing_dataset": true}` without running the code.
+A run in a session evicted since its last run answers `{"evicted": true}` without running
+either, its variables are gone.
+Code runs in the message's `"cwd"`, the session's working directory, so the files of
+concurrent queries don't collide.
+"""
+import io
+import json
+import os
+import signal
+import sys
+from collections import OrderedDict
+from contextlib import redirect_stdout
+from tools.dataset import bind_dataset
+
+# Sessions kept per worker; the least recently used one is dropped beyond this
+MAX_SESSIONS = 32
+# Evicted sessions remembered per worker, to tell their next run the variables are gone
+MAX_EVICTED = 1024
+
+
+class ExecutionTimeout(BaseException):
+    """
+    Raised inside agent code that ran past its time limit.
+
+    A BaseException, so agent code catching Exception can't swallow it and run on.
+    """
+
+
+def _on_alarm(signum, frame):
+    raise ExecutionTimeout()
+
+
+def limit_memory(megabytes):
+    """
+    Cap the address space agent code may add on top of the loaded libraries.
+
+    Allocations beyond it raise MemoryError in the agent code instead of swapping the host.
+    """
+    if megabytes <= 0:
+        return
+    import resource
+    try:
+        with open("/proc/self/statm") as f:
+            baseline = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        baseline = 0
+    limit = baseline + megabytes * 2 ** 20
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ValueError, OSError):
+        # Not supported on this platform, the pool's timeout still applies
+        pass
+
+
+def seed_namespace():
+    """A fresh session namespace with the common libraries imported"""
+    import numpy as np
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    return {"__name__": "__main__", "pd": pd, "np": np, "plt": plt}
+
+
+def run(namespace, code, timeout):
+    """Execute code like `PythonREPL.run`: return what it printed, or the error's repr"""
+    output = io.StringIO()
+    if timeout:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with redirect_stdout(output):
+            exec(code, namespace)
+        return output.getvalue()
+    except ExecutionTimeout:
+        return f"Error: execution timed out after {timeout:g}s"
+    except Exception as e:
+        return repr(e)
+    finally:
+        if timeout:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def session_namespace(sessions, session, evicted):
+    """
+    Return a session's namespace, creating it and evicting the least recently used one.
+
+    Evicted sessions are added to `evicted`.
+    """
+    namespace = sessions.pop(session, None)
+    if namespace is None:
+        namespace = seed_namespace()
+    sessions[session] = namespace
+    while len(sessions) > MAX_SESSIONS:
+        dropped, _ = sessions.popitem(last=False)
+        evicted[dropped] = True
+    while len(evicted) > MAX_EVICTED:
+        evicted.popitem(last=False)
+    return namespace
+
+
+def bind(namespace, dataset):
+    """Bind a dataset into a namespace, returning the reply to send"""
+    try:
+        output = bind_dataset(namespace, dataset["items"], dataset.get("endpoints", ()))
+    except Exception as e:
+        return {"error": repr(e)}
+    namespace["__dataset__"] = dataset["fingerprint"]
+    return {"output": output}
+
+
+def handle(sessions, message, evicted):
+    """Answer one message of the pool"""
+    for session in message.get("drop", []):
+        sessions.pop(session, None)
+        evicted.pop(session, None)
+    namespace = session_namespace(sessions, message["session"], evicted)
+    if message.get("op") == "bind":
+        return bind(namespace, message)
+    if evicted.pop(message["session"], False):
+        return {"evicted": True}
+    dataset = message.get("dataset")
+    if dataset is not None:
+        reply = bind(namespace, dataset)
+        if "error" in reply:
+            return reply
+    elif message.get("fingerprint") and namespace.get("__dataset__") != message["fingerprint"]:
+        return {"missing_dataset": True}
+    if message.get("cwd"):
+        os.makedirs(message["cwd"], exist_ok=True)
+        os.chdir(message["cwd"])
+    return {"output": run(namespace, message["code"], message.get("timeout"))}
+
+
+def main():
+    # The replies travel on a private copy of stdout
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    os.environ["MPLBACKEND"] = "Agg"
+    import matplotlib
+    matplotlib.use("Agg")
+    seed_namespace()
+    limit_memory(int(os.getenv("REPL_MEMORY_MB", "2048")))
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+    sessions = OrderedDict()
+    evicted = OrderedDict()
+    replies.write(json.dumps({"ready": True}) + "\n")
+    replies.flush()
+    for line in sys.stdin:
+        replies.write(json.dumps(handle(sessions, json.loads(line), evicted)) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,31 @@
 import unicodedata
 from difflib import get_close_matches
+from functools import lru_cache
 import json
 from langchain.tools import tool
 
+# Define aliases
+ISTANBUL_ALIASES = {
+    "ISTANBUL AVURPA": "İSTANBUL-AVRUPA",
+    "ISTANBUL AVRUPA": "İSTANBUL-AVRUPA",
+    "EUROPEAN ISTANBUL": "İSTANBUL-AVRUPA",
+    "ISTANBUL ASYA": "İSTANBUL-ASYA",
+    "ASIAN ISTANBUL": "İSTANBUL-ASYA",
+    "ISTANBUL": ["İSTANBUL-AVRUPA", "İSTANBUL-ASYA"]
+}
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII').upper().strip()
+
+
+@lru_cache(maxsize=1)
+def load_province_list() -> tuple:
+    """Load the province list once and reuse it for every lookup"""
+    with open("data/province_list.json", "r", encoding="utf-8") as f:
+        return tuple(json.load(f))
+
+
 @tool
 def resolve_province_id(province_name: str, cutoff: float = 0.6) -> int:
     """
@@ -29,25 +52,12 @@ def resolve_province_id(province_name: str, cutoff: float = 0.6) -> int:
         ValueError: Raised if the input is ambiguous for Istanbul's European or Asian sides
             or if no matching province is found based on the provided name.
     """
-    def normalize(text: str) -> str:
-        return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII').upper().strip()
-
-    with open("data/province_list.json", "r") as f:
-        province_list = json.load(f)
-
-    # Define aliases
-    istanbul_aliases = {
-        "ISTANBUL AVURPA": "İSTANBUL-AVRUPA",
-        "EUROPEAN ISTANBUL": "İSTANBUL-AVRUPA",
-        "ISTANBUL ASYA": "İSTANBUL-ASYA",
-        "ASIAN ISTANBUL": "İSTANBUL-ASYA",
-        "ISTANBUL": ["İSTANBUL-AVRUPA", "İSTANBUL-ASYA"]
-    }
+    province_list = load_province_list()
 
     query = normalize(province_name)
 
     # Check aliases
-    for alias, target in istanbul_aliases.items():
+    for alias, target in ISTANBUL_ALIASES.items():
         if query == normalize(alias):
             if isinstance(target, list):
                 raise ValueError("Ambiguous province name: 'Istanbul' — please specify ASYA or AVRUPA.")
@@ -62,4 +72,4 @@ def resolve_province_id(province_name: str, cutoff: float = 0.6) -> int:
     if not close_matches:
         raise ValueError(f"No match found for '{province_name}'.")
 
-    return name_map[close_matches[0]]
\ No newline at end of file
+    return name_map[close_matches[0]]
@@ -0,0 +1,63 @@
+"""
+Usage report: where the query database's LLM and embedding tokens and cost go.
+
+Every portal and batch query stores one row per LLM or embedding call, attributed to its
+agent, model tier, graph node and model. This aggregates them by any combination of agent,
+tier, model, kind, node, workflow and day.
+
+Usage:
+    python usage_report.py                          # per agent
+    python usage_report.py --by workflow
+    python usage_report.py --by day --since 2025-01-01
+    python usage_report.py --by agent tier --json
+"""
+import argparse
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+from core.query_db import QueryDatabase
+
+COUNTERS = ["queries", "calls", "prompt_tokens", "completion_tokens", "cached_tokens", "cost"]
+
+
+def format_report(rows: List[Dict[str, Any]], group_by: Sequence[str]) -> str:
+    """Render report rows as a fixed-width table with a total line"""
+    headers = list(group_by) + COUNTERS
+    table = [[str(row[group]) for group in group_by] +
+             [f"{row[c]:.4f}" if c == "cost" else str(row[c] or 0) for c in COUNTERS] for row in rows]
+    totals = {c: sum(row[c] or 0 for row in rows) for c in COUNTERS[1:]}
+    table.append(["total"] + [""] * (len(group_by) - 1) + [""] +
+                 [f"{totals[c]:.4f}" if c == "cost" else str(totals[c]) for c in COUNTERS[1:]])
+    widths = [max(len(headers[i]), *(len(line[i]) for line in table)) for i in range(len(headers))]
+    n = len(group_by)
+
+    def line(cells):
+        return "  ".join(cell.ljust(w) if i < n else cell.rjust(w) for i, (cell, w) in enumerate(zip(cells, widths)))
+
+    return "\n".join([line(headers), line(["-" * w for w in widths])] + [line(cells) for cells in table])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Aggregate recorded LLM and embedding usage")
+    parser.add_argument("--db", default="query_history.db", help="Query database to read")
+    parser.add_argument("--by", nargs="+", default=["agent"], choices=sorted(QueryDatabase.USAGE_GROUPS),
+                        help="Columns to group by")
+    parser.add_argument("--since", default=None, help="Only calls at or after this ISO date")
+    parser.add_argument("--until", default=None, help="Only calls before this ISO date")
+    parser.add_argument("--query-id", default=None, help="Only the calls of this query")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    rows = QueryDatabase(args.db).usage_report(args.by, since=args.since, until=args.until,
+                                               query_id=args.query_id)
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+    elif not rows:
+        print("No usage recorded")
+    else:
+        print(format_report(rows, args.by))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
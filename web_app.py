@@ -6,21 +6,33 @@ import pandas as pd
 import json
 import uuid
 from datetime import datetime
-import sqlite3
 import os
 import threading
 from threading import Thread
 import queue
 import time
+import asyncio
 import base64
 import warnings
+from flask import abort, send_file
 warnings.filterwarnings("ignore", category=DeprecationWarning, module="dash")
 
 # Import your existing system
 from logger import setup_logger
-from langchain_core.messages import HumanMessage
-from core.workflow import Workflow
-from core.llm import LLM
+from core.llm import LLM, ModelRouter
+from core.artifacts import CONTENT_TYPES, URL_PREFIX, get_artifact_store
+from core.budget import QueryBudget, use_budget
+from core.followup import followup_state
+from core.query_db import QueryDatabase
+from core.state import initial_state, query_workflow, state_results
+from core.tracing import get_span_store, trace_config, trace_query, waterfall
+from core.usage import UsageLedger, usage_config, use_ledger
+from tools.python_repl import repl_session, session_directory
+from tools.rag import get_vector_store
+from tools.repl_pool import get_repl_pool
+from core.checkpoint import (
+    async_sqlite_checkpointer, has_agent_error, last_good_checkpoint, sqlite_checkpointer
+)
 import dotenv
 
 dotenv.load_dotenv()
@@ -32,178 +44,214 @@ if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not os.environ.get('FLASK_EN
     # Only initialize once
     pass
 
-class QueryDatabase:
-    """Simple SQLite database to store query history"""
-    
-    def __init__(self, db_path="query_history.db"):
-        self.db_path = db_path
-        self.init_db()
-    
-    def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS queries (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT,
-                query TEXT,
-                status TEXT,
-                result_data TEXT,
-                visualization_data TEXT,
-                report TEXT,
-                error_message TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
-    
-    def save_query(self, query_id, query, status, result_data=None, 
-                   visualization_data=None, report=None, error_message=None):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO queries 
-            (id, timestamp, query, status, result_data, visualization_data, report, error_message)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (query_id, datetime.now().isoformat(), query, status, 
-              json.dumps(result_data) if result_data else None,
-              json.dumps(visualization_data) if visualization_data else None,
-              report, error_message))
-        conn.commit()
-        conn.close()
-    
-    def get_all_queries(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, timestamp, query, status, result_data, visualization_data, report, error_message
-            FROM queries ORDER BY timestamp DESC
-        ''')
-        results = cursor.fetchall()
-        conn.close()
-        return results
-    
-    def get_query(self, query_id):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, timestamp, query, status, result_data, visualization_data, report, error_message
-            FROM queries WHERE id = ?
-        ''', (query_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
-
 class DataAnalyticsPortalWeb:
     """Web interface wrapper for the DataAnalyticsPortal"""
     
-    def __init__(self):
+    def __init__(self, execution_mode=None):
+        # Imported with the portal, LangGraph and the agents take about a second to import
+        from core.workflow import Workflow
         self.logger = setup_logger("logs/web_app.log")
         self.llm = LLM()
-        self.workflow = Workflow(llms=self.llm.get_models())
+        self.model_router = ModelRouter()
         self.db = QueryDatabase()
         self.running_queries = {}
         
-    def run_query_async(self, query_id, user_input, result_queue):
-        """Run query asynchronously and put result in queue"""
-        try:
-            self.db.save_query(query_id, user_input, "running")
-            
-            graph = self.workflow.get_graph()
-            events = graph.stream(
-                {
-                    "messages": [HumanMessage(content=user_input)],
-                    "process_state": "",
-                    "process_decision": "",
-                    "query_state": "",
-                    "retrieval_state": "",
-                    "api_state": "",
-                    "analysis_state": "",
-                    "visualization_state": "",
-                    "report_state": "",
-                    "sender": "",
-                },
-                {"configurable": {"thread_id": query_id}, "recursion_limit": 30},
-                stream_mode="values",
-                debug=False
-            )
-            
-            final_state = None
-            for event in events:
-                final_state = event
-            
-            # Extract results from final state
-            result_data = None
-            visualization_data = None
-            report = None
-            
-            if final_state:
-                # Extract API data
-                if final_state.get("api_state"):
-                    try:
-                        api_content = final_state["api_state"].content
-                        if api_content.startswith("compact_json:"):
-                            json_str = api_content.replace("compact_json:", "").strip()
-                            result_data = json.loads(json_str)
-                    except Exception as e:
-                        self.logger.warning(f"Failed to parse API state: {e}")
+        # "async" runs every query on one shared event loop, "thread" uses one OS thread per query
+        self.execution_mode = execution_mode or os.getenv("PORTAL_EXECUTION_MODE", "async")
+        self.loop = None
+        if self.execution_mode == "async":
+            self.loop = asyncio.new_event_loop()
+            loop_thread = Thread(target=self.loop.run_forever, name="portal-event-loop")
+            loop_thread.daemon = True
+            loop_thread.start()
+        
+        # Checkpoint every node so failed queries can resume from the last good one
+        checkpoint_path = os.getenv("PORTAL_CHECKPOINT_DB", "checkpoints.db")
+        if self.loop is not None:
+            checkpointer = asyncio.run_coroutine_threadsafe(
+                async_sqlite_checkpointer(checkpoint_path), self.loop
+            ).result()
+        else:
+            checkpointer = sqlite_checkpointer(checkpoint_path)
+        self.workflow = Workflow(llms=self.llm.get_models(), model_router=self.model_router,
+                                 checkpointer=checkpointer)
+    
+    @staticmethod
+    def initial_state(user_input):
+        """Build the initial graph state for a user query"""
+        return initial_state(user_input)
+    
+    @staticmethod
+    def run_config(query_id):
+        """Build the graph run configuration for a query"""
+        return {"configurable": {"thread_id": query_id}, "recursion_limit": 30}
+    
+    def followup_input(self, user_input, parent_state):
+        """Build the graph input of a follow-up, branching from its parent's final state"""
+        if not parent_state or parent_state.get("query") is None:
+            self.logger.warning("Parent query has no usable state, running the follow-up as a new query")
+            return self.initial_state(user_input)
+        return followup_state(parent_state, user_input)
+    
+    def resume_input(self, query_id, user_input, checkpoint):
+        """Build the graph input and config resuming a query from a checkpoint"""
+        config = self.run_config(query_id)
+        if checkpoint is None:
+            self.logger.warning(f"No checkpoint to resume query {query_id} from, rerunning it")
+            return self.initial_state(user_input), config
+        # Running from a past checkpoint forks the thread there, reusing the upstream state
+        config["configurable"].update(checkpoint.config["configurable"])
+        return None, config
+    
+    def finalize_query(self, query_id, user_input, final_state, result_queue, budget=None, ledger=None):
+        """Extract results from the final state, store them and notify the caller"""
+        results = state_results(final_state, session_directory(query_id))
+        resumable = has_agent_error(final_state)
+        if not resumable:
+            # The charts were copied to the artifact store. A resumable run keeps its files,
+            # the checkpoint it resumes from names them relative to the session directory.
+            get_artifact_store().remove_session(query_id)
+        result_data = results["result_data"]
+        visualization_data = results["visualization_data"]
+        report = results["report"]
+
+        budget_usage = budget.usage() if budget is not None else None
+        self.db.save_query(query_id, user_input, "completed", 
+                        result_data, visualization_data, report, budget_usage=budget_usage,
+                        workflow=query_workflow(final_state))
+        if ledger is not None:
+            self.db.save_usage(query_id, ledger.records)
+        
+        result_queue.put({
+            "query_id": query_id,
+            "status": "completed",
+            "resumable": resumable,
+            "result_data": result_data,
+            "visualization_data": visualization_data,
+            "report": report,
+            "budget_usage": budget_usage,
+            "token_usage": self.db.get_query_usage(query_id)
+        })
+    
+    def fail_query(self, query_id, user_input, error, result_queue, budget=None, ledger=None):
+        """Store a failed query and notify the caller"""
+        error_msg = str(error)
+        self.logger.error(f"Query execution failed: {error_msg}")
+        self.db.save_query(query_id, user_input, "error", error_message=error_msg,
+                           budget_usage=budget.usage() if budget is not None else None)
+        # Failed queries cost tokens too
+        if ledger is not None:
+            self.db.save_usage(query_id, ledger.records)
+        result_queue.put({"query_id": query_id, "status": "error", "error": error_msg})
+        
+    def run_query_async(self, query_id, user_input, result_queue, resume=False, parent_id=None):
+        """Run query in a dedicated thread and put result in queue"""
+        budget, ledger = QueryBudget.from_env(), UsageLedger()
+        with trace_query(query_id, resume=resume):
+            try:
+                self.db.save_query(query_id, user_input, "running")
                 
-                # Extract visualization data
-                if final_state.get("visualization_state"):
-                    try:
-                        viz_content = final_state["visualization_state"].content
-                        if viz_content:
-                            visualization_data = json.loads(viz_content)
-                    except Exception as e:
-                        self.logger.warning(f"Failed to parse visualization state: {e}")
+                graph = self.workflow.get_graph()
+                graph_input, config = self.initial_state(user_input), self.run_config(query_id)
+                if parent_id:
+                    parent = graph.get_state(self.run_config(parent_id))
+                    graph_input = self.followup_input(user_input, parent.values)
+                if resume:
+                    checkpoint = last_good_checkpoint(graph.get_state_history(config))
+                    graph_input, config = self.resume_input(query_id, user_input, checkpoint)
+                final_state = None
+                with use_budget(budget), use_ledger(ledger), repl_session(query_id):
+                    events = graph.stream(
+                        graph_input,
+                        usage_config(trace_config(config)),
+                        stream_mode="values",
+                        debug=False
+                    )
+                    for event in events:
+                        final_state = event
                 
-                # Extract report
-                if final_state.get("report_state"):
-                    try:
-                        report_content = final_state["report_state"].content
-                        if isinstance(report_content, str):
-                            # Try to parse as JSON first, fall back to raw string
-                            try:
-                                report_data = json.loads(report_content)
-                                report = report_data.get("report", report_content)
-                            except json.JSONDecodeError:
-                                report = report_content
-                        else:
-                            report = str(report_content)
-                    except Exception as e:
-                        self.logger.warning(f"Failed to parse report state: {e}")
-                        if final_state.get("report_state"):
-                            report = str(final_state["report_state"].content)
-            
-            self.db.save_query(query_id, user_input, "completed", 
-                            result_data, visualization_data, report)
-            
-            result_queue.put({
-                "status": "completed",
-                "result_data": result_data,
-                "visualization_data": visualization_data,
-                "report": report
-            })
-            
-        except Exception as e:
-            error_msg = str(e)
-            self.logger.error(f"Query execution failed: {error_msg}")
-            self.db.save_query(query_id, user_input, "error", error_message=error_msg)
-            result_queue.put({"status": "error", "error": error_msg})
-    
-    def start_query(self, user_input):
-        """Start a new query and return query ID"""
-        query_id = str(uuid.uuid4())
+                self.finalize_query(query_id, user_input, final_state, result_queue, budget, ledger)
+                
+            except Exception as e:
+                self.fail_query(query_id, user_input, e, result_queue, budget, ledger)
+    
+    async def run_query_coroutine(self, query_id, user_input, result_queue, resume=False, parent_id=None):
+        """Run query on the shared event loop and put result in queue"""
+        budget, ledger = QueryBudget.from_env(), UsageLedger()
+        with trace_query(query_id, resume=resume):
+            try:
+                # SQLite calls block, keep them off the event loop
+                await asyncio.to_thread(self.db.save_query, query_id, user_input, "running")
+                
+                graph = self.workflow.get_graph()
+                graph_input, config = self.initial_state(user_input), self.run_config(query_id)
+                if parent_id:
+                    parent = await graph.aget_state(self.run_config(parent_id))
+                    graph_input = self.followup_input(user_input, parent.values)
+                if resume:
+                    history = [snapshot async for snapshot in graph.aget_state_history(config)]
+                    graph_input, config = self.resume_input(query_id, user_input, last_good_checkpoint(history))
+                final_state = None
+                with use_budget(budget), use_ledger(ledger), repl_session(query_id):
+                    async for event in graph.astream(
+                        graph_input,
+                        usage_config(trace_config(config)),
+                        stream_mode="values",
+                        debug=False
+                    ):
+                        final_state = event
+                
+                await asyncio.to_thread(self.finalize_query, query_id, user_input, final_state, result_queue, budget, ledger)
+                
+            except Exception as e:
+                await asyncio.to_thread(self.fail_query, query_id, user_input, e, result_queue, budget, ledger)
+    
+    def launch_query(self, query_id, user_input, resume=False, parent_id=None):
+        """Run a query in the background on the configured execution mode"""
         result_queue = queue.Queue()
         self.running_queries[query_id] = result_queue
         
-        thread = Thread(target=self.run_query_async, 
-                       args=(query_id, user_input, result_queue))
-        thread.daemon = True
-        thread.start()
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(
+                self.run_query_coroutine(query_id, user_input, result_queue, resume, parent_id), self.loop
+            )
+        else:
+            thread = Thread(target=self.run_query_async, 
+                           args=(query_id, user_input, result_queue, resume, parent_id))
+            thread.daemon = True
+            thread.start()
+    
+    def start_query(self, user_input, parent_id=None):
+        """
+        Start a new query and return query ID.
+        
+        With `parent_id` the query is a follow-up in the parent's session: it branches from
+        the parent's final state, fetches only the data the parent didn't have and reruns
+        only the stages the follow-up affects.
+        """
+        query_id = str(uuid.uuid4())
+        session_id = (self.db.get_session(parent_id)[0] or parent_id) if parent_id else query_id
+        self.db.save_query(query_id, user_input, "running", session_id=session_id, parent_id=parent_id)
+        self.launch_query(query_id, user_input, parent_id=parent_id)
+        return query_id
+    
+    def retry_query(self, query_id):
+        """
+        Resume a failed query from its last good checkpoint.
         
+        The nodes that completed before the failure (typically Query, Retrieval and API)
+        are not rerun. Returns the query ID, or None if the query is unknown.
+        """
+        query_data = self.db.get_query(query_id)
+        if not query_data:
+            return None
+        self.launch_query(query_id, query_data[2], resume=True)
         return query_id
     
+    def get_trace(self, query_id):
+        """Return the spans of a query ordered for a waterfall view"""
+        return waterfall(get_span_store().spans(query_id))
+    
     def get_query_status(self, query_id):
         """Get current status of a query"""
         if query_id in self.running_queries:
@@ -236,11 +284,14 @@ class DataAnalyticsPortalWeb:
                     self.logger.warning(f"Failed to parse visualization_data for query {query_id}")
             
             return {
+                "query_id": query_id,
                 "status": status,
                 "result_data": parsed_result_data,
                 "visualization_data": parsed_viz_data,
                 "report": report,
-                "error": error_message
+                "error": error_message,
+                "budget_usage": self.db.get_budget_usage(query_id),
+                "token_usage": self.db.get_query_usage(query_id)
             }
         
         return {"status": "not_found"}
@@ -259,6 +310,23 @@ def get_portal():
                 print("Portal instance initialized successfully")
     return _portal_instance
 
+def warm_up_in_background():
+    """
+    Build the portal and the API metadata index and start the REPL workers in a daemon thread.
+
+    Nothing heavy happens at import, so the server starts listening at once; the first
+    query then finds everything ready instead of paying for it.
+    """
+    def warm_up():
+        pool = get_repl_pool()
+        if pool is not None:
+            pool.start()
+        get_portal()
+        get_vector_store()
+    thread = Thread(target=warm_up, name="portal-warm-up", daemon=True)
+    thread.start()
+    return thread
+
 # Custom CSS styles
 external_stylesheets = [
     'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
@@ -268,6 +336,29 @@ external_stylesheets = [
 # Initialize Dash app with custom styling
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 
+# Stored artifacts never change under their name, browsers may keep them for a year
+ARTIFACT_MAX_AGE = 365 * 24 * 3600
+
+@app.server.route(URL_PREFIX + "<name>")
+def serve_artifact(name):
+    """
+    Serve a chart or thumbnail of the artifact store.
+
+    Names are digests of the content, which makes them their own ETag: responses are cached
+    as immutable, and a revalidating browser gets a 304 without the file being sent.
+    """
+    path = get_artifact_store().path(name)
+    if path is None or not os.path.exists(path):
+        abort(404)
+    content_type = CONTENT_TYPES.get(os.path.splitext(name)[1])
+    if content_type is None:
+        abort(404)
+    response = send_file(path, mimetype=content_type, etag=name.split(".", 1)[0],
+                         max_age=ARTIFACT_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 # Define color scheme
 colors = {
     'primary': '#2c3e50',
@@ -414,6 +505,14 @@ app.layout = html.Div([
                     style=styles['textarea']
                 ),
                 
+                # Refine the selected query, reusing the data and stages it already has
+                dcc.Checklist(
+                    id='followup-toggle',
+                    options=[{'label': ' Follow up on the selected query', 'value': 'followup'}],
+                    value=[],
+                    style={'marginBottom': '15px', 'color': colors['dark']}
+                ),
+                
                 html.Button([
                     html.I(className="fas fa-play", style={'marginRight': '8px'}),
                     'Run Query'
@@ -437,6 +536,12 @@ app.layout = html.Div([
             # Status section
             html.Div(id='query-status', style={'marginBottom': '20px'}),
             
+            # Resume a failed query without rerunning the stages that succeeded
+            html.Button([
+                html.I(className="fas fa-redo", style={'marginRight': '8px'}),
+                'Retry from last good step'
+            ], id='retry-query-btn', style=dict(styles['button_primary'], display='none')),
+            
             # Results section
             html.Div([
                 dcc.Tabs(
@@ -461,6 +566,12 @@ app.layout = html.Div([
                             value='report-tab',
                             style={'padding': '12px 20px', 'fontWeight': '500'},
                             children=[html.I(className="fas fa-file-alt", style={'marginRight': '8px'}), 'Report']
+                        ),
+                        dcc.Tab(
+                            label='Trace',
+                            value='trace-tab',
+                            style={'padding': '12px 20px', 'fontWeight': '500'},
+                            children=[html.I(className="fas fa-stream", style={'marginRight': '8px'}), 'Trace']
                         )
                     ]
                 ),
@@ -482,11 +593,16 @@ app.layout = html.Div([
      Output('query-status', 'children'),
      Output('query-input', 'value')],
     [Input('run-query-btn', 'n_clicks')],
-    [State('query-input', 'value')]
+    [State('query-input', 'value'),
+     State('followup-toggle', 'value'),
+     State('selected-query-data', 'data')]
 )
-def run_new_query(n_clicks, query_text):
+def run_new_query(n_clicks, query_text, followup, query_data):
     if n_clicks and query_text and query_text.strip():
-        query_id = get_portal().start_query(query_text.strip())
+        parent_id = None
+        if followup and query_data and query_data.get("status") == "completed":
+            parent_id = query_data.get("query_id")
+        query_id = get_portal().start_query(query_text.strip(), parent_id=parent_id)
         status = html.Div([
             html.I(className="fas fa-spinner fa-spin", style={'marginRight': '10px'}),
             "Processing your query..."
@@ -524,10 +640,57 @@ def update_query_status(n_intervals, current_query_id):
             html.I(className="fas fa-exclamation-triangle", style={'marginRight': '10px'}),
             f"Error: {status_data.get('error', 'Unknown error occurred')}"
         ], style=styles['status_error'])
-        return status, dash.no_update
+        return status, status_data
     
     return dash.no_update, dash.no_update
 
+@app.callback(
+    Output('retry-query-btn', 'style'),
+    [Input('selected-query-data', 'data')]
+)
+def toggle_retry_button(query_data):
+    retry_style = dict(styles['button_primary'], marginBottom='20px')
+    failed = query_data and (query_data.get("status") == "error" or query_data.get("resumable"))
+    if not failed:
+        retry_style['display'] = 'none'
+    return retry_style
+
+@app.callback(
+    [Output('current-query-id', 'data', allow_duplicate=True),
+     Output('query-status', 'children', allow_duplicate=True)],
+    [Input('retry-query-btn', 'n_clicks')],
+    [State('selected-query-data', 'data')],
+    prevent_initial_call=True
+)
+def retry_failed_query(n_clicks, query_data):
+    if not n_clicks or not query_data or not query_data.get("query_id"):
+        return dash.no_update, dash.no_update
+    
+    query_id = get_portal().retry_query(query_data["query_id"])
+    if query_id is None:
+        return dash.no_update, dash.no_update
+    
+    status = html.Div([
+        html.I(className="fas fa-spinner fa-spin", style={'marginRight': '10px'}),
+        "Resuming query from the last good step..."
+    ], style=styles['status_running'])
+    return query_id, status
+
+def history_thumbnail(visualization_data):
+    """Thumbnail of the first chart of a stored query, None without one"""
+    if not visualization_data:
+        return None
+    try:
+        visualizations = json.loads(visualization_data).get("visualizations") or []
+    except (TypeError, ValueError, AttributeError):
+        return None
+    thumbnail = next((viz["thumbnail"] for viz in visualizations
+                      if isinstance(viz, dict) and viz.get("thumbnail")), None)
+    if thumbnail is None:
+        return None
+    return html.Img(src=thumbnail, style={'maxWidth': '100%', 'maxHeight': '80px', 'marginTop': '8px',
+                                          'borderRadius': '4px'})
+
 @app.callback(
     Output('query-history', 'children'),
     [Input('interval-component', 'n_intervals')]
@@ -543,7 +706,7 @@ def update_query_history(n_intervals):
     
     history_items = []
     for query_data in queries[:15]:  # Show last 15 queries
-        query_id, timestamp, query, status, _, _, _, _ = query_data
+        query_id, timestamp, query, status, _, visualization_data, _, _ = query_data
         
         # Format timestamp
         dt = datetime.fromisoformat(timestamp)
@@ -574,7 +737,8 @@ def update_query_history(n_intervals):
                 html.Div(
                     query[:80] + "..." if len(query) > 80 else query,
                     style={'color': colors['dark'], 'lineHeight': '1.4', 'fontSize': '14px'}
-                )
+                ),
+                history_thumbnail(visualization_data)
             ], 
             style=item_style,
             id={'type': 'history-item', 'index': query_id},
@@ -608,6 +772,10 @@ def select_historical_query(n_clicks_list):
      Input('selected-query-data', 'data')]
 )
 def update_tab_content(active_tab, query_data):
+    # Failed queries have a trace too, it is where to look for what went wrong
+    if active_tab == 'trace-tab' and query_data and query_data.get("query_id"):
+        return render_trace_tab(get_portal().get_trace(query_data["query_id"]))
+    
     if not query_data or query_data.get("status") != "completed":
         return html.Div([
             html.I(className="fas fa-info-circle", style={'marginRight': '10px', 'color': colors['gray']}),
@@ -695,7 +863,37 @@ def render_visualization_tab(visualization_data):
             viz_components = []
             
             for i, viz in enumerate(visualizations):
-                if isinstance(viz, dict) and "file" in viz:
+                if isinstance(viz, dict) and viz.get("figure_data"):
+                    # Plotly figure JSON, drawn by the browser
+                    viz_components.append(
+                        html.Div([
+                            html.H5(viz.get("description", f"Visualization {i+1}"),
+                                    style={'color': colors['dark'], 'marginBottom': '10px'}),
+                            dcc.Graph(figure=viz["figure_data"], config={'displaylogo': False},
+                                      style={'marginBottom': '20px'})
+                        ])
+                    )
+                elif isinstance(viz, dict) and viz.get("figure"):
+                    viz_components.append(
+                        html.Div([
+                            html.P(f"Visualization figure not found: {viz['figure']}",
+                                   style={'color': colors['danger']})
+                        ])
+                    )
+                elif isinstance(viz, dict) and viz.get("url"):
+                    # Served from the artifact store and cached by the browser
+                    viz_components.append(
+                        html.Div([
+                            html.H5(viz.get("description", f"Visualization {i+1}"),
+                                    style={'color': colors['dark'], 'marginBottom': '10px'}),
+                            html.Img(
+                                src=viz["url"],
+                                style={'maxWidth': '100%', 'height': 'auto', 'marginBottom': '20px'}
+                            )
+                        ])
+                    )
+                elif isinstance(viz, dict) and "file" in viz:
+                    # Queries stored before the artifact store: inline the file
                     file_path = viz["file"]
                     description = viz.get("description", f"Visualization {i+1}")
                     
@@ -764,6 +962,60 @@ def render_report_tab(report):
         )
     ])
 
+TRACE_COLORS = {
+    "query": colors['dark'],
+    "node": colors['secondary'],
+    "llm": colors['primary'],
+    "tool": colors['success'],
+    "http": colors['warning'],
+    "db": colors['gray'],
+}
+
+def render_trace_tab(spans):
+    if not spans:
+        return html.Div([
+            html.I(className="fas fa-stream", style={'marginRight': '10px', 'color': colors['gray']}),
+            "No trace recorded for this query"
+        ], style={'textAlign': 'center', 'color': colors['gray'], 'padding': '40px'})
+    
+    # One bar per span, starting at its offset from the query start, children indented below parents
+    labels = [f"{i:03d} " + "\u00a0\u00a0" * s["depth"] + s["name"] for i, s in enumerate(spans)]
+    fig = go.Figure()
+    for kind in dict.fromkeys(s["kind"] for s in spans):
+        rows = [(label, s) for label, s in zip(labels, spans) if s["kind"] == kind]
+        fig.add_trace(go.Bar(
+            name=kind,
+            orientation='h',
+            y=[label for label, _ in rows],
+            x=[max(s["duration_ms"], 0.5) for _, s in rows],
+            base=[s["offset_ms"] for _, s in rows],
+            marker_color=[TRACE_COLORS.get(kind, colors['gray']) if s["status"] == "ok" else colors['danger']
+                          for _, s in rows],
+            customdata=[[f"{s['duration_ms']:.1f}", s["status"],
+                         "<br>".join(f"{k}: {v}" for k, v in s["attributes"].items())] for _, s in rows],
+            hovertemplate="%{y}<br>%{customdata[0]} ms, %{customdata[1]}<br>%{customdata[2]}<extra></extra>",
+        ))
+    fig.update_layout(
+        barmode='overlay',
+        height=max(300, 22 * len(spans) + 120),
+        margin={'l': 10, 'r': 10, 't': 30, 'b': 40},
+        xaxis_title='ms since query start',
+        yaxis={'autorange': 'reversed', 'categoryorder': 'array', 'categoryarray': labels},
+        legend={'orientation': 'h', 'y': 1.02, 'yanchor': 'bottom'},
+        plot_bgcolor=colors['white'],
+    )
+    
+    total_ms = max(s["offset_ms"] + s["duration_ms"] for s in spans)
+    tokens = sum(s["attributes"].get("prompt_tokens", 0) + s["attributes"].get("completion_tokens", 0)
+                 for s in spans if s["kind"] == "llm")
+    return html.Div([
+        html.H4([
+            html.I(className="fas fa-stream", style={'marginRight': '10px', 'color': colors['secondary']}),
+            f"Query Trace ({len(spans)} spans, {total_ms:.0f} ms, {tokens} tokens)"
+        ], style={'color': colors['dark'], 'marginBottom': '20px'}),
+        dcc.Graph(figure=fig, config={'displayModeBar': False})
+    ])
+
 # Add custom CSS
 app.index_string = '''
 <!DOCTYPE html>
@@ -828,4 +1080,5 @@ if __name__ == '__main__':
     print("Starting web interface...")
     print("Open your browser and go to: http://localhost:8050")
     print("Press Ctrl+C to stop the server")
+    warm_up_in_background()
     app.run(debug=False, host='0.0.0.0', port=8050)
\ No newline at end of file